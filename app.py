@@ -1,17 +1,19 @@
-import datetime
 import os
-import tempfile
-import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-import matplotlib.pyplot as plt
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import seaborn as sns
 import streamlit as st
 from dotenv import load_dotenv
-from fpdf import FPDF
-from sqlalchemy import create_engine
+
+import chart_prep
+import db_connection
+import insights
+import kpi_queries
+from dw_schema import AFFINITY_TABLE, CLV_TABLE, EMPLOYEE_MONTHLY_TABLE, FORECAST_TABLE
+from kpi_queries import create_category_filter
+from lazy_data import DATASET_TTL, LazyDatasets
+from result_shaping import OTHERS_LABEL, PAGE_SIZE, SAMPLE_PER_GROUP, SCATTER_BINS
+from stream_read import read_sql_streaming
 
 # ==========================================
 # 1. KONFIGURASI HALAMAN & SETUP
@@ -24,37 +26,38 @@ st.set_page_config(
 )
 
 load_dotenv()
-sns.set_theme(style="whitegrid")
 
 # ==========================================
 # 2. KONEKSI DATABASE
 # ==========================================
+def _warm_engine():
+    # Engine & pool dibagi dengan ETL lewat db_connection; satu koneksi
+    # dibuka di background supaya query pertama tidak menunggu handshake.
+    engine = db_connection.get_dw_engine()
+    if engine is not None:
+        try:
+            with engine.connect():
+                pass
+        except Exception:
+            pass  # error koneksi tampil saat query pertama
+    return engine
+
 @st.cache_resource
+def start_dw_engine():
+    """Mulai membuat engine di background, sekali per proses server."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='engine-warmup').submit(_warm_engine)
+
 def get_dw_engine():
-    db_user = os.getenv("PG_USER")
-    db_password = os.getenv("PG_PASSWORD")
-    db_host = os.getenv("PG_HOST")
-    db_port = os.getenv("PG_PORT")
-    db_name = os.getenv("PG_DATABASE")
-    db_schema = os.getenv("PG_SCHEMA", "public")
-
-    if not all([db_user, db_password, db_host, db_name]):
+    """Tunggu engine dari start_dw_engine (halaman sudah mulai dirender)."""
+    future = start_dw_engine()
+    if not future.done():
+        with st.spinner("Menghubungkan ke database..."):
+            engine = future.result()
+    else:
+        engine = future.result()
+    if engine is None:
         st.error("Konfigurasi database di file .env tidak lengkap.")
-        return None
-
-    database_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-    
-    try:
-        engine = create_engine(
-            database_url,
-            connect_args={'options': f'-csearch_path={db_schema}'}
-        )
-        with engine.connect() as conn:
-            pass
-        return engine
-    except Exception as e:
-        st.error(f"Gagal terhubung ke database: {e}")
-        return None
+    return engine
 
 # ==========================================
 # 3. ETL & QUERY DATA
@@ -66,195 +69,70 @@ def get_dimensions(_engine):
     q_date = "SELECT DISTINCT year FROM dim_date ORDER BY year DESC;"
     q_cat = "SELECT DISTINCT category_name FROM dim_product ORDER BY category_name;"
     try:
-        df_date = pd.read_sql(q_date, _engine)
-        df_cat = pd.read_sql(q_cat, _engine)
+        df_date = read_sql_streaming(q_date, _engine)
+        df_cat = read_sql_streaming(q_cat, _engine)
         return df_date, df_cat
     except Exception:
         return pd.DataFrame(), pd.DataFrame()
 
-def create_category_filter(selected_categories):
-    if selected_categories:
-        cats_formatted = "', '".join([c.replace("'", "''") for c in selected_categories])
-        return f" AND dp.category_name IN ('{cats_formatted}')"
-    return ""
+@st.cache_data(ttl=DATASET_TTL)
+def fetch_kpi_cached(_engine, kpi_type, selected_year, category_sql="", shape=None):
+    """Cache KPI per proses, dipakai thread utama & prefetch. Query gagal tidak dicache (exception)."""
+    return kpi_queries.fetch_kpi(_engine, kpi_type, selected_year, category_sql, shape)
 
-@st.cache_data(ttl=600)
-def get_kpi_data(_engine, kpi_type, selected_year, category_sql=""):
-    """Mengambil data metrik KPI."""
-    
-    if kpi_type == 'financial_trend':
-        query = f"""
-        SELECT dd.year, dd.month, dd.month_name, 
-               SUM(fs.revenue) AS total_revenue, 
-               COUNT(DISTINCT fs.order_id) as total_orders
-        FROM fact_sales fs 
-        JOIN dim_date dd ON fs.date_key = dd.date_key 
-        JOIN dim_product dp ON fs.product_key = dp.product_key 
-        WHERE dd.year = {selected_year}
-        {category_sql} 
-        GROUP BY 1, 2, 3 
-        ORDER BY dd.year, dd.month;
-        """
-        
-    elif kpi_type == 'retention_rate':
-        query = f"""
-        WITH customer_monthly AS (
-            SELECT 
-                dd.year, 
-                dd.month,
-                fs.customer_key,
-                MIN(dd.full_date) as first_purchase_date
-            FROM fact_sales fs 
-            JOIN dim_date dd ON fs.date_key = dd.date_key 
-            JOIN dim_product dp ON fs.product_key = dp.product_key
-            WHERE dd.year IN ({selected_year}, {selected_year} - 1)
-            {category_sql}
-            GROUP BY 1, 2, 3
-        ),
-        customer_first_purchase AS (
-            SELECT 
-                customer_key,
-                MIN(first_purchase_date) as global_first_purchase
-            FROM customer_monthly
-            GROUP BY customer_key
-        ),
-        monthly_metrics AS (
-            SELECT 
-                cm.year,
-                cm.month,
-                COUNT(DISTINCT cm.customer_key) as end_customers,
-                COUNT(DISTINCT CASE 
-                    WHEN EXTRACT(YEAR FROM cfp.global_first_purchase) = cm.year 
-                         AND EXTRACT(MONTH FROM cfp.global_first_purchase) = cm.month 
-                    THEN cm.customer_key 
-                END) as new_customers
-            FROM customer_monthly cm
-            JOIN customer_first_purchase cfp ON cm.customer_key = cfp.customer_key
-            GROUP BY cm.year, cm.month
-        ),
-        retention_calc AS (
-            SELECT 
-                year,
-                month,
-                LAG(end_customers) OVER (ORDER BY year, month) as start_customers,
-                end_customers,
-                new_customers,
-                ROUND(
-                    100.0 * (end_customers - new_customers) / 
-                    NULLIF(LAG(end_customers) OVER (ORDER BY year, month), 0),
-                    2
-                ) as retention_rate,
-                ROUND(
-                    100.0 * (end_customers - LAG(end_customers) OVER (ORDER BY year, month)) / 
-                    NULLIF(LAG(end_customers) OVER (ORDER BY year, month), 0),
-                    2
-                ) as growth_rate,
-                ROUND(
-                    100.0 - (100.0 * (end_customers - new_customers) / 
-                    NULLIF(LAG(end_customers) OVER (ORDER BY year, month), 0)),
-                    2
-                ) as churn_rate
-            FROM monthly_metrics
-        )
-        SELECT * FROM retention_calc
-        WHERE year = {selected_year}
-        ORDER BY month;
-        """
-        
-    elif kpi_type == 'customer_clv':
-        query = f"""
-        SELECT dc.company_name, 
-               COUNT(DISTINCT fs.order_id) as frequency, 
-               SUM(fs.revenue) as monetary_value,
-               SUM(fs.revenue) * 1.2 as predicted_clv 
-        FROM fact_sales fs 
-        JOIN dim_customer dc ON fs.customer_key = dc.customer_key 
-        JOIN dim_date dd ON fs.date_key = dd.date_key 
-        JOIN dim_product dp ON fs.product_key = dp.product_key
-        WHERE dd.year = {selected_year}
-        {category_sql} 
-        GROUP BY 1 
-        ORDER BY monetary_value DESC;
-        """
-        
-    elif kpi_type == 'product_performance':
-        query = f"""
-        SELECT dp.product_name, dp.category_name, 
-               SUM(fs.revenue) AS total_revenue, 
-               SUM(fs.quantity) as total_sold
-        FROM fact_sales fs 
-        JOIN dim_product dp ON fs.product_key = dp.product_key 
-        JOIN dim_date dd ON fs.date_key = dd.date_key
-        WHERE dd.year = {selected_year}
-        {category_sql} 
-        GROUP BY 1, 2 
-        ORDER BY total_revenue DESC 
-        LIMIT 20;
-        """
-        
-    elif kpi_type == 'category_performance':
-        query = f"""
-        SELECT dp.category_name, 
-               SUM(fs.revenue) AS total_revenue
-        FROM fact_sales fs 
-        JOIN dim_product dp ON fs.product_key = dp.product_key 
-        JOIN dim_date dd ON fs.date_key = dd.date_key
-        WHERE dd.year = {selected_year}
-        {category_sql} 
-        GROUP BY 1 
-        ORDER BY total_revenue DESC;
-        """
-
-    elif kpi_type == 'geo_performance':
-        query = f"""
-        SELECT dc.country, 
-               SUM(fs.revenue) AS total_revenue,
-               COUNT(DISTINCT fs.order_id) as total_orders
-        FROM fact_sales fs 
-        JOIN dim_customer dc ON fs.customer_key = dc.customer_key
-        JOIN dim_date dd ON fs.date_key = dd.date_key
-        JOIN dim_product dp ON fs.product_key = dp.product_key
-        WHERE dd.year = {selected_year}
-        {category_sql} 
-        GROUP BY 1 
-        ORDER BY total_revenue DESC;
-        """
-    
-    elif kpi_type == 'rfm_raw_data':
-        query = f"""
-        SELECT 
-            dc.company_name as customer_name,
-            MAX(dd.full_date) as last_order_date,
-            COUNT(DISTINCT fs.order_id) as frequency,
-            SUM(fs.revenue) as monetary
-        FROM fact_sales fs
-        JOIN dim_customer dc ON fs.customer_key = dc.customer_key
-        JOIN dim_date dd ON fs.date_key = dd.date_key
-        JOIN dim_product dp ON fs.product_key = dp.product_key
-        WHERE dd.year = {selected_year}
-        {category_sql}
-        GROUP BY 1;
-        """
+def get_kpi_data(_engine, kpi_type, selected_year, category_sql="", shape=None):
+    """Mengambil data metrik KPI (shape: bentuk hasil di server, lihat result_shaping)."""
+    try:
+        return fetch_kpi_cached(_engine, kpi_type, selected_year, category_sql, shape)
+    except Exception as e:
+        st.error(f"Error executing query {kpi_type}: {e}")
+        return pd.DataFrame()
 
-    else:
+@st.cache_data(ttl=600)
+def get_period_kpi(_engine, start_month, end_month, category_sql=""):
+    """KPI rentang bulan bebas dari agregat kumulatif (periode ini vs sebelumnya)."""
+    try:
+        return kpi_queries.fetch_range_kpi(_engine, start_month, end_month, category_sql)
+    except Exception as e:
+        st.error(f"Error executing period query: {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=600)
+def get_rule_insights(_engine, selected_year, categories, all_categories):
+    """Insight berbasis aturan per (tahun, set kategori): hasil batch ETL jika ada."""
     try:
-        return pd.read_sql(query, _engine)
+        return insights.get_insights(_engine, selected_year, categories, all_categories)
     except Exception as e:
-        st.error(f"Error executing query {kpi_type}: {e}")
+        st.error(f"Error menghitung insight: {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=600)
+def table_ready(_engine, table_name):
+    """True jika tabel hasil batch ETL (mis. forecast, CLV) sudah ada."""
+    try:
+        return bool(read_sql_streaming(
+            f"SELECT to_regclass('{table_name}') IS NOT NULL AS ready", _engine
+        )['ready'].iloc[0])
+    except Exception:
+        return False
+
+def get_datasets(engine):
+    """Dataset KPI lazy milik sesi ini (dimemo di session_state)."""
+    if 'kpi_datasets' not in st.session_state:
+        st.session_state['kpi_datasets'] = LazyDatasets(
+            fetch=lambda kind, year, cat, shape: get_kpi_data(engine, kind, year, cat, shape),
+            background_fetch=lambda kind, year, cat, shape: fetch_kpi_cached(engine, kind, year, cat, shape),
+        )
+    return st.session_state['kpi_datasets']
+
 # ==========================================
 # 4. FUNGSI TARGET & CHART HELPER
 # ==========================================
 
-def calculate_achievement(actual, target):
-    if target == 0: return 0
-    return round((actual / target) * 100, 1)
-
 def create_revenue_comparison_chart(df_trend, monthly_target):
-    df_trend['target'] = monthly_target
+    import plotly.graph_objects as go
+    # Frame baru dari chart_prep; df_trend (hasil cache) tidak diubah.
+    df_trend = chart_prep.revenue_vs_target(df_trend, monthly_target)
     
     fig = go.Figure()
     
@@ -264,7 +142,7 @@ def create_revenue_comparison_chart(df_trend, monthly_target):
         y=df_trend['total_revenue'],
         name='Actual Revenue',
         marker_color='#1f77b4',
-        text=df_trend['total_revenue'].apply(lambda x: f'${x:,.0f}'),
+        text=df_trend['revenue_label'],
         textposition='outside'
     ))
     
@@ -289,8 +167,8 @@ def create_revenue_comparison_chart(df_trend, monthly_target):
     return fig
 
 def create_retention_comparison_chart(df_retention, target_retention):
-    df_retention['target'] = target_retention
-    df_retention['gap'] = df_retention['retention_rate'] - target_retention
+    import plotly.graph_objects as go
+    df_retention = chart_prep.retention_vs_target(df_retention, target_retention)
     
     fig = go.Figure()
     
@@ -329,7 +207,7 @@ def create_retention_comparison_chart(df_retention, target_retention):
 # ==========================================
 
 def generate_smart_insights(df_trend, df_retention, df_prod):
-    insights = {
+    summary = {
         "finance": None,
         "customer": None,
         "product": None
@@ -340,7 +218,7 @@ def generate_smart_insights(df_trend, df_retention, df_prod):
         low_row = df_trend.loc[df_trend['total_revenue'].idxmin()]
         total_rev = df_trend['total_revenue'].sum()
         
-        insights['finance'] = {
+        summary['finance'] = {
             "title": "Kinerja Keuangan",
             "value": f"${total_rev:,.0f}",
             "detail": f"Puncak: **{peak_row['month_name']}** | Terendah: **{low_row['month_name']}**",
@@ -362,7 +240,7 @@ def generate_smart_insights(df_trend, df_retention, df_prod):
             status = "error"
             detail = f"Retention Rendah ({avg_retention:.1f}%)"
         
-        insights['customer'] = {
+        summary['customer'] = {
             "title": "Kesehatan Pelanggan",
             "value": f"{avg_retention:.1f}%",
             "detail": detail,
@@ -373,268 +251,443 @@ def generate_smart_insights(df_trend, df_retention, df_prod):
         top_prod = df_prod.iloc[0]
         top_cat_name = top_prod['category_name']
         
-        insights['product'] = {
+        summary['product'] = {
             "title": "Produk Unggulan",
             "value": f"{top_prod['product_name']}",
             "detail": f"Rev: **${top_prod['total_revenue']:,.0f}** | Kat: **{top_cat_name}**",
             "status": "success"
         }
 
-    return insights
-
-def process_rfm_segmentation(df_rfm, analysis_date):
-    if df_rfm.empty:
-        return df_rfm
-    
-    df_rfm['last_order_date'] = pd.to_datetime(df_rfm['last_order_date'])
-    df_rfm['recency'] = (analysis_date - df_rfm['last_order_date']).dt.days
-    
-    df_rfm['R_Score'] = pd.qcut(df_rfm['recency'].rank(method='first'), q=5, labels=[5, 4, 3, 2, 1])
-    df_rfm['F_Score'] = pd.qcut(df_rfm['frequency'].rank(method='first'), q=5, labels=[1, 2, 3, 4, 5])
-    
-    seg_map = {
-        r'[1-2][1-2]': 'Lost',
-        r'[1-2][3-5]': 'At Risk',
-        r'[3-4]1': 'New Customers',
-        r'51': 'New Customers',
-        r'[3-4][2-3]': 'Potential',
-        r'[3-4][4-5]': 'Loyal Customers',
-        r'5[2-3]': 'Loyal Customers',
-        r'5[4-5]': 'Champions'
-    }
-    
-    df_rfm['Segment'] = (df_rfm['R_Score'].astype(str) + df_rfm['F_Score'].astype(str)).replace(seg_map, regex=True)
-    
-    valid_segments = ['Champions', 'Loyal Customers', 'Potential', 'New Customers', 'At Risk', 'Lost']
-    df_rfm.loc[~df_rfm['Segment'].isin(valid_segments), 'Segment'] = 'Potential'
-    
-    return df_rfm
+    return summary
 
 # ==========================================
-# 6. PDF GENERATION LOGIC (UPDATED WITH TARGETS)
+# 7. DASHBOARD UTAMA
 # ==========================================
+INSIGHT_PREVIEW = int(os.getenv("DASH_INSIGHT_PREVIEW", "8"))
+SEVERITY_ICONS = {'error': '🔴', 'warning': '🟠', 'success': '🟢', 'info': 'ℹ️'}
+TABS = ["📈 Strategi Keuangan", "🌍 Geografi Pasar", "🤝 Loyalitas Pelanggan", "📦 Efisiensi Produk",
+        "👔 Tim & Pengiriman"]
+
+# Dataset yang dibutuhkan scorecard/insight dan setiap tab (lihat lazy_data.DATASETS).
+SCORECARD_DATASETS = ['trend', 'retention', 'retention_prev', 'clv_count', 'clv_top', 'product']
+TAB_DATASETS = {
+    TABS[0]: ['trend', 'category', 'rolling', 'yoy', 'qoq', 'agg_bounds'],
+    TABS[1]: ['geo'],
+    TABS[2]: ['retention', 'rfm_counts', 'rfm_points'],
+    TABS[3]: ['product'],
+    TABS[4]: ['employee_sales', 'shipper_freight'],
+}
+
+def render_table_page(data, kpi_type, order_by, key, style):
+    """Tabel detail dengan pagination di server: hanya satu halaman yang dikirim ke browser."""
+    df_count = data.query(kpi_type, ('count',))
+    total_rows = int(df_count['total_rows'].iloc[0]) if not df_count.empty else 0
+    if total_rows == 0:
+        st.info("Tidak ada data.")
+        return
+    total_pages = -(-total_rows // PAGE_SIZE)
+    page = st.number_input(f"Halaman (1-{total_pages})", min_value=1, max_value=total_pages,
+                           value=1, step=1, key=key)
+    offset = (page - 1) * PAGE_SIZE
+    df_page = data.query(kpi_type, ('page', order_by, PAGE_SIZE, offset))
+    st.dataframe(style(df_page), use_container_width=True, hide_index=True)
+    st.caption(f"Baris {offset + 1:,}-{offset + len(df_page):,} dari {total_rows:,}")
+
+def render_financial_tab(data, sel_year, monthly_revenue_target):
+    import plotly.express as px
+    df_trend, df_cat_perf = data.need('trend', 'category')
+    st.subheader(f"Analisis Keuangan & Target Pencapaian - {sel_year}")
+    
+    # Chart Comparison
+    if not df_trend.empty:
+        fig_rev_comp = create_revenue_comparison_chart(df_trend, monthly_revenue_target)
+        st.plotly_chart(fig_rev_comp, use_container_width=True)
+        
+        col_sum1, col_sum2 = st.columns(2)
+        
+        with col_sum1:
+            if not df_cat_perf.empty:
+                fig_pie = px.pie(
+                    df_cat_perf,
+                    names='category_name',
+                    values='total_revenue',
+                    title='Proporsi Revenue per Kategori',
+                    hole=0.4
+                )
+                fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                st.plotly_chart(fig_pie, use_container_width=True)
+        
+        with col_sum2:
+                st.markdown("##### 📊 Monthly Performance Summary")
+                display_df = chart_prep.revenue_vs_target(df_trend, monthly_revenue_target)[
+                    ['month_name', 'total_revenue', 'target', 'achievement_pct']
+                ].copy()
+                display_df.columns = ['Month', 'Actual ($)', 'Target ($)', 'Achievement (%)']
+                
+                st.dataframe(
+                    display_df.style.format({
+                        'Actual ($)': '${:,.0f}',
+                        'Target ($)': '${:,.0f}',
+                        'Achievement (%)': '{:.1f}%'
+                    }).background_gradient(cmap='RdYlGn', subset=['Achievement (%)']),
+                    use_container_width=True,
+                    hide_index=True
+                )
 
-class PDFReport(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 10)
-        self.set_text_color(150)
-        self.cell(0, 10, 'KELOMPOK 4 - STRATEGIC REPORT', 0, 1, 'R')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.set_text_color(128)
-        self.cell(0, 10, f'Halaman {self.page_no()}', 0, 0, 'C')
-
-    def chapter_title(self, label):
-        self.set_font('Arial', 'B', 16)
-        self.set_text_color(31, 119, 180) 
-        self.cell(0, 10, label, 0, 1, 'L')
-        self.line(10, self.get_y(), 200, self.get_y())
-        self.ln(5)
-
-    def chapter_body(self, text):
-        self.set_font('Arial', '', 11)
-        self.set_text_color(50)
-        self.multi_cell(0, 6, text)
-        self.ln()
-
-    def add_metric_box(self, label, value, x_pos, y_pos, width=45):
-        self.set_xy(x_pos, y_pos)
-        self.set_fill_color(240, 242, 246) 
-        self.rect(x_pos, y_pos, width, 25, 'F')
-        
-        self.set_xy(x_pos, y_pos + 3)
-        self.set_font('Arial', '', 9)
-        self.set_text_color(100)
-        self.cell(width, 5, label, 0, 2, 'C')
-        
-        self.set_font('Arial', 'B', 14)
-        self.set_text_color(0)
-        self.cell(width, 8, str(value), 0, 2, 'C')
-
-    def create_table(self, df, col_widths, col_names):
-        self.set_font('Arial', 'B', 10)
-        self.set_fill_color(31, 119, 180)
-        self.set_text_color(255)
-        
-        for col_name, width in zip(col_names, col_widths):
-            self.cell(width, 8, col_name, 1, 0, 'C', True)
-        self.ln()
-        
-        self.set_font('Arial', '', 9)
-        self.set_text_color(0)
-        fill = False
-        for _, row in df.iterrows():
-            for item, width in zip(row, col_widths):
-                text = str(item)
-                if len(text) > 25: text = text[:22] + "..." 
-                self.cell(width, 7, text, 1, 0, 'L', fill)
-            self.ln()
-            fill = not fill 
-
-def save_plot_to_image(fig):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmpfile:
-        fig.savefig(tmpfile.name, bbox_inches='tight', dpi=100)
-        return tmpfile.name
-
-def generate_pdf(data_dict, year_label, rev_target, ret_target):
-    pdf = PDFReport()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    
-    df_fin = data_dict.get('financial', pd.DataFrame())
-    df_cust = data_dict.get('retention', pd.DataFrame())
-    df_prod = data_dict.get('product', pd.DataFrame())
-    df_clv = data_dict.get('clv', pd.DataFrame())
-
-    # HALAMAN 1: Header
-    pdf.add_page()
-    pdf.set_font('Arial', 'B', 20)
-    pdf.cell(0, 15, f'Laporan Strategis Northwind: {year_label}', 0, 1, 'C')
-    pdf.set_font('Arial', 'I', 10)
-    pdf.cell(0, 5, f'Tanggal Cetak: {datetime.datetime.now().strftime("%d %B %Y")}', 0, 1, 'C')
-    pdf.ln(10)
-
-    start_y = pdf.get_y()
-    
-    total_rev = df_fin['total_revenue'].sum() if not df_fin.empty else 0
-    avg_ret = df_cust['retention_rate'].mean() if not df_cust.empty else 0
-    top_prod_name = df_prod.iloc[0]['product_name'] if not df_prod.empty else "-"
-    if len(top_prod_name) > 15: top_prod_name = top_prod_name[:12] + "..."
-
-    # Scorecards
-    pdf.add_metric_box("Total Revenue", f"${total_rev:,.0f}", 15, start_y)
-    pdf.add_metric_box("Avg Retention", f"{avg_ret:.1f}%", 65, start_y)
-    pdf.add_metric_box("Top Product", top_prod_name, 115, start_y)
-    pdf.add_metric_box("Active Month", f"{len(df_fin)} Bulan", 165, start_y)
-    
-    pdf.set_y(start_y + 35)
+def render_forecast_section(engine, data, sel_year, monthly_revenue_target):
+    import plotly.graph_objects as go
+    st.markdown("---")
+    st.subheader("🔮 Forecast Revenue vs Target")
+    if not table_ready(engine, FORECAST_TABLE):
+        st.info("Forecast belum tersedia. Jalankan ETL dengan ETL_FORECAST=1 untuk membangun tabel revenue_forecast.")
+        return
+    df_trend, df_forecast = data.need('trend', 'forecast')
+    if df_forecast.empty:
+        st.info(f"Tidak ada bulan forecast di tahun {sel_year} (forecast dimulai setelah data terakhir).")
+        return
+
+    fitted_through = pd.to_datetime(df_forecast['fitted_through'].max())
+    df_fc = chart_prep.forecast_vs_target(df_trend, df_forecast, monthly_revenue_target, fitted_through)
+    fig = go.Figure()
+    # Bulan setelah data lengkap terakhir: aktual parsial ditandai, proyeksi memakai forecast.
+    fig.add_trace(go.Bar(
+        x=df_fc['month_name'], y=df_fc['actual'], name='Actual Revenue',
+        marker_color=['#aec7e8' if partial else '#1f77b4' for partial in df_fc['partial']],
+        text=['Parsial' if partial else '' for partial in df_fc['partial']], textposition='outside'
+    ))
+    fig.add_trace(go.Scatter(
+        x=pd.concat([df_fc['month_name'], df_fc['month_name'][::-1]]),
+        y=pd.concat([df_fc['upper'], df_fc['lower'][::-1]]),
+        fill='toself', fillcolor='rgba(255,127,14,0.2)', line=dict(width=0),
+        hoverinfo='skip', name='Interval 95%'
+    ))
+    fig.add_trace(go.Scatter(x=df_fc['month_name'], y=df_fc['forecast'], mode='lines+markers',
+                             name='Forecast', line=dict(color='#ff7f0e', width=3)))
+    fig.add_trace(go.Scatter(x=df_fc['month_name'], y=df_fc['target'], mode='lines',
+                             name='Target', line=dict(color='red', width=2, dash='dash')))
+    fig.update_layout(
+        title=f'Actual + Forecast vs Target Bulanan - {sel_year}',
+        xaxis_title='Bulan', yaxis_title='Revenue ($)', hovermode='x unified', height=450,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    projected = df_fc['projected'].sum()
+    annual_target = monthly_revenue_target * 12
+    col_fc1, col_fc2, col_fc3 = st.columns(3)
+    col_fc1.metric("Proyeksi Revenue Setahun", f"${projected:,.0f}",
+                   f"{chart_prep.achievement_pct(projected, annual_target)}% dari target")
+    col_fc2.metric("Target Setahun", f"${annual_target:,.0f}")
+    col_fc3.metric("Data Aktual s.d.", fitted_through.strftime('%b %Y'))
+
+def render_period_section(engine, data, sel_year):
+    import plotly.express as px
+    import plotly.graph_objects as go
+    df_rolling, df_yoy, df_qoq, df_bounds = data.need('rolling', 'yoy', 'qoq', 'agg_bounds')
+    st.markdown("---")
+    st.subheader("📆 Analisis Rolling & Multi-Tahun")
+    if df_bounds.empty or df_bounds['first_month'].isna().all():
+        st.info("Agregat periode belum tersedia. Jalankan ETL untuk membangun tabel agg_sales_monthly.")
+        return
+
+    col_roll, col_yoy = st.columns(2)
+    with col_roll:
+        if not df_rolling.empty:
+            fig_roll = px.line(
+                df_rolling, x='month_start', y='revenue_12m', markers=True,
+                title='Revenue Trailing 12 Bulan',
+                labels={'month_start': 'Bulan', 'revenue_12m': 'Revenue 12 Bulan ($)'}
+            )
+            st.plotly_chart(fig_roll, use_container_width=True)
+
+    with col_yoy:
+        if not df_yoy.empty:
+            fig_yoy = go.Figure()
+            fig_yoy.add_trace(go.Bar(x=df_yoy['month_name'], y=df_yoy['revenue'], name=str(sel_year)))
+            fig_yoy.add_trace(go.Bar(x=df_yoy['month_name'], y=df_yoy['revenue_prev_year'], name=str(sel_year - 1)))
+            fig_yoy.update_layout(title='Year-over-Year per Bulan', barmode='group', yaxis_title='Revenue ($)')
+            st.plotly_chart(fig_yoy, use_container_width=True)
+
+            ytd, ytd_prev = df_yoy['ytd_revenue'].iloc[-1], df_yoy['ytd_revenue_prev_year'].iloc[-1]
+            ytd_growth = f"{(ytd - ytd_prev) / ytd_prev * 100:+.1f}% YoY" if pd.notna(ytd_prev) and ytd_prev else None
+            st.metric("YTD Revenue", f"${ytd:,.0f}", delta=ytd_growth)
+
+    if not df_qoq.empty:
+        st.markdown("##### Quarter-over-Quarter")
+        df_qoq_view = df_qoq.assign(
+            quarter=lambda df: 'Q' + df['quarter'].astype(str),
+            qoq_pct=lambda df: (df['revenue'] - df['revenue_prev_quarter'])
+            / df['revenue_prev_quarter'].where(df['revenue_prev_quarter'] != 0) * 100
+        )
+        st.dataframe(
+            df_qoq_view.style.format({
+                'revenue': '${:,.0f}', 'revenue_prev_quarter': '${:,.0f}', 'qoq_pct': '{:+.1f}%'
+            }, na_rep='-'),
+            use_container_width=True, hide_index=True
+        )
 
-    # 1. KEUANGAN (Revenue vs Target)
-    pdf.chapter_title('1. Pencapaian Target Keuangan')
-    if not df_fin.empty:
-        pdf.chapter_body(f"Total revenue tahun ini mencapai ${total_rev:,.0f} dengan target bulanan ${rev_target:,.0f}.")
-        
-        # CHART: Revenue Bar + Target Line (Matplotlib)
-        plt.figure(figsize=(10, 4))
-        sns.barplot(data=df_fin, x='month_name', y='total_revenue', color='#1f77b4', label='Actual')
-        plt.axhline(y=rev_target, color='red', linestyle='--', linewidth=2, label=f'Target (${rev_target:,.0f})')
-        plt.title(f'Monthly Revenue vs Target ({year_label})')
-        plt.ylabel('Revenue ($)')
-        plt.xlabel('')
-        plt.legend()
-        plt.grid(axis='y', linestyle='--', alpha=0.5)
-        plt.xticks(rotation=45)
-        
-        img_path = save_plot_to_image(plt.gcf())
-        pdf.image(img_path, x=10, w=190)
-        plt.close()
-        os.unlink(img_path)
-        
-        pdf.ln(5)
-        
-        # TABLE: Revenue Summary
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(0, 10, 'Rincian Pencapaian Revenue Bulanan', 0, 1)
-        
-        # Prepare table data
-        df_fin['Target'] = rev_target
-        df_fin['Achv'] = (df_fin['total_revenue'] / rev_target) * 100
-        
-        table_data = df_fin[['month_name', 'total_revenue', 'Target', 'Achv']].copy()
-        # Formatting data for PDF table
-        table_data['total_revenue'] = table_data['total_revenue'].apply(lambda x: f"${x:,.0f}")
-        table_data['Target'] = table_data['Target'].apply(lambda x: f"${x:,.0f}")
-        table_data['Achv'] = table_data['Achv'].apply(lambda x: f"{x:.1f}%")
-        
-        pdf.create_table(
-            table_data, 
-            col_widths=[50, 45, 45, 40], 
-            col_names=['Bulan', 'Actual', 'Target', 'Achievement']
+    # Rentang bebas: dua lookup kumulatif per seri, berapa pun panjang histori.
+    months = pd.date_range(df_bounds['first_month'].iloc[0], df_bounds['last_month'].iloc[0], freq='MS').date
+    default_start = months[max(0, len(months) - 12)]
+    start_month, end_month = st.select_slider(
+        "Rentang bulan", options=list(months), value=(default_start, months[-1]),
+        format_func=lambda d: d.strftime('%b %Y'), key='period_range'
+    )
+    df_range = get_period_kpi(engine, start_month, end_month, data.category_sql)
+    if not df_range.empty:
+        current = df_range[df_range['period'] == 'current'].iloc[0]
+        previous = df_range[df_range['period'] == 'previous'].iloc[0]
+        col_r1, col_r2, col_r3 = st.columns(3)
+        for col, label, field, fmt in [
+            (col_r1, "💰 Revenue", 'revenue', "${:,.0f}"),
+            (col_r2, "🧾 Orders", 'orders', "{:,.0f}"),
+            (col_r3, "📦 Quantity", 'quantity', "{:,.0f}"),
+        ]:
+            value, prev_value = current[field], previous[field]
+            delta = (f"{(value - prev_value) / prev_value * 100:+.1f}% vs periode sebelumnya"
+                     if pd.notna(prev_value) and prev_value else None)
+            col.metric(label, fmt.format(value) if pd.notna(value) else "-", delta=delta)
+
+def render_geo_tab(engine, data, sel_year):
+    import plotly.express as px
+    df_geo = data.get('geo')
+    st.subheader("Sebaran Penjualan Global")
+    st.markdown("Analisis pasar berdasarkan lokasi pelanggan untuk mengidentifikasi wilayah potensial.")
+    
+    if not df_geo.empty:
+        fig_map = px.choropleth(
+            df_geo[df_geo['country'] != OTHERS_LABEL],
+            locations="country",
+            locationmode="country names",
+            color="total_revenue",
+            hover_name="country",
+            hover_data={"total_orders": True, "total_revenue": ":$.2f"},
+            color_continuous_scale="Viridis",
+            title=f"Distribusi Revenue per Negara ({sel_year})"
         )
-    else:
-        pdf.chapter_body("Data keuangan tidak tersedia.")
+        fig_map.update_geos(projection_type="natural earth")
+        fig_map.update_layout(height=500, margin={"r":0,"t":50,"l":0,"b":0})
+        st.plotly_chart(fig_map, use_container_width=True)
+        
+        with st.expander("🌍 Lihat Data Detail Per Negara"):
+            render_table_page(
+                data, 'geo_performance', 'total_revenue DESC, country', key='geo_page',
+                style=lambda df: df.style.format({'total_revenue': '${:,.2f}'})
+                .background_gradient(cmap='Blues', subset=['total_revenue'])
+            )
+
+    if table_ready(engine, FORECAST_TABLE):
+        df_country_fc = data.get('country_forecast')
+        if not df_country_fc.empty:
+            with st.expander("🔮 Forecast 3 Bulan ke Depan per Negara (semua kategori)"):
+                st.dataframe(
+                    df_country_fc[['country', 'forecast_3m', 'stderr_3m']].style.format(
+                        {'forecast_3m': '${:,.0f}', 'stderr_3m': '±${:,.0f}'}),
+                    use_container_width=True, hide_index=True
+                )
 
-    # 2. CUSTOMER (Retention vs Target)
-    pdf.add_page()
-    pdf.chapter_title('2. Target Retensi Pelanggan')
+def render_clv_section(engine, data):
+    st.markdown("---")
+    st.subheader("💎 Prediksi Customer Lifetime Value")
+    if not table_ready(engine, CLV_TABLE):
+        st.info("Prediksi CLV belum tersedia. Jalankan ETL dengan ETL_CLV=1 untuk membangun tabel customer_clv.")
+        return
+    st.caption("Model BG/NBD + Gamma-Gamma atas seluruh histori order, dihitung saat ETL. "
+               "Daftar: pelanggan yang bertransaksi di filter terpilih.")
+    render_table_page(
+        data, 'clv_predicted', 'predicted_clv DESC, company_name', key='clv_page',
+        style=lambda df: df[['company_name', 'country', 'total_orders', 'p_alive',
+                             'expected_purchases', 'expected_order_value', 'predicted_clv']]
+        .style.format({'p_alive': '{:.0%}', 'expected_purchases': '{:.1f}',
+                       'expected_order_value': '${:,.0f}', 'predicted_clv': '${:,.0f}'})
+        .background_gradient(cmap='Greens', subset=['predicted_clv'])
+    )
+
+def render_customer_tab(data, sel_year, retention_target):
+    import plotly.express as px
+    # Segmentasi RFM dihitung di server; yang diambil hanya ringkasan & sampel.
+    df_retention, df_rfm_counts = data.need('retention', 'rfm_counts')
+    st.subheader("Analisis Customer Retention & Target")
     
-    if not df_cust.empty:
-        pdf.chapter_body(f"Rata-rata retensi adalah {avg_ret:.1f}% dibandingkan target {ret_target}%.")
-
-        # CHART: Retention Line + Target Line
-        plt.figure(figsize=(10, 4))
-        plt.plot(df_cust['month'], df_cust['retention_rate'], marker='o', color='green', linewidth=2, label='Actual %')
-        plt.axhline(y=ret_target, color='red', linestyle='--', linewidth=2, label=f'Target ({ret_target}%)')
-        plt.title('Monthly Retention Rate vs Target')
-        plt.ylim(0, 150)
-        plt.ylabel('Retention Rate (%)')
-        plt.legend()
-        plt.grid(True, alpha=0.5)
-        
-        img_path = save_plot_to_image(plt.gcf())
-        pdf.image(img_path, x=10, w=190)
-        plt.close()
-        os.unlink(img_path)
-        pdf.ln(5)
-
-        # TABLE: Retention Summary
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(0, 10, 'Analisis Gap Retensi', 0, 1)
+    # Retention Comparison Chart
+    if not df_retention.empty:
+        fig_ret_comp, df_ret_target = create_retention_comparison_chart(df_retention, retention_target)
+        st.plotly_chart(fig_ret_comp, use_container_width=True)
         
-        df_cust['Target_Ret'] = ret_target
-        df_cust['Gap'] = df_cust['retention_rate'] - ret_target
+        # Performance Summary
+        months_above_target = len(df_ret_target[df_ret_target['retention_rate'] >= retention_target])
+        avg_gap = df_ret_target['gap'].mean()
         
-        table_data_cust = df_cust[['month', 'retention_rate', 'Target_Ret', 'Gap']].copy()
-        table_data_cust['retention_rate'] = table_data_cust['retention_rate'].apply(lambda x: f"{x:.1f}%")
-        table_data_cust['Target_Ret'] = table_data_cust['Target_Ret'].apply(lambda x: f"{x}%")
-        table_data_cust['Gap'] = table_data_cust['Gap'].apply(lambda x: f"{x:+.1f}%")
+        col_ret1, col_ret2, col_ret3 = st.columns(3)
+        col_ret1.metric("Bulan di Atas Target", f"{months_above_target}/12")
+        col_ret2.metric("Avg Gap vs Target", f"{avg_gap:+.1f}%")
+        col_ret3.metric("Best Month", df_ret_target.loc[df_ret_target['retention_rate'].idxmax(), 'month'])
+    
+    st.markdown("---")
+    st.subheader("Segmentasi Pelanggan (RFM Analysis)")
+    with st.expander("ℹ️ Penjelasan Kategori Pelanggan (Klik untuk Membuka)"):
+        st.markdown("""
+        Pelanggan dikelompokkan berdasarkan **Recency** (hari sejak belanja terakhir) dan **Frequency** (jumlah transaksi):
+        
+        1.  🥇 **Champions:** Pelanggan terbaik! Baru saja berbelanja (Recency kecil) dan sangat sering bertransaksi.
+        2.  💎 **Loyal Customers:** Pelanggan setia yang berbelanja secara konsisten.
+        3.  🌱 **Potential / New:** Pelanggan baru atau pelanggan yang berpotensi menjadi loyal jika dirawat.
+        4.  ⚠️ **At Risk:** Pelanggan yang dulunya sering belanja, tapi **sudah lama menghilang**. Perlu segera dihubungi!
+        5.  💤 **Lost:** Pelanggan yang sudah lama tidak belanja dan frekuensi belanjanya rendah.
+        """)
+    
+    # CLV & RFM VISUALIZATION (RESTORED SEGMENTATION)
+    if not df_rfm_counts.empty:
+        col_rfm1, col_rfm2 = st.columns(2)
+        
+        rfm_colors = {
+            'Champions': '#198754', 'Loyal Customers': '#0dcaf0',
+            'Potential': '#ffc107', 'New Customers': '#6f42c1',
+            'At Risk': '#fd7e14', 'Lost': '#dc3545'
+        }
         
-        pdf.create_table(
-            table_data_cust,
-            col_widths=[30, 50, 50, 50],
-            col_names=['Bulan', 'Actual Rate', 'Target Rate', 'Gap vs Target']
-        )
-    pdf.ln(10)
-
-    # 3. PRODUK & CLV (Tidak ada perubahan signifikan, tetap rapi)
-    pdf.add_page()
-    pdf.chapter_title('3. Top Produk & Pelanggan')
+        # 1. Bar Chart: Distribution
+        with col_rfm1:
+            segment_counts = df_rfm_counts.rename(columns={'segment': 'Segment'})
+            
+            fig_seg = px.bar(
+                segment_counts, x='Segment', y='jumlah',
+                color='Segment', color_discrete_map=rfm_colors,
+                title='Distribusi Pelanggan per Segmen'
+            )
+            st.plotly_chart(fig_seg, use_container_width=True)
+
+        # 2. Recency vs Monetary: sampel titik per segmen atau heatmap hasil binning
+        with col_rfm2:
+            view = st.radio("Tampilan", ["Sampel per segmen", "Heatmap kepadatan"],
+                            horizontal=True, key='rfm_view')
+            if view == "Sampel per segmen":
+                df_points = data.get('rfm_points').rename(columns={'segment': 'Segment'})
+                fig_scatter = px.scatter(
+                    df_points, x='recency', y='monetary', color='Segment',
+                    size='frequency', hover_name='customer_name',
+                    title='Peta Persebaran: Recency vs Monetary',
+                    color_discrete_map=rfm_colors
+                )
+                st.plotly_chart(fig_scatter, use_container_width=True)
+                st.caption(f"Maksimal {SAMPLE_PER_GROUP} pelanggan per segmen.")
+            else:
+                df_bins = data.get('rfm_bins')
+                fig_heat = px.density_heatmap(
+                    df_bins, x='recency', y='monetary', z='jumlah', histfunc='sum',
+                    nbinsx=SCATTER_BINS, nbinsy=SCATTER_BINS,
+                    title='Kepadatan Pelanggan: Recency vs Monetary'
+                )
+                st.plotly_chart(fig_heat, use_container_width=True)
+
+        # Data Table
+        with st.expander("📋 Lihat Detail Pelanggan per Segmen"):
+            render_table_page(
+                data, 'rfm_segments', 'monetary DESC, customer_name', key='rfm_page',
+                style=lambda df: df[['customer_name', 'segment', 'recency', 'frequency', 'monetary']]
+                .rename(columns={'segment': 'Segment'})
+                .style.format({'monetary': '${:,.0f}'})
+                .background_gradient(cmap='Reds', subset=['recency'])
+            )
 
+def render_product_tab(data):
+    import plotly.express as px
+    df_prod = data.get('product')
+    st.subheader("Profitabilitas Produk")
     if not df_prod.empty:
-        # Chart Product
-        top_10 = df_prod.head(10).sort_values('total_revenue', ascending=True)
-        plt.figure(figsize=(10, 5))
-        bars = plt.barh(top_10['product_name'], top_10['total_revenue'], color='#1f77b4')
-        plt.title('Top 10 Produk (Revenue)')
-        plt.xlabel('Revenue ($)')
-        img_path = save_plot_to_image(plt.gcf())
-        pdf.image(img_path, x=10, w=180)
-        plt.close()
-        os.unlink(img_path)
-        pdf.ln(5)
-        
-    if not df_clv.empty:
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(0, 10, 'Top 5 Pelanggan (High Value)', 0, 1)
-        
-        top_clv = df_clv.head(5).copy()
-        top_clv['formatted_val'] = top_clv['monetary_value'].apply(lambda x: f"${x:,.0f}")
-        table_data = top_clv[['company_name', 'frequency', 'formatted_val']]
-        
-        pdf.create_table(
-            table_data, 
-            col_widths=[100, 30, 50], 
-            col_names=['Nama Perusahaan', 'Order', 'Total Belanja']
+        # Top-N + baris "Others" (dijumlah di server).
+        fig_prod = px.bar(
+            df_prod,
+            x='total_revenue',
+            y='product_name',
+            orientation='h',
+            title=f'Top {len(df_prod[df_prod["product_name"] != OTHERS_LABEL])} Produk Paling Menguntungkan',
+            color='category_name',
+            labels={'total_revenue': 'Revenue ($)', 'product_name': 'Nama Produk'}
         )
+        fig_prod.update_layout(yaxis={'categoryorder': 'array', 'categoryarray': df_prod['product_name'][::-1].tolist()})
+        st.plotly_chart(fig_prod, use_container_width=True)
 
-    return pdf.output(dest='S').encode('latin-1')
+def render_affinity_section(engine, data):
+    st.markdown("---")
+    st.subheader("🧺 Afinitas Produk (Market Basket)")
+    if not table_ready(engine, AFFINITY_TABLE):
+        st.info("Afinitas produk belum tersedia. Jalankan ETL dengan ETL_BASKET=1 untuk membangun tabel product_affinity.")
+        return
+    st.caption("Pasangan produk yang sering dibeli dalam satu order (seluruh histori). "
+               "Lift > 1: dibeli bersama lebih sering dari kebetulan; confidence: P(produk terkait | produk).")
+    render_table_page(
+        data, 'product_affinity', 'lift DESC, pair_orders DESC, product_name, related_product', key='affinity_page',
+        style=lambda df: df[['product_name', 'related_product', 'related_category',
+                             'pair_orders', 'support', 'confidence', 'lift']]
+        .style.format({'support': '{:.2%}', 'confidence': '{:.0%}', 'lift': '{:.2f}'})
+        .background_gradient(cmap='Purples', subset=['lift'])
+    )
+
+def render_team_tab(engine, data, sel_year, exact_orders=True):
+    """exact_orders=False: filter >1 kategori, jumlah order per kategori tidak distinct."""
+    import plotly.express as px
+    st.subheader(f"Kinerja Tim Sales & Biaya Pengiriman - {sel_year}")
+    if not table_ready(engine, EMPLOYEE_MONTHLY_TABLE):
+        st.info("Agregat karyawan/shipper belum tersedia. Jalankan ETL untuk membangun agg_employee_monthly.")
+        return
+    df_emp, df_ship = data.need('employee_sales', 'shipper_freight')
+
+    if not df_emp.empty:
+        col_emp1, col_emp2 = st.columns(2)
+        with col_emp1:
+            fig_emp = px.bar(
+                df_emp.sort_values('direct_revenue'), x='direct_revenue', y='employee_name', orientation='h',
+                title='Revenue Langsung per Karyawan', color='title',
+                labels={'direct_revenue': 'Revenue ($)', 'employee_name': 'Karyawan'}
+            )
+            st.plotly_chart(fig_emp, use_container_width=True)
+        with col_emp2:
+            # Manajer: revenue tim = dirinya + semua bawahan (closure table).
+            managers = df_emp[df_emp['team_size'] > 0].sort_values('team_revenue')
+            fig_team = px.bar(
+                managers, x='team_revenue', y='employee_name', orientation='h',
+                title='Revenue Tim per Manajer (Rollup Hierarki)', hover_data=['team_size'],
+                labels={'team_revenue': 'Revenue Tim ($)', 'employee_name': 'Manajer'}
+            )
+            st.plotly_chart(fig_team, use_container_width=True)
+        with st.expander("👔 Detail Hierarki Karyawan"):
+            order_cols = ['direct_orders', 'team_orders'] if exact_orders else []
+            if not exact_orders:
+                st.caption("Jumlah order disembunyikan: order dengan beberapa kategori terpilih "
+                           "akan terhitung lebih dari sekali.")
+            st.dataframe(
+                df_emp[['employee_name', 'title', 'manager_name', 'level', 'team_size', 'direct_revenue',
+                        'team_revenue', *order_cols]]
+                .style.format({'direct_revenue': '${:,.0f}', 'team_revenue': '${:,.0f}'}),
+                use_container_width=True, hide_index=True
+            )
+
+    st.markdown("---")
+    if not df_ship.empty:
+        col_ship1, col_ship2 = st.columns(2)
+        with col_ship1:
+            fig_freight = px.line(
+                df_ship, x='month_start', y='freight', color='shipper_name', markers=True,
+                title='Biaya Freight Bulanan per Shipper',
+                labels={'month_start': 'Bulan', 'freight': 'Freight ($)', 'shipper_name': 'Shipper'}
+            )
+            st.plotly_chart(fig_freight, use_container_width=True)
+        with col_ship2:
+            summary = df_ship.groupby('shipper_name', as_index=False)[['orders', 'freight', 'revenue']].sum()
+            summary['freight_per_order'] = summary['freight'] / summary['orders']
+            summary['freight_pct'] = summary['freight'] / summary['revenue'] * 100
+            st.markdown("##### 🚚 Ringkasan Shipper (setahun)")
+            st.dataframe(
+                summary.style.format({'freight': '${:,.0f}', 'revenue': '${:,.0f}',
+                                      'freight_per_order': '${:,.2f}', 'freight_pct': '{:.1f}%'}),
+                use_container_width=True, hide_index=True
+            )
+        st.caption("Freight dihitung sekali per order; filter kategori tidak berlaku untuk biaya pengiriman.")
 
-# ==========================================
-# 7. DASHBOARD UTAMA
-# ==========================================
 def main():
+    # Judul dulu: halaman sudah tampil selagi engine/pool masih disiapkan.
+    st.title("🚀 Northwind Strategic Dashboard")
     engine = get_dw_engine()
     if not engine:
         st.stop()
@@ -660,7 +713,13 @@ def main():
         st.warning("Mohon pilih minimal satu kategori produk.")
         st.stop()
         
-    category_sql = create_category_filter(sel_cat)
+    category_sql = create_category_filter(sel_cat, opt_cat)
+
+    approx_mode = st.sidebar.toggle(
+        "⚡ Mode Perkiraan (HLL)",
+        value=os.getenv("DASH_APPROX_DISTINCT", "0") == "1",
+        help="Jumlah order & pelanggan distinct dihitung dari sketch HyperLogLog (galat ~1-2%), jauh lebih cepat pada data besar."
+    )
 
     # === TARGET SETTINGS (BARU!) ===
     st.sidebar.markdown("---")
@@ -686,35 +745,27 @@ def main():
         )
 
     # --- FETCH DATA ---
+    # Hanya dataset scorecard & insight; data tab lain diambil saat tab dibuka.
+    data = get_datasets(engine).bind(sel_year, category_sql, approx=approx_mode)
     with st.spinner('Menghitung metrik KPI...'):
-        df_trend = get_kpi_data(engine, 'financial_trend', sel_year, category_sql)
-        df_retention = get_kpi_data(engine, 'retention_rate', sel_year, category_sql)
-        df_clv = get_kpi_data(engine, 'customer_clv', sel_year, category_sql)
-        df_prod = get_kpi_data(engine, 'product_performance', sel_year, category_sql)
-        df_cat_perf = get_kpi_data(engine, 'category_performance', sel_year, category_sql)
-        df_geo = get_kpi_data(engine, 'geo_performance', sel_year, category_sql)
-        df_rfm_raw = get_kpi_data(engine, 'rfm_raw_data', sel_year, category_sql)
-        analysis_date = pd.Timestamp(year=sel_year, month=12, day=31)
-        df_rfm_segmented = process_rfm_segmentation(df_rfm_raw, analysis_date)
-        df_retention_prev = get_kpi_data(engine, 'retention_rate', sel_year - 1, category_sql)
+        df_trend, df_retention, df_retention_prev, df_clv_count, df_clv, df_prod = data.need(*SCORECARD_DATASETS)
 
     # --- MAIN CONTENT ---
-    st.title("🚀 Northwind Strategic Dashboard")
-    st.caption(f"Tahun Analisis: {sel_year}")
+    st.caption(f"Tahun Analisis: {sel_year}" + (" | ≈ Mode perkiraan: order & pelanggan distinct dari sketch HLL" if approx_mode else ""))
 
     # --- KPI SCORECARDS ---
     col1, col2, col3, col4 = st.columns(4)
     
     total_revenue = df_trend['total_revenue'].sum() if not df_trend.empty else 0
     avg_retention = df_retention['retention_rate'].mean() if not df_retention.empty else 0
-    active_customers = len(df_clv) if not df_clv.empty else 0
+    active_customers = int(df_clv_count['total_rows'].iloc[0]) if not df_clv_count.empty else 0
     top_product = df_prod.iloc[0]['product_name'] if not df_prod.empty else "-"
     avg_retention_prev = df_retention_prev['retention_rate'].mean() if not df_retention_prev.empty else 0
     retention_delta = avg_retention - avg_retention_prev
     
     # Hitung Achievement
     total_target = monthly_revenue_target * 12
-    revenue_achievement = calculate_achievement(total_revenue, total_target)
+    revenue_achievement = chart_prep.achievement_pct(total_revenue, total_target)
     
     col1.metric(
         "💰 Total Revenue", 
@@ -756,163 +807,35 @@ def main():
                 if len(prod_name) > 25: prod_name = prod_name[:25] + "..."
                 st.success(f"**{ins['product']['title']}**\n\n### {prod_name}\n{ins['product']['detail']}", icon="🏆")
 
-    # --- TABS ---
-    tab1, tab2, tab3, tab4 = st.tabs(["📈 Strategi Keuangan", "🌍 Geografi Pasar", "🤝 Loyalitas Pelanggan", "📦 Efisiensi Produk"])
-
-    # === TAB 1: FINANCIAL (UPDATED WITH TARGET) ===
-    with tab1:
-        st.subheader(f"Analisis Keuangan & Target Pencapaian - {sel_year}")
-        
-        # Chart Comparison
-        if not df_trend.empty:
-            fig_rev_comp = create_revenue_comparison_chart(df_trend, monthly_revenue_target)
-            st.plotly_chart(fig_rev_comp, use_container_width=True)
-            
-            col_sum1, col_sum2 = st.columns(2)
-            
-            with col_sum1:
-                if not df_cat_perf.empty:
-                    fig_pie = px.pie(
-                        df_cat_perf,
-                        names='category_name',
-                        values='total_revenue',
-                        title='Proporsi Revenue per Kategori',
-                        hole=0.4
-                    )
-                    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-                    st.plotly_chart(fig_pie, use_container_width=True)
-            
-            with col_sum2:
-                    st.markdown("##### 📊 Monthly Performance Summary")
-                    df_trend['achievement_pct'] = df_trend.apply(lambda row: calculate_achievement(row['total_revenue'], monthly_revenue_target), axis=1)
-                    display_df = df_trend[['month_name', 'total_revenue', 'target', 'achievement_pct']].copy()
-                    display_df.columns = ['Month', 'Actual ($)', 'Target ($)', 'Achievement (%)']
-                    
-                    st.dataframe(
-                        display_df.style.format({
-                            'Actual ($)': '${:,.0f}',
-                            'Target ($)': '${:,.0f}',
-                            'Achievement (%)': '{:.1f}%'
-                        }).background_gradient(cmap='RdYlGn', subset=['Achievement (%)']),
-                        use_container_width=True,
-                        hide_index=True
-                    )
-
-    # === TAB 2: GEOGRAPHIC ===
-    with tab2:
-        st.subheader("Sebaran Penjualan Global")
-        st.markdown("Analisis pasar berdasarkan lokasi pelanggan untuk mengidentifikasi wilayah potensial.")
-        
-        if not df_geo.empty:
-            fig_map = px.choropleth(
-                df_geo,
-                locations="country",
-                locationmode="country names",
-                color="total_revenue",
-                hover_name="country",
-                hover_data={"total_orders": True, "total_revenue": ":$.2f"},
-                color_continuous_scale="Viridis",
-                title=f"Distribusi Revenue per Negara ({sel_year})"
-            )
-            fig_map.update_geos(projection_type="natural earth")
-            fig_map.update_layout(height=500, margin={"r":0,"t":50,"l":0,"b":0})
-            st.plotly_chart(fig_map, use_container_width=True)
-            
-            with st.expander("🌍 Lihat Data Detail Per Negara"):
-                st.dataframe(
-                    df_geo.style.format({'total_revenue': '${:,.2f}'})
-                    .background_gradient(cmap='Blues', subset=['total_revenue']),
-                    use_container_width=True
-                )
-
-    # === TAB 3: CUSTOMER (UPDATED WITH TARGET & RFM) ===
-    with tab3:
-        st.subheader("Analisis Customer Retention & Target")
-        
-        # Retention Comparison Chart
-        if not df_retention.empty:
-            fig_ret_comp, df_ret_target = create_retention_comparison_chart(df_retention, retention_target)
-            st.plotly_chart(fig_ret_comp, use_container_width=True)
-            
-            # Performance Summary
-            months_above_target = len(df_ret_target[df_ret_target['retention_rate'] >= retention_target])
-            avg_gap = df_ret_target['gap'].mean()
-            
-            col_ret1, col_ret2, col_ret3 = st.columns(3)
-            col_ret1.metric("Bulan di Atas Target", f"{months_above_target}/12")
-            col_ret2.metric("Avg Gap vs Target", f"{avg_gap:+.1f}%")
-            col_ret3.metric("Best Month", df_ret_target.loc[df_ret_target['retention_rate'].idxmax(), 'month'])
-        
-        st.markdown("---")
-        st.subheader("Segmentasi Pelanggan (RFM Analysis)")
-        with st.expander("ℹ️ Penjelasan Kategori Pelanggan (Klik untuk Membuka)"):
-            st.markdown("""
-            Pelanggan dikelompokkan berdasarkan **Recency** (hari sejak belanja terakhir) dan **Frequency** (jumlah transaksi):
-            
-            1.  🥇 **Champions:** Pelanggan terbaik! Baru saja berbelanja (Recency kecil) dan sangat sering bertransaksi.
-            2.  💎 **Loyal Customers:** Pelanggan setia yang berbelanja secara konsisten.
-            3.  🌱 **Potential / New:** Pelanggan baru atau pelanggan yang berpotensi menjadi loyal jika dirawat.
-            4.  ⚠️ **At Risk:** Pelanggan yang dulunya sering belanja, tapi **sudah lama menghilang**. Perlu segera dihubungi!
-            5.  💤 **Lost:** Pelanggan yang sudah lama tidak belanja dan frekuensi belanjanya rendah.
-            """)
-        
-        # CLV & RFM VISUALIZATION (RESTORED SEGMENTATION)
-        if not df_rfm_segmented.empty:
-            col_rfm1, col_rfm2 = st.columns(2)
-            
-            rfm_colors = {
-                'Champions': '#198754', 'Loyal Customers': '#0dcaf0',
-                'Potential': '#ffc107', 'New Customers': '#6f42c1',
-                'At Risk': '#fd7e14', 'Lost': '#dc3545'
-            }
-            
-            # 1. Bar Chart: Distribution
-            with col_rfm1:
-                segment_counts = df_rfm_segmented['Segment'].value_counts().reset_index()
-                segment_counts.columns = ['Segment', 'jumlah']
-                
-                fig_seg = px.bar(
-                    segment_counts, x='Segment', y='jumlah',
-                    color='Segment', color_discrete_map=rfm_colors,
-                    title='Distribusi Pelanggan per Segmen'
-                )
-                st.plotly_chart(fig_seg, use_container_width=True)
-
-            # 2. Scatter Plot: Recency vs Monetary
-            with col_rfm2:
-                fig_scatter = px.scatter(
-                    df_rfm_segmented, x='recency', y='monetary', color='Segment',
-                    size='frequency', hover_name='customer_name',
-                    title='Peta Persebaran: Recency vs Monetary',
-                    color_discrete_map=rfm_colors
-                )
-                st.plotly_chart(fig_scatter, use_container_width=True)
+        df_insights = get_rule_insights(engine, sel_year, tuple(sorted(sel_cat)), tuple(sorted(opt_cat)))
+        if not df_insights.empty:
+            st.markdown(f"##### 🔎 {len(df_insights)} Insight Otomatis")
+            for row in df_insights.head(INSIGHT_PREVIEW).itertuples(index=False):
+                # '$' di-escape agar tidak dibaca sebagai rumus LaTeX oleh markdown.
+                st.markdown(f"{SEVERITY_ICONS.get(row.severity, 'ℹ️')} {row.message.replace('$', chr(92) + '$')}")
+            if len(df_insights) > INSIGHT_PREVIEW and st.checkbox("Tampilkan semua insight", key="all_insights"):
+                st.dataframe(df_insights[['severity', 'rule', 'message']], use_container_width=True, hide_index=True)
 
-            # Data Table
-            with st.expander("📋 Lihat Detail Pelanggan per Segmen"):
-                st.dataframe(
-                    df_rfm_segmented[['customer_name', 'Segment', 'recency', 'frequency', 'monetary']]
-                    .sort_values('monetary', ascending=False)
-                    .style.format({'monetary': '${:,.0f}'})
-                    .background_gradient(cmap='Reds', subset=['recency']),
-                    use_container_width=True
-                )
-
-    # === TAB 4: PRODUCT ===
-    with tab4:
-        st.subheader("Profitabilitas Produk")
-        if not df_prod.empty:
-            fig_prod = px.bar(
-                df_prod.head(15),
-                x='total_revenue',
-                y='product_name',
-                orientation='h',
-                title='Top 15 Produk Paling Menguntungkan',
-                color='category_name',
-                labels={'total_revenue': 'Revenue ($)', 'product_name': 'Nama Produk'}
-            )
-            fig_prod.update_layout(yaxis={'categoryorder': 'total ascending'})
-            st.plotly_chart(fig_prod, use_container_width=True)
+    # --- TABS ---
+    # Navigasi radio, bukan st.tabs: st.tabs selalu merender semua tab,
+    # di sini hanya tab aktif yang dirender dan datanya diambil.
+    active_tab = st.radio("Navigasi", TABS, horizontal=True, key='active_tab', label_visibility='collapsed')
+
+    if active_tab == TABS[0]:
+        render_financial_tab(data, sel_year, monthly_revenue_target)
+        render_forecast_section(engine, data, sel_year, monthly_revenue_target)
+        render_period_section(engine, data, sel_year)
+    elif active_tab == TABS[1]:
+        render_geo_tab(engine, data, sel_year)
+    elif active_tab == TABS[2]:
+        render_customer_tab(data, sel_year, retention_target)
+        render_clv_section(engine, data)
+    elif active_tab == TABS[3]:
+        render_product_tab(data)
+        render_affinity_section(engine, data)
+    else:
+        # Tanpa filter kategori (semua terpilih) atau satu kategori, order dari seri yang distinct.
+        render_team_tab(engine, data, sel_year, exact_orders=not category_sql or len(sel_cat) == 1)
 
     # --- DOWNLOAD SECTION (RESTORED PDF) ---
     st.sidebar.markdown("---")
@@ -920,6 +843,8 @@ def main():
     
     if st.sidebar.button("📥 Unduh Laporan PDF"):
         with st.spinner("Membuat Laporan Lengkap..."):
+            # matplotlib/seaborn/fpdf baru diimpor saat ekspor pertama.
+            from pdf_report import generate_pdf
             data_export = {
                 'financial': df_trend,
                 'retention': df_retention,
@@ -935,5 +860,22 @@ def main():
                 mime="application/pdf"
             )
 
+    with st.sidebar.expander("🧾 Data Mentah KPI", expanded=False):
+        import kpi_export
+        export_type = st.selectbox("Dataset:", kpi_export.EXPORT_KPIS, key="export_kpi")
+        export_fmt = st.selectbox("Format:", list(kpi_export.EXPORT_FORMATS), key="export_fmt")
+        # File di-stream oleh export API (python kpi_export.py serve), bukan ditampung di memori dashboard.
+        export_cats = sel_cat if category_sql else []
+        st.link_button(
+            "Download", kpi_export.export_url(export_type, sel_year, export_fmt, export_cats),
+            use_container_width=True
+        )
+
+    with st.sidebar.expander("🔌 Status Koneksi Pool", expanded=False):
+        st.json(db_connection.get_pool_metrics(engine))
+
+    # Selama user membaca tab ini, dataset tab lain diambil di background.
+    data.prefetch(name for tab in TABS for name in TAB_DATASETS[tab])
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
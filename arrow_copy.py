@@ -0,0 +1,266 @@
+import io
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from transform import CENTS_SUFFIX
+
+# Format COPY BINARY PostgreSQL: signature 11 byte, flags int32, panjang ekstensi int32.
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + (0).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+PGCOPY_TRAILER = (-1).to_bytes(2, 'big', signed=True)
+COPY_BATCH_ROWS = 100_000
+
+PG_EPOCH_DAYS = 10957  # 2000-01-01 - 1970-01-01
+NUMERIC_INT_GROUPS = 4  # bagian bulat numeric maksimal 16 digit desimal
+NUMERIC_POS, NUMERIC_NEG = 0x0000, 0x4000
+
+FIXED_TYPES = {
+    'smallint': '>i2', 'integer': '>i4', 'bigint': '>i8',
+    'real': '>f4', 'double precision': '>f8', 'boolean': '>u1',
+    'date': '>i4', 'timestamp without time zone': '>i8',
+}
+TEXT_TYPES = ('text', 'character varying', 'character')
+
+
+def to_arrow_tables(frames: Dict[str, pd.DataFrame]) -> Dict[str, pa.Table]:
+    """Ubah hasil transform ke Arrow; frame pandas dilepas satu per satu."""
+    tables = {}
+    for name in list(frames):
+        tables[name] = pa.Table.from_pandas(frames.pop(name), preserve_index=False)
+    return tables
+
+
+def read_target_types(dw_engine: Engine, schema: str, table_name: str) -> Dict[str, tuple]:
+    """Tipe kolom tabel tujuan: nama -> (data_type, numeric_scale)."""
+    with dw_engine.connect() as connection:
+        rows = connection.execute(text("""
+            SELECT column_name, data_type, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = :schema AND table_name = :table
+            ORDER BY ordinal_position
+        """), {'schema': schema, 'table': table_name})
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+
+# ------------------------------------------
+# Encoder kolom -> (panjang field, isi field)
+# ------------------------------------------
+
+def _valid_mask(column: pa.ChunkedArray) -> np.ndarray:
+    return pc.is_valid(column).to_numpy(zero_copy_only=False)
+
+
+def _numeric_values(column: pa.ChunkedArray) -> np.ndarray:
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    if pa.types.is_boolean(column.type):
+        column = column.cast(pa.int8())
+    return column.fill_null(0).to_numpy()
+
+
+def _encode_fixed(column: pa.ChunkedArray, data_type: str) -> tuple:
+    valid = _valid_mask(column)
+    if data_type == 'date' or data_type.startswith('timestamp'):
+        unit = 'D' if data_type == 'date' else 'us'
+        values = column.cast(pa.timestamp('us')).fill_null(0).to_numpy().astype(f'datetime64[{unit}]')
+        offset = PG_EPOCH_DAYS if unit == 'D' else PG_EPOCH_DAYS * 86_400_000_000
+        values = values.astype(np.int64) - offset
+    else:
+        values = _numeric_values(column)
+        if data_type in ('smallint', 'integer', 'bigint', 'boolean') and values.dtype.kind == 'f':
+            values = np.rint(values)
+    data = values.astype(FIXED_TYPES[data_type]).view(np.uint8).reshape(len(values), -1)
+    return valid, data
+
+
+def _encode_numeric(column: pa.ChunkedArray, scale: int, is_cents: bool) -> tuple:
+    """
+    numeric biner dengan lebar tetap: 4 grup bulat + 1 grup pecahan basis
+    10000 (weight=3). PostgreSQL menormalkan nol di depan/belakang saat recv.
+    """
+    if scale > 4:
+        raise ValueError(f"numeric scale {scale} belum didukung COPY binary")
+    valid = _valid_mask(column)
+    values = _numeric_values(column)
+    if is_cents:
+        scaled = values.astype(np.int64) * 10 ** scale // 100
+    else:
+        scaled = np.rint(values.astype(np.float64) * 10 ** scale).astype(np.int64)
+
+    sign = np.where(scaled < 0, NUMERIC_NEG, NUMERIC_POS)
+    magnitude = np.abs(scaled)
+    int_part, frac_part = np.divmod(magnitude, 10 ** scale)
+    groups = [(int_part // 10000 ** g) % 10000 for g in reversed(range(NUMERIC_INT_GROUPS))]
+    groups.append(frac_part * 10 ** (4 - scale))
+
+    n = len(values)
+    header = np.empty((n, 4), dtype='>i2')
+    header[:, 0] = NUMERIC_INT_GROUPS + 1
+    header[:, 1] = NUMERIC_INT_GROUPS - 1
+    header[:, 2] = sign
+    header[:, 3] = scale
+    digits = np.stack(groups, axis=1).astype('>i2')
+    data = np.concatenate([header.view(np.uint8), digits.view(np.uint8)], axis=1)
+    return valid, data.reshape(n, -1)
+
+
+def _encode_text(column: pa.ChunkedArray) -> tuple:
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        column = column.cast(pa.string())
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    array = array.cast(pa.large_string())
+
+    valid = _valid_mask(array)
+    _, offsets_buf, data_buf = array.buffers()
+    offsets = np.frombuffer(offsets_buf, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(data_buf, dtype=np.uint8) if data_buf is not None else np.empty(0, np.uint8)
+    return valid, (offsets, data)
+
+
+def _encode_column(column, data_type: str, scale: Optional[int], is_cents: bool) -> tuple:
+    if data_type == 'numeric':
+        return _encode_numeric(column, scale or 0, is_cents)
+    if data_type in FIXED_TYPES:
+        return _encode_fixed(column, data_type)
+    if data_type in TEXT_TYPES:
+        return _encode_text(column)
+    raise ValueError(f"Tipe {data_type} belum didukung COPY binary")
+
+
+def encode_copy_rows(batch: pa.Table, columns: List[tuple]) -> bytes:
+    """
+    Encode satu batch Arrow ke baris COPY BINARY dengan operasi numpy
+    (scatter byte per kolom), tanpa objek Python per baris.
+
+    columns: [(nama kolom Arrow, data_type tujuan, numeric_scale, is_cents)]
+    """
+    n = batch.num_rows
+    encoded = [
+        _encode_column(batch.column(name), data_type, scale, is_cents)
+        for name, data_type, scale, is_cents in columns
+    ]
+
+    # Panjang isi setiap field (-1 = NULL) dan ukuran total per baris.
+    lengths = []
+    for valid, data in encoded:
+        if isinstance(data, tuple):
+            offsets, _ = data
+            field_len = np.diff(offsets).astype(np.int64)
+        else:
+            field_len = np.full(n, data.shape[1], dtype=np.int64)
+        lengths.append(np.where(valid, field_len, -1))
+
+    row_size = 2 + sum(4 + np.maximum(length, 0) for length in lengths)
+    row_start = np.zeros(n, dtype=np.int64)
+    if n:
+        row_start[1:] = np.cumsum(row_size)[:-1]
+    out = np.zeros(int(row_size.sum()) if n else 0, dtype=np.uint8)
+
+    def scatter(positions: np.ndarray, payload: np.ndarray):
+        out[positions[:, None] + np.arange(payload.shape[1])] = payload
+
+    scatter(row_start, np.full(n, len(columns), dtype='>i2').view(np.uint8).reshape(n, 2))
+    cursor = row_start + 2
+    for (valid, data), length in zip(encoded, lengths):
+        scatter(cursor, length.astype('>i4').view(np.uint8).reshape(n, 4))
+        body = cursor + 4
+        if isinstance(data, tuple):
+            offsets, buffer = data
+            rows = np.flatnonzero(valid & (length > 0))
+            counts = length[rows]
+            total = int(counts.sum())
+            if total:
+                run_start = np.repeat(np.cumsum(counts) - counts, counts)
+                within = np.arange(total) - run_start
+                out[np.repeat(body[rows], counts) + within] = buffer[np.repeat(offsets[rows], counts) + within]
+        else:
+            rows = np.flatnonzero(valid)
+            if len(rows):
+                scatter(body[rows], data[rows])
+        cursor = body + np.maximum(length, 0)
+    return out.tobytes()
+
+
+class _ChunkStream(io.RawIOBase):
+    """File-like di atas iterator bytes, dibaca copy_expert sedikit demi sedikit."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def copy_columns(table: pa.Table, target_types: Dict[str, tuple]) -> List[tuple]:
+    """Pasangkan kolom Arrow dengan kolom tujuan (termasuk <kolom>_cents)."""
+    columns = []
+    for target, (data_type, scale) in target_types.items():
+        if target in table.column_names:
+            columns.append((target, data_type, scale, False))
+        elif target + CENTS_SUFFIX in table.column_names:
+            columns.append((target + CENTS_SUFFIX, data_type, scale, True))
+    return columns
+
+
+def iter_copy_binary(table: pa.Table, columns: List[tuple],
+                     batch_rows: int = COPY_BATCH_ROWS) -> Iterator[bytes]:
+    yield PGCOPY_HEADER
+    for start in range(0, table.num_rows, batch_rows):
+        yield encode_copy_rows(table.slice(start, batch_rows), columns)
+    yield PGCOPY_TRAILER
+
+
+def copy_arrow_table(table: pa.Table, table_name: str, schema: str, dw_engine: Engine,
+                     batch_rows: int = COPY_BATCH_ROWS, replace: bool = False,
+                     connection: Optional[Connection] = None) -> int:
+    """
+    Tulis Arrow table ke PostgreSQL lewat COPY ... FORMAT binary (satu transaksi).
+    replace=True: isi lama dihapus di transaksi yang sama (pembaca tidak melihat tabel kosong).
+    connection: transaksi SQLAlchemy yang sudah berjalan; commit/rollback diserahkan ke pemanggil
+    (beberapa tabel bisa ditulis atomik).
+    """
+    target_types = read_target_types(dw_engine, schema, table_name)
+    columns = copy_columns(table, target_types)
+    column_list = ", ".join(f'"{target}"' for target in target_types
+                            if target in table.column_names or target + CENTS_SUFFIX in table.column_names)
+    sql = f'COPY "{schema}"."{table_name}" ({column_list}) FROM STDIN WITH (FORMAT binary)'
+
+    def write(dbapi_connection):
+        with dbapi_connection.cursor() as cursor:
+            if replace:
+                cursor.execute(f'DELETE FROM "{schema}"."{table_name}"')
+            cursor.copy_expert(sql, _ChunkStream(iter_copy_binary(table, columns, batch_rows)))
+
+    if connection is not None:
+        write(connection.connection)
+        return table.num_rows
+
+    raw = dw_engine.raw_connection()
+    try:
+        write(raw)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return table.num_rows
@@ -0,0 +1,273 @@
+import argparse
+import os
+import time
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scipy import sparse
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from arrow_copy import copy_arrow_table
+from dw_schema import AFFINITY_TABLE, BASKET_PAIRS_TABLE, BASKET_TOTALS_TABLE
+from load import DW_SCHEMA, FACT_TABLE, _qualified, table_exists
+from stream_read import iter_chunks, read_sql_streaming
+
+# Market basket / afinitas produk. Basis: matriks insidensi order x produk
+# (sparse, biner) X; co-occurrence C = X^T X memberi jumlah order per pasangan
+# produk (diagonal = jumlah order per produk). C disimpan sebagai state
+# (basket_pair_counts, segitiga atas) sehingga batch CDC cukup menambah
+# C(order baru) - C(order lama). Top-K pasangan per produk (lift) ditulis ke
+# product_affinity untuk dashboard.
+
+BASKET_CHUNK_ROWS = int(os.getenv("ETL_BASKET_CHUNK_ROWS", "500000"))
+BASKET_TOP_K = int(os.getenv("ETL_BASKET_TOP_K", "10"))
+# Ambang: minimal jumlah order berisi pasangan, support (fraksi order), dan lift.
+BASKET_MIN_PAIR_ORDERS = int(os.getenv("ETL_BASKET_MIN_PAIR_ORDERS", "3"))
+BASKET_MIN_SUPPORT = float(os.getenv("ETL_BASKET_MIN_SUPPORT", "0"))
+BASKET_MIN_LIFT = float(os.getenv("ETL_BASKET_MIN_LIFT", "1.0"))
+
+AFFINITY_COLUMNS = ['product_key', 'related_product_key', 'rank', 'pair_orders',
+                    'support', 'confidence', 'lift']
+
+# ------------------------------------------
+# Co-occurrence (sparse)
+# ------------------------------------------
+
+def incidence_matrix(order_ids: np.ndarray, product_keys: np.ndarray, n_products: int) -> sparse.csr_matrix:
+    """Matriks biner order x produk; baris duplikat (produk sama di satu order) dihitung sekali."""
+    _, order_idx = np.unique(order_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(order_idx), dtype=np.int64), (order_idx, product_keys.astype(np.int64))),
+        shape=(int(order_idx.max()) + 1 if len(order_idx) else 0, n_products)
+    )
+    matrix.data[:] = 1
+    return matrix
+
+
+def co_occurrence(order_ids, product_keys, n_products: int) -> Tuple[sparse.csr_matrix, int]:
+    """(C = X^T X, jumlah order) untuk sekumpulan baris order."""
+    matrix = incidence_matrix(np.asarray(order_ids), np.asarray(product_keys), n_products)
+    return (matrix.T @ matrix).tocsr(), matrix.shape[0]
+
+
+def frame_co_occurrence(facts: pd.DataFrame, n_products: int) -> Tuple[sparse.csr_matrix, int]:
+    """C dan jumlah order dari frame fact (kolom order_id, product_key)."""
+    if facts.empty:
+        return sparse.csr_matrix((n_products, n_products), dtype=np.int64), 0
+    facts = facts.dropna(subset=['order_id', 'product_key'])
+    return co_occurrence(facts['order_id'].to_numpy(np.int64), facts['product_key'].to_numpy(np.int64),
+                         n_products)
+
+
+def stream_co_occurrence(dw_engine: Engine, chunk_rows: int = BASKET_CHUNK_ROWS) -> Tuple[sparse.csr_matrix, int]:
+    """
+    C untuk seluruh fact_sales, dibaca per chunk baris urut order_id. Baris
+    order terakhir di setiap chunk ditahan ke chunk berikutnya supaya satu
+    order tidak pernah terpecah (pasangan lintas chunk tetap terhitung).
+    """
+    n_products = _n_products(dw_engine)
+    total = sparse.csr_matrix((n_products, n_products), dtype=np.int64)
+    n_orders = 0
+    carry_orders, carry_products = np.empty(0, np.int64), np.empty(0, np.int64)
+    query = f"""
+        SELECT order_id, product_key FROM {_qualified(FACT_TABLE)}
+        WHERE product_key IS NOT NULL
+        ORDER BY order_id
+    """
+    for _, rows in iter_chunks(dw_engine, query, fetch_size=chunk_rows):
+        if not rows:
+            continue
+        block = np.asarray(rows, dtype=np.int64)
+        orders = np.concatenate([carry_orders, block[:, 0]])
+        products = np.concatenate([carry_products, block[:, 1]])
+        complete = orders != orders[-1]
+        carry_orders, carry_products = orders[~complete], products[~complete]
+        if complete.any():
+            counts, chunk_orders = co_occurrence(orders[complete], products[complete], n_products)
+            total, n_orders = total + counts, n_orders + chunk_orders
+    if len(carry_orders):
+        counts, chunk_orders = co_occurrence(carry_orders, carry_products, n_products)
+        total, n_orders = total + counts, n_orders + chunk_orders
+    return total.tocsr(), n_orders
+
+# ------------------------------------------
+# Metrik & top-K
+# ------------------------------------------
+
+def top_pairs(counts: sparse.spmatrix, n_orders: int, top_k: int = BASKET_TOP_K,
+              min_pair_orders: int = BASKET_MIN_PAIR_ORDERS, min_support: float = BASKET_MIN_SUPPORT,
+              min_lift: float = BASKET_MIN_LIFT) -> pd.DataFrame:
+    """
+    Dari C simetris: support = n_ab / N, confidence(a->b) = n_ab / n_a,
+    lift = n_ab * N / (n_a * n_b). Top-K per produk a (lift, lalu n_ab).
+    """
+    if n_orders <= 0:
+        return pd.DataFrame(columns=AFFINITY_COLUMNS)
+    counts = counts.tocoo()
+    per_product = counts.tocsr().diagonal().astype(np.float64)
+    a, b, n_ab = counts.row, counts.col, counts.data.astype(np.float64)
+    support = n_ab / n_orders
+    keep = (a != b) & (n_ab >= min_pair_orders) & (support >= min_support)
+    a, b, n_ab, support = a[keep], b[keep], n_ab[keep], support[keep]
+    lift = n_ab * n_orders / (per_product[a] * per_product[b])
+    keep = lift >= min_lift
+    a, b, n_ab, support, lift = a[keep], b[keep], n_ab[keep], support[keep], lift[keep]
+
+    order = np.lexsort((-n_ab, -lift, a))
+    a, b, n_ab, support, lift = a[order], b[order], n_ab[order], support[order], lift[order]
+    # Peringkat dalam grup produk a: posisi dikurangi awal grup.
+    starts = np.flatnonzero(np.r_[True, a[1:] != a[:-1]])
+    rank = np.arange(len(a)) - np.repeat(starts, np.diff(np.r_[starts, len(a)])) + 1
+    keep = rank <= top_k
+    return pd.DataFrame({
+        'product_key': a[keep].astype(np.int64),
+        'related_product_key': b[keep].astype(np.int64),
+        'rank': rank[keep].astype(np.int64),
+        'pair_orders': n_ab[keep].astype(np.int64),
+        'support': support[keep],
+        'confidence': n_ab[keep] / per_product[a[keep]],
+        'lift': lift[keep],
+    }, columns=AFFINITY_COLUMNS)
+
+# ------------------------------------------
+# State & tabel warehouse
+# ------------------------------------------
+
+def _n_products(dw_engine: Engine) -> int:
+    with dw_engine.connect() as connection:
+        max_key = connection.execute(text(
+            f"SELECT COALESCE(MAX(product_key), 0) FROM {_qualified('dim_product')}"
+        )).scalar()
+    return int(max_key) + 1
+
+
+def _ensure_basket_tables(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(BASKET_PAIRS_TABLE)} (
+            product_a INTEGER NOT NULL,
+            product_b INTEGER NOT NULL,
+            pair_orders BIGINT NOT NULL,
+            PRIMARY KEY (product_a, product_b)
+        )
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(BASKET_TOTALS_TABLE)} (
+            total_orders BIGINT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(AFFINITY_TABLE)} (
+            product_key INTEGER NOT NULL,
+            related_product_key INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            pair_orders BIGINT NOT NULL,
+            support DOUBLE PRECISION NOT NULL,
+            confidence DOUBLE PRECISION NOT NULL,
+            lift DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (product_key, related_product_key)
+        )
+    """))
+
+
+def has_basket_state(dw_engine: Engine) -> bool:
+    return table_exists(dw_engine, BASKET_TOTALS_TABLE) and table_exists(dw_engine, AFFINITY_TABLE)
+
+
+def read_basket_state(dw_engine: Engine, n_products: int) -> Tuple[sparse.csr_matrix, int]:
+    """C simetris dan jumlah order dari state tersimpan (segitiga atas)."""
+    pairs = read_sql_streaming(
+        f"SELECT product_a, product_b, pair_orders FROM {_qualified(BASKET_PAIRS_TABLE)}", dw_engine
+    )
+    totals = read_sql_streaming(f"SELECT total_orders FROM {_qualified(BASKET_TOTALS_TABLE)}", dw_engine)
+    n_products = max(n_products, int(pairs[['product_a', 'product_b']].to_numpy().max()) + 1 if len(pairs) else 0)
+    upper = sparse.coo_matrix(
+        (pairs['pair_orders'].to_numpy(np.int64),
+         (pairs['product_a'].to_numpy(np.int64), pairs['product_b'].to_numpy(np.int64))),
+        shape=(n_products, n_products)
+    ).tocsr()
+    symmetric = upper + sparse.triu(upper, k=1).T
+    return symmetric.tocsr(), int(totals['total_orders'].iloc[0]) if len(totals) else 0
+
+
+def save_basket_state(counts: sparse.spmatrix, n_orders: int, dw_engine: Engine):
+    """Simpan C (segitiga atas, tanpa nol), total order, dan top-K afinitas."""
+    upper = sparse.triu(counts).tocoo()
+    nonzero = upper.data != 0
+    pairs = pa.table({
+        'product_a': pa.array(upper.row[nonzero].astype(np.int64)),
+        'product_b': pa.array(upper.col[nonzero].astype(np.int64)),
+        'pair_orders': pa.array(upper.data[nonzero].astype(np.int64)),
+    })
+    affinity = top_pairs(counts, n_orders)
+    with dw_engine.begin() as connection:
+        _ensure_basket_tables(connection)
+    # C, top-K, dan total order dalam satu transaksi: delta berikutnya tidak
+    # pernah membaca C dan total order dari versi yang berbeda.
+    with dw_engine.begin() as connection:
+        copy_arrow_table(pairs, BASKET_PAIRS_TABLE, DW_SCHEMA, dw_engine, replace=True, connection=connection)
+        copy_arrow_table(pa.Table.from_pandas(affinity, preserve_index=False), AFFINITY_TABLE, DW_SCHEMA,
+                         dw_engine, replace=True, connection=connection)
+        connection.execute(text(f"DELETE FROM {_qualified(BASKET_TOTALS_TABLE)}"))
+        connection.execute(text(f"INSERT INTO {_qualified(BASKET_TOTALS_TABLE)} (total_orders) VALUES (:n)"),
+                           {'n': int(n_orders)})
+    return len(affinity)
+
+
+def refresh_basket(dw_engine: Engine) -> bool:
+    """Bangun ulang C dari seluruh fact_sales (full ETL)."""
+    print(f"--- 🚀 Refresh {AFFINITY_TABLE} (full) ---")
+    start = time.perf_counter()
+    try:
+        counts, n_orders = stream_co_occurrence(dw_engine)
+        n_pairs = save_basket_state(counts, n_orders, dw_engine)
+        print(f"✅ {AFFINITY_TABLE}: {n_pairs:,} pasangan dari {n_orders:,} order "
+              f"({time.perf_counter() - start:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL refresh {AFFINITY_TABLE}. Error: {e}")
+        return False
+
+
+def apply_basket_delta(old_facts: pd.DataFrame, new_facts: pd.DataFrame, dw_engine: Engine) -> bool:
+    """
+    Batch CDC: C += C(baris baru order terdampak) - C(baris lama order yang sama).
+    Tanpa state tersimpan, dibangun ulang penuh.
+    """
+    if not has_basket_state(dw_engine):
+        return refresh_basket(dw_engine)
+    print(f"--- 🚀 Delta {AFFINITY_TABLE} ---")
+    try:
+        n_products = _n_products(dw_engine)
+        counts, n_orders = read_basket_state(dw_engine, n_products)
+        n_products = counts.shape[0]
+        old_counts, old_orders = frame_co_occurrence(old_facts, n_products)
+        new_counts, new_orders = frame_co_occurrence(new_facts, n_products)
+        counts = counts + new_counts - old_counts
+        counts.eliminate_zeros()
+        n_pairs = save_basket_state(counts, n_orders + new_orders - old_orders, dw_engine)
+        print(f"✅ {AFFINITY_TABLE}: {n_pairs:,} pasangan (delta {new_orders - old_orders:+,} order).")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL delta {AFFINITY_TABLE}. Error: {e}")
+        return False
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    from db_connection import get_dw_engine
+
+    parser = argparse.ArgumentParser(description="Bangun ulang afinitas produk (market basket)")
+    parser.parse_args(argv)
+
+    engine = get_dw_engine()
+    if engine is None:
+        raise SystemExit("❌ Konfigurasi database di file .env tidak lengkap.")
+    if not refresh_basket(engine):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Co-occurrence pasangan produk: sparse X^T X (basket.py) vs self-join pandas per order.
+
+    python benchmarks/bench_basket.py --scale 1000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from basket import co_occurrence, frame_co_occurrence, top_pairs  # noqa: E402
+from bench_transform_memory import scaled_raw_data  # noqa: E402
+from exctract import extract_data  # noqa: E402
+from transform import get_normalized_data  # noqa: E402
+
+
+def self_join_counts(lines):
+    """Baseline: semua pasangan per order lewat merge, lalu groupby."""
+    lines = lines.drop_duplicates()
+    pairs = lines.merge(lines, on='order_id')
+    return pairs.groupby(['product_id_x', 'product_id_y']).size()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=1000)
+    parser.add_argument('--delta-orders', type=int, default=1000)
+    parser.add_argument('--data-folder', default='data')
+    parser.add_argument('--skip-baseline', action='store_true')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = extract_data(args.data_folder)
+    details = get_normalized_data(scaled_raw_data(base, args.scale))['order_details']
+    lines = details[['orderid', 'productid']].rename(columns={'orderid': 'order_id', 'productid': 'product_id'})
+    orders, products = lines['order_id'].to_numpy(np.int64), lines['product_id'].to_numpy(np.int64)
+    n_products = int(products.max()) + 1
+    print(f"Scale x{args.scale}: {len(lines):,} order lines, {lines['order_id'].nunique():,} order")
+
+    start = time.perf_counter()
+    counts, n_orders = co_occurrence(orders, products, n_products)
+    affinity = top_pairs(counts, n_orders)
+    print(f"  sparse X^T X + top-K  {time.perf_counter() - start:7.2f}s  ({len(affinity):,} pasangan top-K)")
+
+    delta = lines[lines['order_id'].isin(lines['order_id'].drop_duplicates().sample(
+        min(args.delta_orders, n_orders), random_state=0))]
+    frame = delta.rename(columns={'product_id': 'product_key'})
+    start = time.perf_counter()
+    old_counts, _ = frame_co_occurrence(frame, n_products)
+    updated = counts + old_counts - old_counts
+    top_pairs(updated, n_orders)
+    print(f"  delta {args.delta_orders:,} order + top-K  {time.perf_counter() - start:7.2f}s")
+
+    if not args.skip_baseline:
+        start = time.perf_counter()
+        self_join_counts(lines)
+        print(f"  self-join pandas      {time.perf_counter() - start:7.2f}s")
+
+
+if __name__ == '__main__':
+    main()
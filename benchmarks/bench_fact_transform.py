@@ -0,0 +1,59 @@
+"""
+Throughput transform fact_sales per jumlah worker (process pool, shard per order_id).
+
+    python benchmarks/bench_fact_transform.py --scale 200 --workers 1 2 4 8
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_transform_memory import scaled_raw_data  # noqa: E402
+from exctract import extract_data  # noqa: E402
+from transform import build_fact_sales_sharded, get_normalized_data, transform_all_data  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--data-folder', default='data')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = extract_data(args.data_folder)
+        dims = transform_all_data({key: df.copy() for key, df in base.items()})
+    data = get_normalized_data(scaled_raw_data(base, args.scale))
+    key_maps = {
+        'customer': dims['dim_customer'].set_index('customer_id')['customer_key'],
+        'product': dims['dim_product'].set_index('product_id')['product_key'],
+        'employee': dims['dim_employee'].set_index('employee_id')['employee_key'],
+        'shipper': dims['dim_shipper'].set_index('shipper_id')['shipper_key'],
+    }
+
+    rows = []
+    for workers in args.workers:
+        start = time.perf_counter()
+        fact = build_fact_sales_sharded(data['orders'], data['order_details'], key_maps, workers)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            'workers': workers,
+            'rows': len(fact),
+            'seconds': round(elapsed, 3),
+            'rows_per_s': int(len(fact) / elapsed),
+        })
+
+    report = pd.DataFrame(rows)
+    report['speedup'] = (report['seconds'].iloc[0] / report['seconds']).round(2)
+    print(f"Scale x{args.scale} ({len(data['order_details'])} order lines, {os.cpu_count()} CPU)")
+    print(report.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
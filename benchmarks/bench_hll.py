@@ -0,0 +1,170 @@
+"""
+Akurasi & kecepatan distinct count HLL dibanding hitungan exact.
+
+Offline (tanpa database): fact hasil transform diperbesar, lalu untuk
+berbagai kombinasi filter (tahun x kategori x negara) dibandingkan
+nunique() exact vs gabungan sketch per bulan x kategori x negara.
+
+    python benchmarks/bench_hll.py --scale 50
+
+Dengan --db: query KPI exact vs *_approx di warehouse (PG_* di .env).
+
+    python benchmarks/bench_hll.py --db --year 1997
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_transform_memory import scaled_raw_data  # noqa: E402
+from hll_sketch import (HLL_PRECISION, SKETCH_DIMENSIONS, SKETCH_METRICS, build_sketches,  # noqa: E402
+                        estimate, sketch_inputs)
+
+
+def filter_combinations(inputs: pd.DataFrame, rng: np.random.Generator, random_filters: int) -> list:
+    """(label, tahun, kategori, negara); None = semua."""
+    years = sorted(inputs['month_start'].dt.year.unique())
+    categories = sorted(inputs['category_name'].unique())
+    countries = sorted(inputs['country'].unique())
+    combos = []
+    for year in years:
+        combos.append((f"{year} semua", year, None, None))
+        combos += [(f"{year} {cat}", year, [cat], None) for cat in categories]
+        for i in range(random_filters):
+            cats = list(rng.choice(categories, size=rng.integers(1, len(categories) + 1), replace=False))
+            ctrs = list(rng.choice(countries, size=rng.integers(1, len(countries) + 1), replace=False))
+            combos.append((f"{year} acak#{i}", year, cats, ctrs))
+    return combos
+
+
+def dense_groups(sketches: pd.DataFrame, metric: str, precision: int) -> tuple:
+    """Sketch satu metric -> (kunci grup, matriks register grup x 2^p)."""
+    rows = sketches[sketches['metric'] == metric]
+    codes = rows.groupby(SKETCH_DIMENSIONS, sort=False).ngroup().to_numpy()
+    groups = rows[SKETCH_DIMENSIONS].drop_duplicates().reset_index(drop=True)
+    matrix = np.zeros((len(groups), 1 << precision), dtype=np.int16)
+    np.maximum.at(matrix, (codes, rows['reg_idx'].to_numpy(np.int64)), rows['reg_val'].to_numpy(np.int16))
+    return groups, matrix
+
+
+def _mask(frame: pd.DataFrame, year, categories, countries) -> np.ndarray:
+    mask = (frame['month_start'].dt.year == year).to_numpy().copy()
+    if categories is not None:
+        mask &= frame['category_name'].isin(categories).to_numpy()
+    if countries is not None:
+        mask &= frame['country'].isin(countries).to_numpy()
+    return mask
+
+
+def run_offline(args):
+    from exctract import extract_data
+    from transform import transform_all_data
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        raw = scaled_raw_data(extract_data(args.data_folder), args.scale)
+        transformed = transform_all_data(raw)
+    fact = transformed['fact_sales']
+    inputs = sketch_inputs(
+        fact,
+        transformed['dim_product'].set_index('product_key')['category_name'],
+        transformed['dim_customer'].set_index('customer_key')['country'],
+    )
+
+    start = time.perf_counter()
+    sketches = build_sketches(inputs, args.precision)
+    build_s = time.perf_counter() - start
+    print(f"Scale x{args.scale}: {len(fact):,} baris fact -> {len(sketches):,} register sketch "
+          f"(p={args.precision}, dibangun {build_s:.2f}s)")
+
+    combos = filter_combinations(inputs, np.random.default_rng(args.seed), args.random_filters)
+    rows = []
+    for metric, column in SKETCH_METRICS.items():
+        groups, matrix = dense_groups(sketches, metric, args.precision)
+        values = inputs[column].to_numpy()
+        for label, year, categories, countries in combos:
+            start = time.perf_counter()
+            exact = len(np.unique(values[_mask(inputs, year, categories, countries)]))
+            exact_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            selected = _mask(groups, year, categories, countries)
+            approx = estimate(matrix[selected].max(axis=0)) if selected.any() else 0.0
+            approx_s = time.perf_counter() - start
+
+            rows.append({'metric': metric, 'filter': label, 'exact': exact, 'approx': round(approx),
+                         'error_pct': (approx - exact) / exact * 100 if exact else 0.0,
+                         'exact_ms': exact_s * 1000, 'approx_ms': approx_s * 1000})
+
+    report = pd.DataFrame(rows)
+    if args.verbose:
+        print(report.round(2).to_string(index=False))
+    summary = report.groupby('metric').agg(
+        filters=('filter', 'size'),
+        mean_abs_error_pct=('error_pct', lambda e: e.abs().mean()),
+        max_abs_error_pct=('error_pct', lambda e: e.abs().max()),
+        exact_ms=('exact_ms', 'median'),
+        approx_ms=('approx_ms', 'median'),
+    )
+    print(summary.round(3).to_string())
+    print(f"Galat standar teoretis: {104 / np.sqrt(1 << args.precision):.2f}%")
+
+
+def run_db(args):
+    import kpi_queries
+    from db_connection import get_dw_engine
+
+    engine = get_dw_engine()
+    if engine is None:
+        sys.exit("Konfigurasi database tidak lengkap.")
+    pairs = [
+        ('financial_trend', 'financial_trend_approx', 'total_orders', None),
+        ('customer_clv', 'active_customers_approx', 'total_rows', ('count',)),
+        ('geo_performance', 'geo_performance_approx', 'total_orders', None),
+    ]
+    rows = []
+    for exact_type, approx_type, column, shape in pairs:
+        timings = {}
+        results = {}
+        for kind, kpi_type, kind_shape in [('exact', exact_type, shape), ('approx', approx_type, None)]:
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results[kind] = kpi_queries.fetch_kpi(engine, kpi_type, args.year, "", kind_shape)
+                best = min(best, time.perf_counter() - start)
+            timings[kind] = best
+        exact_total = float(results['exact'][column].sum())
+        approx_total = float(results['approx'][column].sum())
+        rows.append({'kpi': exact_type, 'exact': exact_total, 'approx': approx_total,
+                     'error_pct': (approx_total - exact_total) / exact_total * 100 if exact_total else 0.0,
+                     'exact_ms': timings['exact'] * 1000, 'approx_ms': timings['approx'] * 1000})
+    print(pd.DataFrame(rows).round(2).to_string(index=False))
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=50)
+    parser.add_argument('--precision', type=int, default=HLL_PRECISION)
+    parser.add_argument('--random-filters', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-folder', default='data')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--db', action='store_true')
+    parser.add_argument('--year', type=int, default=1997)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    if args.db:
+        run_db(args)
+    else:
+        run_offline(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Waktu cold start dashboard: waktu impor modul (proses baru setiap kali)
+dan time-to-first-render app.py lewat streamlit.testing (jika terpasang).
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Impor top-level app.py sekarang vs dependensi laporan yang kini lazy.
+APP_IMPORTS = ['pandas', 'streamlit', 'dotenv', 'chart_prep', 'db_connection', 'kpi_queries', 'lazy_data',
+               'result_shaping', 'stream_read']
+LAZY_IMPORTS = ['plotly.express', 'plotly.graph_objects', 'matplotlib.pyplot', 'seaborn', 'fpdf', 'pdf_report']
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+try:
+    for name in sys.argv[1:]:
+        __import__(name)
+    print(json.dumps({'ms': (time.perf_counter() - start) * 1000}))
+except ImportError as e:
+    print(json.dumps({'error': str(e)}))
+"""
+
+RENDER_SNIPPET = """
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file('app.py', default_timeout=120)
+app.run()
+print(json.dumps({'ms': (time.perf_counter() - start) * 1000,
+                  'title': [t.value for t in app.title], 'exception': len(app.exception)}))
+"""
+
+
+def _run(snippet: str, *args: str) -> dict:
+    result = subprocess.run([sys.executable, '-c', snippet, *args], cwd=ROOT,
+                            capture_output=True, text=True)
+    lines = result.stdout.strip().splitlines()
+    if not lines:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'tanpa output'}
+    return json.loads(lines[-1])
+
+
+def best_of(snippet: str, repeat: int, *args: str) -> dict:
+    runs = [_run(snippet, *args) for _ in range(repeat)]
+    errors = [run for run in runs if 'error' in run]
+    if errors:
+        return errors[0]
+    best = min(runs, key=lambda run: run['ms'])
+    return {**best, 'ms': round(best['ms'], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print("Waktu impor (proses baru, minimum dari --repeat):")
+    for name in APP_IMPORTS + LAZY_IMPORTS:
+        result = best_of(IMPORT_SNIPPET, args.repeat, name)
+        kind = 'awal' if name in APP_IMPORTS else 'lazy'
+        print(f"  [{kind}] {name:<22} {result.get('ms', '-'):>8} ms  {result.get('error', '')}")
+
+    for label, names in [('impor awal app.py', APP_IMPORTS),
+                         ('semua (impor eager lama)', APP_IMPORTS + LAZY_IMPORTS)]:
+        result = best_of(IMPORT_SNIPPET, args.repeat, *names)
+        print(f"  {label:<30} {result.get('ms', '-'):>8} ms  {result.get('error', '')}")
+
+    print("\nTime-to-first-render app.py (run pertama di proses baru):")
+    result = best_of(RENDER_SNIPPET, args.repeat)
+    if 'error' in result:
+        print(f"  tidak bisa diukur: {result['error']}")
+    else:
+        print(f"  {result['ms']} ms (judul: {result['title']}, exception: {result['exception']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Puncak memori pd.read_sql vs stream_read.read_sql_streaming (PG_* di .env).
+
+Setiap mode dijalankan di proses baru dan puncak RSS (ru_maxrss) dicatat,
+karena buffer hasil psycopg2 ada di libpq dan tidak terlihat oleh tracemalloc.
+
+    python benchmarks/bench_stream_read.py --rows 2000000
+    python benchmarks/bench_stream_read.py --kpi customer_clv --year 1997
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Hasil sintetis selebar query CLV/RFM: kunci, teks, tanggal, dan angka numeric.
+SYNTHETIC_QUERY = """
+SELECT g AS customer_key,
+       'Customer ' || g AS customer_name,
+       DATE '1996-07-01' + (g % 700) AS last_order_date,
+       (g % 37) AS frequency,
+       (g * 1.37)::numeric(18, 2) AS monetary_value
+FROM generate_series(1, {rows}) AS g
+"""
+
+RUN_SNIPPET = """
+import json, resource, sys, time
+sys.path.insert(0, '.')
+import pandas as pd
+import kpi_queries
+from db_connection import get_dw_engine
+from stream_read import read_sql_streaming
+
+mode, query_kind, arg, fetch_size = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+engine = get_dw_engine()
+if query_kind == 'kpi':
+    kpi_type, year = arg.split(':')
+    query = kpi_queries.build_kpi_query(kpi_type, int(year))
+else:
+    query = arg
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == 'read_sql':
+    df = pd.read_sql(query, engine)
+else:
+    df = read_sql_streaming(query, engine, fetch_size=fetch_size)
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'rows': len(df), 'seconds': elapsed, 'peak_mb': (peak - base) / 1024,
+                  'frame_mb': df.memory_usage(deep=True).sum() / 2**20}))
+"""
+
+
+def run(mode: str, query_kind: str, arg: str, fetch_size: int) -> dict:
+    result = subprocess.run([sys.executable, '-c', RUN_SNIPPET, mode, query_kind, arg, str(fetch_size)],
+                            cwd=ROOT, capture_output=True, text=True)
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {'error': (result.stderr.strip().splitlines() or ['tanpa output'])[-1]}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--kpi', help="Ukur query KPI (mis. customer_clv, rfm_raw_data) alih-alih data sintetis")
+    parser.add_argument('--year', type=int, default=1997)
+    parser.add_argument('--fetch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.kpi:
+        query_kind, arg, label = 'kpi', f"{args.kpi}:{args.year}", f"{args.kpi} {args.year}"
+    else:
+        query_kind, arg, label = 'sql', SYNTHETIC_QUERY.format(rows=args.rows), f"sintetis {args.rows:,} baris"
+
+    print(f"{label} (fetch size {args.fetch_size:,}):")
+    for mode in ('read_sql', 'streaming'):
+        result = run(mode, query_kind, arg, args.fetch_size)
+        if 'error' in result:
+            print(f"  {mode:<10} gagal: {result['error']}")
+            continue
+        print(f"  {mode:<10} {result['rows']:>10,} baris  {result['seconds']:7.2f}s  "
+              f"puncak +{result['peak_mb']:8.1f} MB  (DataFrame {result['frame_mb']:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Bandingkan peak memori transform_all_data mode default vs compact.
+
+    python benchmarks/bench_transform_memory.py --scale 100
+
+Data CSV di-replikasi `scale` kali (orderid digeser) untuk mensimulasikan
+volume besar.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exctract import extract_data  # noqa: E402
+from transform import memory_report, transform_all_data  # noqa: E402
+
+
+def scaled_raw_data(base: dict, scale: int) -> dict:
+    raw = {key: df.copy() for key, df in base.items()}
+    if scale <= 1:
+        return raw
+
+    orders, details = base['orders'], base['order_details']
+    step = int(orders['OrderID'].max()) + 1
+    raw['orders'] = pd.concat(
+        [orders.assign(OrderID=orders['OrderID'] + i * step) for i in range(scale)],
+        ignore_index=True
+    )
+    raw['order_details'] = pd.concat(
+        [details.assign(OrderID=details['OrderID'] + i * step) for i in range(scale)],
+        ignore_index=True
+    )
+    return raw
+
+
+def run(base: dict, scale: int, compact: bool) -> dict:
+    raw = scaled_raw_data(base, scale)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = transform_all_data(raw, compact=compact)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'mode': 'compact' if compact else 'default',
+        'seconds': round(elapsed, 3),
+        'peak_mb': round(peak / 1024 ** 2, 2),
+        'result_mb': round(memory_report(result)['memory_mb'].sum(), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--data-folder', default='data')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = extract_data(args.data_folder)
+
+    rows = [run(base, args.scale, compact=False), run(base, args.scale, compact=True)]
+    report = pd.DataFrame(rows)
+    print(f"Scale x{args.scale} ({len(base['order_details']) * args.scale} order lines)")
+    print(report.to_string(index=False))
+    default, compact = rows
+    print(f"Peak reduction: {100 * (1 - compact['peak_mb'] / default['peak_mb']):.1f}%")
+    print(f"Result reduction: {100 * (1 - compact['result_mb'] / default['result_mb']):.1f}%")
+
+
+if __name__ == '__main__':
+    main()
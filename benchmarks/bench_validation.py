@@ -0,0 +1,56 @@
+"""
+Overhead tahap validasi dibanding transform pada data yang diperbesar.
+
+    python benchmarks/bench_validation.py --scale 100
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_transform_memory import scaled_raw_data  # noqa: E402
+from exctract import extract_data  # noqa: E402
+from transform import transform_all_data  # noqa: E402
+from validate import validate_all  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--compact', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-folder', default='data')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = extract_data(args.data_folder)
+    transform_s, validate_s = [], []
+    for _ in range(args.repeat):
+        raw = scaled_raw_data(base, args.scale)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            transformed = transform_all_data(raw, compact=args.compact)
+            transform_s.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _, rejects, summary = validate_all(transformed)
+            validate_s.append(time.perf_counter() - start)
+    transform_s, validate_s = min(transform_s), min(validate_s)
+
+    report = pd.DataFrame([
+        {'stage': 'transform', 'seconds': round(transform_s, 3)},
+        {'stage': 'validate', 'seconds': round(validate_s, 3)},
+    ])
+    print(f"Scale x{args.scale} ({len(transformed['fact_sales'])} baris fact, {len(summary)} aturan)")
+    print(report.to_string(index=False))
+    print(f"Overhead validasi: {validate_s / transform_s:.1%} dari transform, {len(rejects)} baris ditolak")
+
+
+if __name__ == '__main__':
+    main()
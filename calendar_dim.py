@@ -0,0 +1,135 @@
+import calendar
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+MONTH_NAMES = np.array([calendar.month_name[m] for m in range(1, 13)], dtype=object)
+DAY_NAMES = np.array([calendar.day_name[d] for d in range(7)], dtype=object)
+
+DIM_DATE_COLUMNS = [
+    'full_date', 'date_key', 'year', 'quarter', 'month', 'month_name', 'day',
+    'day_of_week', 'day_name', 'week_of_year', 'is_weekend', 'is_holiday'
+]
+
+
+class HolidayCalendar:
+    """Kalender libur pluggable: kembalikan tanggal libur di rentang [start, end]."""
+
+    def holidays(self, start: pd.Timestamp, end: pd.Timestamp) -> np.ndarray:
+        return np.array([], dtype='datetime64[D]')
+
+
+class NoHolidays(HolidayCalendar):
+    pass
+
+
+class FixedDateHolidays(HolidayCalendar):
+    """Libur dengan tanggal tetap setiap tahun, mis. [(1, 1), (12, 25)]."""
+
+    def __init__(self, month_days: Iterable[tuple]):
+        self.month_days = list(month_days)
+
+    def holidays(self, start: pd.Timestamp, end: pd.Timestamp) -> np.ndarray:
+        years = np.arange(start.year, end.year + 1)
+        if not self.month_days or len(years) == 0:
+            return np.array([], dtype='datetime64[D]')
+        months = np.array([m for m, _ in self.month_days])
+        days = np.array([d for _, d in self.month_days])
+        month_starts = (
+            (years[:, None] - 1970) * 12 + (months[None, :] - 1)
+        ).astype('datetime64[M]')
+        return (month_starts.astype('datetime64[D]') + (days[None, :] - 1)).ravel()
+
+
+def date_parts(dates: np.ndarray) -> dict:
+    """Pecah datetime64[D] jadi year/month/day/dll dengan operasi integer vektor."""
+    dates = dates.astype('datetime64[D]')
+    month_start = dates.astype('datetime64[M]')
+    year = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = month_start.astype(np.int64) % 12 + 1
+    day = (dates - month_start.astype('datetime64[D]')).astype(np.int64) + 1
+    # 1970-01-01 adalah hari Kamis -> Senin = 0.
+    weekday = (dates.astype(np.int64) + 3) % 7
+
+    # ISO week: minggu milik tahun tempat hari Kamis-nya berada.
+    thursday = dates - weekday + 3
+    iso_year_start = thursday.astype('datetime64[Y]').astype('datetime64[D]')
+    week = (thursday - iso_year_start).astype(np.int64) // 7 + 1
+
+    return {
+        'year': year,
+        'month': month,
+        'day': day,
+        'weekday': weekday,
+        'quarter': (month - 1) // 3 + 1,
+        'week_of_year': week,
+        'date_key': year * 10000 + month * 100 + day,
+    }
+
+
+def date_key_from_dates(dates: pd.Series) -> pd.Series:
+    """date_key (YYYYMMDD) langsung dari kolom tanggal, tanpa join ke dim_date."""
+    dates = pd.to_datetime(dates, errors='coerce')
+    valid = dates.notna().to_numpy()
+    keys = np.zeros(len(dates), dtype=np.int64)
+    if valid.any():
+        keys[valid] = date_parts(dates.to_numpy()[valid])['date_key']
+    return pd.Series(keys, index=dates.index).where(valid).astype('Int64')
+
+
+def _dim_date_chunk(dates: np.ndarray, holiday_set: np.ndarray) -> pd.DataFrame:
+    parts = date_parts(dates)
+    return pd.DataFrame({
+        'full_date': dates.astype('datetime64[ns]'),
+        'date_key': parts['date_key'],
+        'year': parts['year'].astype(np.int32),
+        'quarter': parts['quarter'].astype(np.int32),
+        'month': parts['month'].astype(np.int32),
+        'month_name': MONTH_NAMES[parts['month'] - 1],
+        'day': parts['day'].astype(np.int32),
+        'day_of_week': (parts['weekday'] + 1).astype(np.int32),
+        'day_name': DAY_NAMES[parts['weekday']],
+        'week_of_year': parts['week_of_year'],
+        'is_weekend': parts['weekday'] >= 5,
+        'is_holiday': np.isin(dates, holiday_set),
+    }, columns=DIM_DATE_COLUMNS)
+
+
+def iter_dim_date(start, end, holiday_calendar: Optional[HolidayCalendar] = None,
+                  chunk_days: int = 366) -> Iterator[pd.DataFrame]:
+    """
+    Hasilkan dim_date padat (setiap hari di [start, end]) per potongan.
+    start/end None atau tidak valid (mis. calendar_range tanpa tanggal) = kalender kosong.
+    """
+    if start is None or end is None or pd.isna(start) or pd.isna(end):
+        return
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    holiday_calendar = holiday_calendar or NoHolidays()
+    holiday_set = np.asarray(holiday_calendar.holidays(start, end), dtype='datetime64[D]')
+
+    first = np.datetime64(start.date(), 'D')
+    last = np.datetime64(end.date(), 'D')
+    while first <= last:
+        stop = min(first + chunk_days, last + 1)
+        yield _dim_date_chunk(np.arange(first, stop, dtype='datetime64[D]'), holiday_set)
+        first = stop
+
+
+def build_dim_date(start, end, holiday_calendar: Optional[HolidayCalendar] = None) -> pd.DataFrame:
+    chunks = list(iter_dim_date(start, end, holiday_calendar))
+    if not chunks:
+        return pd.DataFrame(columns=DIM_DATE_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def calendar_range(*date_columns: pd.Series) -> tuple:
+    """Rentang tahun penuh (1 Jan - 31 Des) yang mencakup semua tanggal di kolom."""
+    dates = pd.concat([pd.to_datetime(col, errors='coerce') for col in date_columns]).dropna()
+    if dates.empty:
+        return None, None
+    return (
+        pd.Timestamp(year=dates.min().year, month=1, day=1),
+        pd.Timestamp(year=dates.max().year, month=12, day=31),
+    )
@@ -0,0 +1,138 @@
+import calendar
+import weakref
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+# Data siap-chart/tabel untuk dashboard & PDF. Frame input berasal dari cache
+# (st.cache_data / LazyDatasets) dan tidak pernah diubah: hasil selalu frame
+# baru, dihitung dengan operasi vektor dan dimemo per (frame, target).
+
+_THOUSANDS = r'\B(?=(\d{3})+(?!\d))'
+
+# id(frame) -> {(nama fungsi, argumen): hasil}; entri dibuang saat frame di-GC.
+_MEMO: Dict[int, dict] = {}
+
+
+def _memoized(func: Callable) -> Callable:
+    def wrapper(frame: pd.DataFrame, *args):
+        key = id(frame)
+        if key not in _MEMO:
+            _MEMO[key] = {}
+            weakref.finalize(frame, _MEMO.pop, key, None)
+        results = _MEMO[key]
+        memo_key = (func.__name__, *args)
+        if memo_key not in results:
+            results[memo_key] = func(frame, *args)
+        return results[memo_key]
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def achievement_pct(actual, target):
+    """Persentase pencapaian (dibulatkan 1 desimal); skalar atau Series, target 0 -> 0."""
+    if target == 0:
+        return actual * 0 if isinstance(actual, pd.Series) else 0
+    return np.round(actual / target * 100, 1)
+
+
+def format_currency(values: pd.Series) -> pd.Series:
+    """Angka -> '$1,234' (tanpa lambda per elemen)."""
+    rounded = values.round().fillna(0).astype('int64').astype(str)
+    labels = '$' + rounded.str.replace(_THOUSANDS, ',', regex=True)
+    return labels.where(values.notna(), '')
+
+
+def format_percent(values: pd.Series, fmt: str = '%.1f%%') -> pd.Series:
+    """Angka -> '12.3%' (atau fmt printf lain, mis. '%+.1f%%')."""
+    labels = np.char.mod(fmt, values.to_numpy(dtype=np.float64, na_value=np.nan))
+    return pd.Series(labels, index=values.index).where(values.notna(), '')
+
+
+@_memoized
+def revenue_vs_target(df_trend: pd.DataFrame, monthly_target: float) -> pd.DataFrame:
+    """Revenue bulanan + target, achievement (%), dan label bar."""
+    revenue = df_trend['total_revenue']
+    return pd.DataFrame({
+        'month_name': df_trend['month_name'],
+        'total_revenue': revenue,
+        'target': monthly_target,
+        'achievement_pct': achievement_pct(revenue, monthly_target),
+        'revenue_label': format_currency(revenue),
+    }, index=df_trend.index)
+
+
+@_memoized
+def retention_vs_target(df_retention: pd.DataFrame, target_retention: float) -> pd.DataFrame:
+    """Retention bulanan + target dan gap (poin persen)."""
+    rate = df_retention['retention_rate']
+    return pd.DataFrame({
+        'month': df_retention['month'],
+        'retention_rate': rate,
+        'target': target_retention,
+        'gap': rate - target_retention,
+    }, index=df_retention.index)
+
+
+@_memoized
+def revenue_table_labels(df_trend: pd.DataFrame, monthly_target: float) -> pd.DataFrame:
+    """Tabel pencapaian revenue untuk PDF (semua kolom sudah berupa teks)."""
+    prepared = revenue_vs_target(df_trend, monthly_target)
+    return pd.DataFrame({
+        'month_name': prepared['month_name'],
+        'total_revenue': prepared['revenue_label'],
+        'Target': format_currency(prepared['target'].astype(np.float64)),
+        'Achv': format_percent(prepared['achievement_pct']),
+    }, index=prepared.index)
+
+
+@_memoized
+def retention_table_labels(df_retention: pd.DataFrame, target_retention: float) -> pd.DataFrame:
+    """Tabel gap retensi untuk PDF (semua kolom sudah berupa teks)."""
+    prepared = retention_vs_target(df_retention, target_retention)
+    return pd.DataFrame({
+        'month': prepared['month'],
+        'retention_rate': format_percent(prepared['retention_rate']),
+        'Target_Ret': f"{target_retention}%",
+        'Gap': format_percent(prepared['gap'], '%+.1f%%'),
+    }, index=prepared.index)
+
+
+def forecast_vs_target(df_trend: pd.DataFrame, df_forecast: pd.DataFrame, monthly_target: float,
+                       fitted_through, z: float = 1.96) -> pd.DataFrame:
+    """
+    12 bulan: aktual (jika ada), forecast + pita (forecast +- z*stderr, min 0),
+    target, dan 'projected' = aktual s.d. fitted_through (bulan lengkap terakhir),
+    forecast sesudahnya. 'partial' menandai aktual bulan yang belum lengkap.
+    """
+    months = pd.Index(range(1, 13), name='month')
+    actual = df_trend.set_index('month')['total_revenue'].astype(np.float64).reindex(months)
+    forecast = df_forecast.set_index('month')['forecast'].astype(np.float64).reindex(months)
+    stderr = df_forecast.set_index('month')['stderr'].astype(np.float64).reindex(months)
+    year = pd.to_datetime(df_forecast['month_start']).dt.year.iloc[0]
+    month_starts = pd.DatetimeIndex([pd.Timestamp(year, m, 1) for m in months], name='month')
+    after_fit = pd.Series(month_starts > pd.Timestamp(fitted_through), index=months)
+    projected = forecast.where(after_fit & forecast.notna(), actual)
+    return pd.DataFrame({
+        'month': months,
+        'month_name': [calendar.month_name[m] for m in months],
+        'actual': actual.to_numpy(),
+        'forecast': forecast.to_numpy(),
+        'lower': (forecast - z * stderr).clip(lower=0).to_numpy(),
+        'upper': (forecast + z * stderr).to_numpy(),
+        'target': monthly_target,
+        'projected': projected.fillna(forecast).to_numpy(),
+        'partial': (after_fit & actual.notna()).to_numpy(),
+    })
+
+
+@_memoized
+def top_customers_table(df_clv: pd.DataFrame, n: int) -> pd.DataFrame:
+    top = df_clv.head(n)
+    return pd.DataFrame({
+        'company_name': top['company_name'],
+        'frequency': top['frequency'],
+        'formatted_val': format_currency(top['monetary_value']),
+    })
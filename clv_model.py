@@ -0,0 +1,326 @@
+import argparse
+import os
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from arrow_copy import copy_arrow_table
+from dw_schema import CLV_TABLE
+from load import DW_SCHEMA, FACT_TABLE, _qualified, table_exists
+from stream_read import read_sql_streaming
+
+# CLV probabilistik per pelanggan, dihitung batch setelah ETL (hanya NumPy):
+# - BG/NBD (Fader, Hardie & Lee 2005): jumlah pembelian ke depan & P(alive)
+#   dari (frequency, recency, T) dalam minggu.
+# - Gamma-Gamma: nilai rata-rata order ke depan dari frequency & rata-rata order.
+# Parameter di-fit (Nelder-Mead, log-parameter) pada sampel pelanggan; prediksi
+# dihitung per chunk sehingga array antara tetap kecil untuk jutaan pelanggan.
+
+CLV_HORIZON_WEEKS = float(os.getenv("ETL_CLV_HORIZON_WEEKS", "52"))
+CLV_CHUNK_ROWS = int(os.getenv("ETL_CLV_CHUNK_ROWS", "200000"))
+CLV_FIT_SAMPLE = int(os.getenv("ETL_CLV_FIT_SAMPLE", "100000"))
+# Batch CDC menghitung ulang CLV paling sering sekali per interval ini (detik).
+CLV_CDC_INTERVAL_S = int(os.getenv("ETL_CLV_CDC_INTERVAL_S", "3600"))
+# Diskon per minggu untuk nilai sekarang (0 = tanpa diskon).
+CLV_WEEKLY_DISCOUNT = float(os.getenv("ETL_CLV_WEEKLY_DISCOUNT", "0"))
+
+CLV_COLUMNS = ['customer_key', 'frequency', 'recency_weeks', 't_weeks', 'avg_order_value',
+               'p_alive', 'expected_purchases', 'expected_order_value', 'predicted_clv']
+
+# Ringkasan per pelanggan atas seluruh histori order; T diukur sampai tanggal order terakhir di fact.
+SUMMARY_QUERY = f"""
+    WITH orders AS (
+        SELECT fs.customer_key, fs.order_id, MIN(dd.full_date) AS order_date, SUM(fs.revenue) AS order_value
+        FROM {_qualified(FACT_TABLE)} fs
+        JOIN {_qualified('dim_date')} dd ON fs.date_key = dd.date_key
+        GROUP BY 1, 2
+    ), bounds AS (
+        SELECT MAX(order_date) AS observed_until FROM orders
+    )
+    SELECT o.customer_key,
+           COUNT(*) - 1 AS frequency,
+           (MAX(o.order_date) - MIN(o.order_date)) / 7.0 AS recency_weeks,
+           (MAX(b.observed_until) - MIN(o.order_date)) / 7.0 AS t_weeks,
+           AVG(o.order_value) AS avg_order_value
+    FROM orders o CROSS JOIN bounds b
+    GROUP BY 1
+"""
+
+# ------------------------------------------
+# Fungsi khusus (tanpa SciPy)
+# ------------------------------------------
+
+_LANCZOS_G = 7
+_LANCZOS_COEF = np.array([
+    0.99999999999980993, 676.5203681218851, -1259.1392167224028, 771.32342877765313,
+    -176.61502916214059, 12.507343278686905, -0.13857109526572012,
+    9.9843695780195716e-6, 1.5056327351493116e-7,
+])
+
+
+def gammaln(x) -> np.ndarray:
+    """log Gamma(x) untuk x > 0, aproksimasi Lanczos (g=7) secara vektor."""
+    x = np.asarray(x, dtype=np.float64)
+    small = x < 0.5
+    # Refleksi untuk x < 0.5: Gamma(x) Gamma(1-x) = pi / sin(pi x).
+    z = np.where(small, 1.0 - x, x) - 1.0
+    series = _LANCZOS_COEF[0] + sum(c / (z + i) for i, c in enumerate(_LANCZOS_COEF[1:], start=1))
+    t = z + _LANCZOS_G + 0.5
+    result = 0.5 * np.log(2 * np.pi) + (z + 0.5) * np.log(t) - t + np.log(series)
+    if np.any(small):
+        result = np.where(small, np.log(np.pi / np.abs(np.sin(np.pi * x))) - result, result)
+    return result
+
+
+def hyp2f1(a, b, c, z, tol: float = 1e-12, max_terms: int = 2000) -> np.ndarray:
+    """Deret hipergeometrik 2F1(a, b; c; z) untuk 0 <= z < 1 (vektor, berhenti per elemen)."""
+    a, b, c, z = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (a, b, c, z)))
+    term = np.ones_like(z)
+    total = np.ones_like(z)
+    active = np.ones(z.shape, dtype=bool)
+    for k in range(max_terms):
+        if not active.any():
+            break
+        term = np.where(active, term * (a + k) * (b + k) / ((c + k) * (k + 1)) * z, 0.0)
+        total += term
+        active &= np.abs(term) > tol * np.abs(total)
+    return total
+
+
+def nelder_mead(func: Callable, x0: np.ndarray, max_iter: int = 2000, tol: float = 1e-9) -> np.ndarray:
+    """Minimasi tanpa gradien (Nelder-Mead standar) untuk beberapa parameter."""
+    n = len(x0)
+    simplex = np.vstack([x0] + [x0 + np.eye(n)[i] * 0.5 for i in range(n)])
+    values = np.array([func(point) for point in simplex])
+    for _ in range(max_iter):
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if abs(values[-1] - values[0]) <= tol * (abs(values[0]) + tol):
+            break
+        centroid = simplex[:-1].mean(axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        f_reflected = func(reflected)
+        if f_reflected < values[0]:
+            expanded = centroid + 2 * (centroid - simplex[-1])
+            f_expanded = func(expanded)
+            simplex[-1], values[-1] = (expanded, f_expanded) if f_expanded < f_reflected else (reflected, f_reflected)
+        elif f_reflected < values[-2]:
+            simplex[-1], values[-1] = reflected, f_reflected
+        else:
+            contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            f_contracted = func(contracted)
+            if f_contracted < values[-1]:
+                simplex[-1], values[-1] = contracted, f_contracted
+            else:
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                values[1:] = [func(point) for point in simplex[1:]]
+    return simplex[np.argmin(values)]
+
+
+def _objective(loglik: Callable) -> Callable:
+    def negative(log_params):
+        value = -loglik(np.exp(log_params))
+        return value if np.isfinite(value) else np.inf
+    return negative
+
+# ------------------------------------------
+# BG/NBD & Gamma-Gamma
+# ------------------------------------------
+
+def bgnbd_loglik(params, x, tx, T) -> float:
+    r, alpha, a, b = params
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = gammaln(a + b) + gammaln(b + x) - gammaln(b) - gammaln(a + b + x)
+    a3 = -(r + x) * np.log(alpha + T)
+    repeat = x > 0
+    a4 = np.where(repeat, np.log(a) - np.log(np.maximum(b + x - 1, 1e-12)) - (r + x) * np.log(alpha + tx), -np.inf)
+    return float(np.sum(a1 + a2 + np.logaddexp(a3, a4)))
+
+
+def gamma_gamma_loglik(params, x, m) -> float:
+    p, q, v = params
+    return float(np.sum(
+        gammaln(p * x + q) - gammaln(p * x) - gammaln(q) + q * np.log(v)
+        + (p * x - 1) * np.log(m) + p * x * np.log(x) - (p * x + q) * np.log(x * m + v)
+    ))
+
+
+def fit_bgnbd(x, tx, T) -> np.ndarray:
+    """(r, alpha, a, b); alpha dimulai dari skala T."""
+    x0 = np.log([1.0, max(float(np.mean(T)), 1.0), 1.0, 1.0])
+    return np.exp(nelder_mead(_objective(lambda p: bgnbd_loglik(p, x, tx, T)), x0))
+
+
+def fit_gamma_gamma(x, m) -> np.ndarray:
+    """(p, q, v) dari pelanggan dengan pembelian ulang (x > 0, m > 0)."""
+    x0 = np.log([1.0, 2.0, max(float(np.mean(m)), 1.0)])
+    return np.exp(nelder_mead(_objective(lambda p: gamma_gamma_loglik(p, x, m)), x0))
+
+
+def bgnbd_predict(params, x, tx, T, t: float) -> tuple:
+    """(P(alive), E[jumlah pembelian dalam t minggu]) per pelanggan."""
+    r, alpha, a, b = params
+    if abs(a - 1) < 1e-6:
+        a = 1 + 1e-6
+    repeat = x > 0
+    # Rasio P(mati setelah pembelian terakhir) / P(masih aktif), dalam log agar stabil.
+    log_ratio = (np.log(a) - np.log(np.maximum(b + x - 1, 1e-12))
+                 + (r + x) * (np.log(alpha + T) - np.log(alpha + tx)))
+    odds = np.where(repeat, np.exp(np.minimum(log_ratio, 700)), 0.0)
+    p_alive = 1.0 / (1.0 + odds)
+
+    z = t / (alpha + T + t)
+    # Transformasi Euler: 2F1(r+x, b+x; c; z) = (1-z)^(c-a'-b') 2F1(a-1+b-r, a-1; c; z), konvergen cepat untuk x besar.
+    c = a + b + x - 1
+    log_factor = (r + x) * np.log((alpha + T) / (alpha + T + t)) + (c - (r + x) - (b + x)) * np.log1p(-z)
+    hyp = hyp2f1(c - (r + x), c - (b + x), c, z)
+    expected = (c / (a - 1)) * (1 - np.exp(log_factor) * hyp) / (1.0 + odds)
+    return p_alive, np.maximum(expected, 0.0)
+
+
+def gamma_gamma_expected_value(params, x, m) -> np.ndarray:
+    """E[nilai order | x, m]; pelanggan tanpa pembelian ulang memakai rata-rata populasi."""
+    p, q, v = params
+    population_mean = v * p / (q - 1) if q > 1 else np.nan
+    weight = p * x / (p * x + q - 1)
+    conditional = (1 - weight) * population_mean + weight * m
+    return np.where((x > 0) & np.isfinite(conditional), conditional,
+                    population_mean if np.isfinite(population_mean) else m)
+
+
+def _discount_factor(horizon: float) -> float:
+    """Faktor rata-rata nilai sekarang dari pembelian yang tersebar rata selama horizon."""
+    if CLV_WEEKLY_DISCOUNT <= 0:
+        return 1.0
+    weeks = np.arange(1, int(horizon) + 1)
+    return float(np.mean((1 + CLV_WEEKLY_DISCOUNT) ** -weeks))
+
+
+def fit_clv_models(summary: pd.DataFrame, sample: int = CLV_FIT_SAMPLE, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Fit BG/NBD & Gamma-Gamma pada sampel acak (likelihood dijumlah, sampel cukup untuk 4+3 parameter)."""
+    if len(summary) > sample:
+        summary = summary.sample(sample, random_state=seed)
+    x = summary['frequency'].to_numpy(np.float64)
+    tx = summary['recency_weeks'].to_numpy(np.float64)
+    T = summary['t_weeks'].to_numpy(np.float64)
+    m = summary['avg_order_value'].to_numpy(np.float64)
+    repeat = (x > 0) & (m > 0)
+    return {
+        'bgnbd': fit_bgnbd(x, tx, T),
+        'gamma_gamma': fit_gamma_gamma(x[repeat], m[repeat]) if repeat.sum() >= 3 else np.array([1.0, 2.0, np.mean(m)]),
+    }
+
+
+def predict_clv(summary: pd.DataFrame, params: Dict[str, np.ndarray],
+                horizon: float = CLV_HORIZON_WEEKS, chunk_rows: int = CLV_CHUNK_ROWS):
+    """Yield Arrow RecordBatch CLV per chunk pelanggan."""
+    discount = _discount_factor(horizon)
+    for start in range(0, len(summary), chunk_rows):
+        chunk = summary.iloc[start:start + chunk_rows]
+        x = chunk['frequency'].to_numpy(np.float64)
+        tx = chunk['recency_weeks'].to_numpy(np.float64)
+        T = chunk['t_weeks'].to_numpy(np.float64)
+        m = chunk['avg_order_value'].to_numpy(np.float64)
+        p_alive, purchases = bgnbd_predict(params['bgnbd'], x, tx, T, horizon)
+        order_value = gamma_gamma_expected_value(params['gamma_gamma'], x, m)
+        yield pa.RecordBatch.from_pydict({
+            'customer_key': pa.array(chunk['customer_key'].to_numpy(np.int64)),
+            'frequency': pa.array(x.astype(np.int64)),
+            'recency_weeks': pa.array(tx),
+            't_weeks': pa.array(T),
+            'avg_order_value': pa.array(m),
+            'p_alive': pa.array(p_alive),
+            'expected_purchases': pa.array(purchases),
+            'expected_order_value': pa.array(order_value),
+            'predicted_clv': pa.array(purchases * order_value * discount),
+        })
+
+# ------------------------------------------
+# Warehouse
+# ------------------------------------------
+
+def _ensure_clv_table(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(CLV_TABLE)} (
+            customer_key INTEGER PRIMARY KEY,
+            frequency INTEGER NOT NULL,
+            recency_weeks DOUBLE PRECISION NOT NULL,
+            t_weeks DOUBLE PRECISION NOT NULL,
+            avg_order_value DOUBLE PRECISION NOT NULL,
+            p_alive DOUBLE PRECISION NOT NULL,
+            expected_purchases DOUBLE PRECISION NOT NULL,
+            expected_order_value DOUBLE PRECISION NOT NULL,
+            predicted_clv DOUBLE PRECISION NOT NULL,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+
+
+def has_customer_clv(dw_engine: Engine) -> bool:
+    return table_exists(dw_engine, CLV_TABLE)
+
+
+def customer_clv_stale(dw_engine: Engine, max_age_s: float = CLV_CDC_INTERVAL_S) -> bool:
+    """True jika customer_clv belum ada / kosong atau lebih tua dari max_age_s detik."""
+    try:
+        if not has_customer_clv(dw_engine):
+            return True
+        age = read_sql_streaming(
+            f"SELECT EXTRACT(EPOCH FROM now() - MAX(computed_at)) AS age_s FROM {_qualified(CLV_TABLE)}",
+            dw_engine
+        )['age_s'].iloc[0]
+    except Exception as e:
+        print(f"⚠️ Umur {CLV_TABLE} tidak terbaca, dianggap kedaluwarsa. Error: {e}")
+        return True
+    return pd.isna(age) or float(age) >= max_age_s
+
+
+def refresh_customer_clv(dw_engine: Engine) -> bool:
+    """Fit ulang model atas seluruh histori dan ganti isi customer_clv (satu transaksi COPY)."""
+    print(f"--- 🚀 Refresh {CLV_TABLE} ---")
+    start = time.perf_counter()
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_clv_table(connection)
+        # Hanya kolom numerik (~40 byte/pelanggan); array model dibuat per chunk.
+        summary = read_sql_streaming(SUMMARY_QUERY, dw_engine)
+        if summary.empty:
+            batches = []
+        else:
+            params = fit_clv_models(summary)
+            r, alpha, a, b = params['bgnbd']
+            p, q, v = params['gamma_gamma']
+            print(f"ℹ️ BG/NBD r={r:.3f} alpha={alpha:.3f} a={a:.3f} b={b:.3f} | "
+                  f"Gamma-Gamma p={p:.3f} q={q:.3f} v={v:.3f}")
+            batches = list(predict_clv(summary, params))
+        schema = pa.schema([('customer_key', pa.int64()), ('frequency', pa.int64())]
+                           + [(name, pa.float64()) for name in CLV_COLUMNS[2:]])
+        copy_arrow_table(pa.Table.from_batches(batches, schema=schema), CLV_TABLE, DW_SCHEMA,
+                         dw_engine, replace=True)
+        print(f"✅ {CLV_TABLE}: {len(summary):,} pelanggan ({time.perf_counter() - start:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL refresh {CLV_TABLE}. Error: {e}")
+        return False
+
+
+def main(argv: Optional[list] = None):
+    from db_connection import get_dw_engine
+
+    parser = argparse.ArgumentParser(description="Fit & simpan CLV (BG/NBD + Gamma-Gamma)")
+    parser.parse_args(argv)
+
+    engine = get_dw_engine()
+    if engine is None:
+        raise SystemExit("❌ Konfigurasi database di file .env tidak lengkap.")
+    if not refresh_customer_clv(engine):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
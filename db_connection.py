@@ -1,40 +1,218 @@
 import os
+import threading
+import time
+from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
 
 load_dotenv()
 
-def conn() -> Engine:
+# Satu engine per konfigurasi, dipakai bersama oleh ETL dan dashboard.
+_ENGINES: Dict[tuple, Engine] = {}
+_ENGINES_LOCK = threading.Lock()
 
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_pool_settings(**overrides) -> Dict[str, Any]:
+    """Setting pool dari .env (PG_POOL_*), bisa ditimpa per pemanggil."""
+    settings = {
+        'pool_size': _env_int("PG_POOL_SIZE", 5),
+        'max_overflow': _env_int("PG_MAX_OVERFLOW", 10),
+        'pool_timeout': _env_int("PG_POOL_TIMEOUT", 30),
+        'pool_recycle': _env_int("PG_POOL_RECYCLE", 1800),
+        'pool_pre_ping': _env_bool("PG_POOL_PRE_PING", True),
+        'pool_use_lifo': _env_bool("PG_POOL_USE_LIFO", True),
+        'statement_timeout_ms': _env_int("PG_STATEMENT_TIMEOUT_MS", 0),
+    }
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return settings
+
+
+def get_database_url() -> Optional[str]:
     db_user = os.getenv("PG_USER")
     db_password = os.getenv("PG_PASSWORD")
     db_host = os.getenv("PG_HOST")
-    db_port = os.getenv("PG_PORT")
+    db_port = os.getenv("PG_PORT", "5432")
     db_name = os.getenv("PG_DATABASE")
 
-    db_schema = os.getenv("PG_SCHEMA") 
+    if not all([db_user, db_password, db_host, db_name]):
+        return None
+    return f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
-    database_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-    
-    try:
+
+class PoolMetrics:
+    """Counter pemakaian pool: checkout, waktu tunggu, koneksi baru, invalidasi."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.total_wait_s += seconds
+            self.max_wait_s = max(self.max_wait_s, seconds)
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_wait = self.total_wait_s / self.checkouts if self.checkouts else 0.0
+            return {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'avg_checkout_wait_ms': round(avg_wait * 1000, 3),
+                'max_checkout_wait_ms': round(self.max_wait_s * 1000, 3),
+            }
+
+
+class _TimedQueuePool(QueuePool):
+    """QueuePool yang mencatat berapa lama pemanggil menunggu koneksi."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+
+def _attach_metrics(engine: Engine) -> PoolMetrics:
+    metrics = PoolMetrics()
+    engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, conn_record):
+        metrics.incr('connects')
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        metrics.incr('checkouts')
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, conn_record):
+        metrics.incr('checkins')
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, conn_record, exception):
+        metrics.incr('invalidations')
+
+    return metrics
+
+
+def get_dw_engine(**overrides) -> Optional[Engine]:
+    """
+    Engine Data Warehouse bersama (ETL & dashboard).
+
+    Tidak membuka koneksi saat dibuat; kesehatan koneksi dicek lazily oleh
+    pool_pre_ping saat checkout atau lewat check_connection().
+    """
+    database_url = get_database_url()
+    if database_url is None:
+        print("Konfigurasi database di file .env tidak lengkap.")
+        return None
+
+    db_schema = os.getenv("PG_SCHEMA", "public")
+    settings = get_pool_settings(**overrides)
+    cache_key = (database_url, db_schema, tuple(sorted(settings.items())))
+
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(cache_key)
+        if engine is not None:
+            return engine
+
+        options = f"-csearch_path={db_schema}"
+        if settings['statement_timeout_ms'] > 0:
+            options += f" -cstatement_timeout={settings['statement_timeout_ms']}"
 
         engine = create_engine(
             database_url,
-            connect_args={'options': f'-csearch_path={db_schema}'}
+            poolclass=_TimedQueuePool,
+            pool_size=settings['pool_size'],
+            max_overflow=settings['max_overflow'],
+            pool_timeout=settings['pool_timeout'],
+            pool_recycle=settings['pool_recycle'],
+            pool_pre_ping=settings['pool_pre_ping'],
+            pool_use_lifo=settings['pool_use_lifo'],
+            connect_args={'options': options}
         )
-        conn = engine.connect()
-        conn.close()
-        print(f"Koneksi ke Data Warehouse '{db_name}' pada skema '{db_schema}' berhasil! ✅")
+        _attach_metrics(engine)
+        _ENGINES[cache_key] = engine
         return engine
+
+
+def check_connection(engine: Engine) -> bool:
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
     except Exception as e:
         print(f"Gagal terhubung ke database: {e}")
-        return None
+        return False
+
+
+def get_pool_metrics(engine: Engine) -> Dict[str, Any]:
+    pool = engine.pool
+    metrics = getattr(pool, 'metrics', None)
+    stats = metrics.snapshot() if metrics is not None else {}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'pool_size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+    return stats
+
+
+def dispose_engines():
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+
+
+def conn() -> Optional[Engine]:
+    # Nama lama, tetap ada untuk script yang masih memakainya.
+    return get_dw_engine()
+
 
 if __name__ == "__main__":
-    dw_engine = conn()
-    if dw_engine:
-        print(f"Engine berhasil dibuat: {dw_engine}")
+    dw_engine = get_dw_engine()
+    if dw_engine and check_connection(dw_engine):
+        print(f"Koneksi ke Data Warehouse berhasil! ✅ Engine: {dw_engine}")
+        print(f"Pool: {get_pool_metrics(dw_engine)}")
     else:
-        print("Engine gagal dibuat.")
\ No newline at end of file
+        print("Engine gagal dibuat.")
@@ -0,0 +1,28 @@
+import os
+
+# Tabel turunan di warehouse yang ditulis ETL dan dibaca dashboard. Dipisah
+# supaya kpi_queries (dashboard) tidak ikut mengimpor modul ETL yang berat.
+MONTHLY_AGG_TABLE = 'agg_sales_monthly'
+# Seri semua kategori; jumlah order distinct tidak bisa dijumlah antar kategori.
+ALL_CATEGORIES = '*'
+
+# Forecast revenue per seri (forecasting.py) dan hasil batch insights.py per (tahun, filter kategori).
+FORECAST_TABLE = 'revenue_forecast'
+INSIGHTS_TABLE = 'insights'
+# CLV per customer_key hasil batch clv_model.py (nama sama dengan KPI customer_clv, isi berbeda).
+CLV_TABLE = 'customer_clv'
+# Market basket (basket.py): state co-occurrence pasangan produk + top-K afinitas untuk dashboard.
+BASKET_PAIRS_TABLE = 'basket_pair_counts'
+BASKET_TOTALS_TABLE = 'basket_totals'
+AFFINITY_TABLE = 'product_affinity'
+# Hierarki karyawan (closure) dan agregat bulanan karyawan/shipper (org_aggregates.py).
+EMPLOYEE_CLOSURE_TABLE = 'employee_closure'
+EMPLOYEE_MONTHLY_TABLE = 'agg_employee_monthly'
+SHIPPER_MONTHLY_TABLE = 'agg_shipper_monthly'
+
+SKETCH_TABLE = 'hll_sketches'
+HLL_PRECISION = int(os.getenv("ETL_HLL_PRECISION", "12"))
+
+
+def hll_alpha(m: int) -> float:
+    return 0.7213 / (1 + 1.079 / m)
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import signal
+import time
+from typing import Optional
+
+from db_connection import get_dw_engine
+from etl_main import run_etl, run_incremental_etl
+from key_cache import STATE_DIR, DimensionKeyCache
+from load import read_dimension_keys
+from sources import ChangeLogSource, CsvSource, Source
+
+DAEMON_INTERVAL_S = float(os.getenv("ETL_DAEMON_INTERVAL_S", "60"))
+# Batas ukuran satu micro-batch & backlog sebelum status dianggap 'lagging'.
+DAEMON_MAX_CHANGES = int(os.getenv("ETL_DAEMON_MAX_CHANGES", "50000"))
+DAEMON_MAX_BACKLOG_BYTES = int(os.getenv("ETL_DAEMON_MAX_BACKLOG_BYTES", str(64 * 1024 ** 2)))
+DIM_REFRESH_S = float(os.getenv("ETL_DIM_REFRESH_S", "900"))
+
+
+class EtlLockBusy(Exception):
+    pass
+
+
+class EtlLock:
+    """
+    Lock file lintas proses supaya dua batch ETL (daemon atau run manual)
+    tidak pernah berjalan bersamaan. Lock milik proses yang sudah mati
+    dianggap basi dan diambil alih.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _owner_alive(self) -> bool:
+        try:
+            with open(self.path) as f:
+                pid = int(json.load(f)['pid'])
+        except (OSError, ValueError, KeyError):
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, OSError):
+            return True
+        return True
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._owner_alive():
+                    raise EtlLockBusy(f"ETL lain sedang berjalan ({self.path})")
+                os.unlink(self.path)
+                continue
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'pid': os.getpid(), 'since': time.time()}, f)
+            return self
+        raise EtlLockBusy(f"Gagal mengambil lock {self.path}")
+
+    def release(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class MicroBatchDaemon:
+    """
+    Scheduler ETL micro-batch: polling change log (incremental) atau folder
+    CSV (full load saat ada file berubah) setiap `interval_s` detik.
+
+    - Overlap dicegah dengan EtlLock.
+    - Back-pressure: satu batch dibatasi max_changes; selama backlog masih ada
+      batch berikutnya langsung jalan tanpa menunggu interval.
+    - Lookup dimensi memakai DimensionKeyCache yang tetap hangat di memori
+      antar batch; disinkronkan dari warehouse saat ada key baru atau
+      setiap dim_refresh_s.
+    - Status kesehatan/lag ditulis ke <state_dir>/daemon_status.json.
+    """
+
+    def __init__(self, source: Source, interval_s: float = DAEMON_INTERVAL_S,
+                 state_dir: str = STATE_DIR,
+                 max_backlog_bytes: int = DAEMON_MAX_BACKLOG_BYTES,
+                 dim_refresh_s: float = DIM_REFRESH_S):
+        self.source = source
+        self.interval_s = interval_s
+        self.max_backlog_bytes = max_backlog_bytes
+        self.dim_refresh_s = dim_refresh_s
+        self.lock = EtlLock(os.path.join(state_dir, 'etl.lock'))
+        self.status_path = os.path.join(state_dir, 'daemon_status.json')
+
+        self.key_cache = DimensionKeyCache(os.path.join(state_dir, 'dim_keys.sqlite'))
+        self._key_cache_synced_at = time.time()
+        self._last_fingerprint = None
+        self._stop = False
+        self.stats = {
+            'started_at': time.time(),
+            'batches': 0,
+            'skipped_overlap': 0,
+            'failures': 0,
+            'consecutive_failures': 0,
+            'last_success_at': None,
+            'last_batch_seconds': None,
+            'last_batch_orders': None,
+        }
+
+    def stop(self, *_):
+        self._stop = True
+
+    def _backlog_bytes(self) -> int:
+        backlog = getattr(self.source, 'backlog_bytes', None)
+        return backlog() if backlog else 0
+
+    def health(self) -> dict:
+        now = time.time()
+        backlog = self._backlog_bytes()
+        last_success = self.stats['last_success_at']
+
+        # Lag = umur perubahan terakhir yang sudah dimuat selama masih ada backlog.
+        lag_s = 0.0
+        if backlog > 0:
+            offset_ts = None
+            if isinstance(self.source, ChangeLogSource):
+                offset_ts = self.source.committed_offset().get('ts')
+            reference = offset_ts or last_success or self.stats['started_at']
+            lag_s = max(now - reference, 0.0)
+
+        if self.stats['consecutive_failures'] >= 3:
+            state = 'failing'
+        elif backlog > self.max_backlog_bytes:
+            state = 'lagging'
+        else:
+            state = 'ok'
+
+        return {
+            **self.stats,
+            'state': state,
+            'backlog_bytes': backlog,
+            'lag_seconds': round(lag_s, 1),
+            'updated_at': now,
+        }
+
+    def _write_status(self):
+        os.makedirs(os.path.dirname(self.status_path) or '.', exist_ok=True)
+        tmp_path = self.status_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.health(), f, indent=2)
+        os.replace(tmp_path, self.status_path)
+
+    def _warm_key_cache(self, engine) -> DimensionKeyCache:
+        if time.time() - self._key_cache_synced_at > self.dim_refresh_s:
+            self.key_cache.refresh_from(read_dimension_keys(engine))
+            self._key_cache_synced_at = time.time()
+        return self.key_cache
+
+    def run_once(self) -> Optional[int]:
+        """Satu micro-batch. None = tidak ada yang dikerjakan (idle/overlap)."""
+        try:
+            self.lock.acquire()
+        except EtlLockBusy as e:
+            print(f"⏭️ Batch dilewati: {e}")
+            self.stats['skipped_overlap'] += 1
+            return None
+
+        start = time.perf_counter()
+        try:
+            if self.source.incremental:
+                engine = get_dw_engine()
+                result = run_incremental_etl(self.source, engine, key_cache=self._warm_key_cache(engine))
+                ok = result >= 0
+            else:
+                fingerprint = self.source.fingerprint()
+                if fingerprint == self._last_fingerprint:
+                    return None
+                ok = run_etl(self.source, key_cache=self.key_cache)
+                result = 1 if ok else -1
+                if ok:
+                    self._last_fingerprint = fingerprint
+        except Exception as e:
+            print(f"❌ Micro-batch gagal: {e}")
+            ok, result = False, -1
+        finally:
+            self.lock.release()
+
+        self.stats['batches'] += 1
+        self.stats['last_batch_seconds'] = round(time.perf_counter() - start, 3)
+        if ok:
+            self.stats['consecutive_failures'] = 0
+            self.stats['last_success_at'] = time.time()
+            self.stats['last_batch_orders'] = result
+        else:
+            self.stats['failures'] += 1
+            self.stats['consecutive_failures'] += 1
+        return result
+
+    def run_forever(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        print(f"=== ETL daemon aktif (interval {self.interval_s}s) ===")
+
+        while not self._stop:
+            started = time.monotonic()
+            result = self.run_once()
+            self._write_status()
+
+            if result is not None and result > 0 and self._backlog_bytes() > 0:
+                # Masih ada backlog: kejar tanpa menunggu interval.
+                continue
+            # Backoff saat gagal beruntun, maksimal 10x interval.
+            factor = min(2 ** self.stats['consecutive_failures'], 10)
+            remaining = self.interval_s * factor - (time.monotonic() - started)
+            while remaining > 0 and not self._stop:
+                time.sleep(min(remaining, 1.0))
+                remaining -= 1.0
+
+        print("=== ETL daemon berhenti ===")
+
+
+def read_status(state_dir: str = STATE_DIR) -> dict:
+    path = os.path.join(state_dir, 'daemon_status.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batch ETL daemon")
+    parser.add_argument("--cdc", metavar="CHANGE_LOG", help="Change log JSONL yang dipantau")
+    parser.add_argument("--data-folder", default="data", help="Folder CSV yang dipantau (tanpa --cdc)")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL_S)
+    parser.add_argument("--max-changes", type=int, default=DAEMON_MAX_CHANGES)
+    parser.add_argument("--status", action="store_true", help="Tampilkan status daemon lalu keluar")
+    args = parser.parse_args()
+
+    if args.status:
+        print(json.dumps(read_status(), indent=2))
+    else:
+        if args.cdc:
+            source = ChangeLogSource(args.cdc, max_changes=args.max_changes)
+        else:
+            source = CsvSource(args.data_folder)
+        MicroBatchDaemon(source, interval_s=args.interval).run_forever()
@@ -1,37 +1,142 @@
+import argparse
+import os
+
+import pandas as pd
+
 # Pastikan semua file diimpor dengan nama yang benar
-from db_connection import get_dw_engine
-from exctract import extract_data
-from transform import transform_all_data
-from load import load_all_data
+from arrow_copy import to_arrow_tables
+from basket import apply_basket_delta, has_basket_state, refresh_basket
+from clv_model import customer_clv_stale, has_customer_clv, refresh_customer_clv
+from db_connection import check_connection, get_dw_engine
+from forecasting import forecasts_stale, has_forecasts, refresh_forecasts
+from hll_sketch import has_sketches, load_sketches, merge_delta_sketches, sketches_from_transformed
+from insights import has_insights, refresh_insights, stale_insight_years
+from key_cache import DimensionKeyCache
+from sources import ChangeLogSource, CsvSource, Source
+from transform import (affected_order_ids, has_unknown_business_keys, transform_all_data,
+                       transform_fact_delta)
+from load import (REFRESH_AGGREGATES, REFRESH_BASKET, STAR_TABLES, apply_fact_delta, clear_pending_refresh, load_all_data,
+                  load_all_data_staged, load_rejects, read_dimension_keys, read_facts_for_orders,
+                  read_load_state, read_pending_orders, read_pending_refresh, retry_failed_partitions,
+                  write_load_state)
+from org_aggregates import has_org_aggregates, refresh_employee_closure, refresh_org_aggregates
+from period_aggregates import has_monthly_aggregates, refresh_monthly_aggregates
+from stage_cache import StageCache, table_hashes
+from validate import validate_all, validate_fact_delta
 
-def run_etl():
+def run_etl(source: Source = None,
+            load_mode: str = os.getenv("ETL_LOAD_MODE", "staged"),
+            compact: bool = os.getenv("ETL_COMPACT", "0") == "1",
+            key_cache: DimensionKeyCache = None,
+            arrow: bool = os.getenv("ETL_ARROW", "0") == "1",
+            memoize: bool = os.getenv("ETL_STAGE_CACHE", "1") == "1",
+            sketches: bool = os.getenv("ETL_HLL_SKETCHES", "1") == "1",
+            insights: bool = os.getenv("ETL_INSIGHTS", "1") == "1",
+            forecasts: bool = os.getenv("ETL_FORECAST", "1") == "1",
+            clv: bool = os.getenv("ETL_CLV", "1") == "1",
+            basket: bool = os.getenv("ETL_BASKET", "1") == "1"):
     print("=" * 50)
     print("=== START: Northwind Data Warehouse ETL Pipeline ===")
     print("=" * 50)
 
     print("\n--- FASE: KONEKSI ---")
     dw_engine = get_dw_engine()
-    if dw_engine is None:
+    if dw_engine is None or not check_connection(dw_engine):
         print("❌ ETL DIBATALKAN: Koneksi database gagal.")
-        return
+        return False
 
     print("\n--- FASE: EKSTRAKSI ---")
     try:
-        raw_data = extract_data() 
+        raw_data = (source or CsvSource()).extract()
     except Exception as e:
         print(f"❌ ETL DIBATALKAN: Ekstraksi data gagal. Error: {e}")
-        return
+        return False
 
     # 3. Transform
     print("\n--- FASE: TRANSFORMASI ---")
-    transformed_data = transform_all_data(raw_data)
+    transformed_data = transform_all_data(raw_data, compact=compact,
+                                          key_cache=key_cache or DimensionKeyCache(),
+                                          stage_cache=StageCache() if memoize else None)
     if not transformed_data:
         print("❌ ETL DIBATALKAN: Transformasi menghasilkan data kosong.")
-        return
+        return False
+
+    # Validasi: baris bermasalah ditolak & dicatat, bukan dibuang diam-diam.
+    transformed_data, rejects, _ = validate_all(transformed_data)
+    if not load_rejects(rejects, dw_engine):
+        print("⚠️ Rejects tidak tersimpan ke warehouse; lanjut load data bersih.")
+
+    # Tabel yang isinya identik dengan load terakhir tidak dimuat ulang.
+    content_hashes = table_hashes(transformed_data)
+    loaded_hashes = read_load_state(dw_engine) if memoize else {}
+    unchanged = [t for t in STAR_TABLES if loaded_hashes.get(t) == content_hashes.get(t)]
+    # Sketch HLL distinct count dibangun dari data lengkap, sebelum tabel yang sama dilewati.
+    sketch_rows = None
+    if sketches and (not {'fact_sales', 'dim_product', 'dim_customer'} <= set(unchanged)
+                     or not has_sketches(dw_engine)):
+        sketch_rows = sketches_from_transformed(transformed_data)
+    if unchanged:
+        print(f"♻️ Tidak berubah sejak load terakhir, dilewati: {', '.join(unchanged)}")
+        transformed_data = {t: df for t, df in transformed_data.items() if t not in unchanged}
+    if not transformed_data:
+        if not has_monthly_aggregates(dw_engine):
+            refresh_monthly_aggregates(dw_engine)
+        if not has_org_aggregates(dw_engine):
+            refresh_employee_closure(dw_engine)
+            refresh_org_aggregates(dw_engine)
+        if sketch_rows is not None:
+            load_sketches(sketch_rows, dw_engine)
+        if forecasts and not has_forecasts(dw_engine):
+            refresh_forecasts(dw_engine)
+        if clv and not has_customer_clv(dw_engine):
+            refresh_customer_clv(dw_engine)
+        if basket and not has_basket_state(dw_engine):
+            refresh_basket(dw_engine)
+        if insights and not has_insights(dw_engine):
+            refresh_insights(dw_engine)
+        print("=== SUCCESS: Warehouse sudah up to date, tidak ada yang dimuat. ✅ ===")
+        dw_engine.dispose()
+        return True
+    if arrow:
+        # Hand-off ke loader sebagai Arrow table -> COPY binary tanpa objek per baris.
+        transformed_data = to_arrow_tables(transformed_data)
     
     # 4. Load
     print("\n--- FASE: PEMUATAN (LOAD) ---")
-    load_all_data(transformed_data, dw_engine)
+    if load_mode == 'staged':
+        # Shadow table + swap atomic: dashboard tidak pernah membaca data setengah jadi.
+        load_report = load_all_data_staged(transformed_data, dw_engine)
+    else:
+        load_report = load_all_data(transformed_data, dw_engine)
+    if load_report['failed'] and load_report['fact_partitions'] and load_mode != 'staged':
+        print(f"\n--- RETRY {len(load_report['failed'])} PARTISI GAGAL ---")
+        load_report = retry_failed_partitions(load_report, transformed_data, dw_engine)
+    if load_report['failed']:
+        print(f"❌ ETL GAGAL: Load tidak lengkap untuk {load_report['failed']}")
+        return False
+    write_load_state(dw_engine, {t: content_hashes[t] for t in transformed_data})
+    # Agregat kumulatif untuk KPI rolling/multi-tahun; gagal refresh tidak membatalkan load.
+    monthly_ok = refresh_monthly_aggregates(dw_engine)
+    # Closure hierarki hanya berubah bersama dim_employee; agregat karyawan/shipper ikut fact_sales.
+    if 'dim_employee' in transformed_data or not has_org_aggregates(dw_engine):
+        refresh_employee_closure(dw_engine)
+    if refresh_org_aggregates(dw_engine) and monthly_ok:
+        # Refresh penuh menggantikan tanda pending dari batch CDC yang gagal.
+        clear_pending_refresh(dw_engine, [REFRESH_AGGREGATES])
+    if sketch_rows is not None:
+        load_sketches(sketch_rows, dw_engine)
+    # Model forecast di-fit di sini (paralel); dashboard hanya membaca revenue_forecast.
+    if forecasts:
+        refresh_forecasts(dw_engine)
+    # CLV (BG/NBD + Gamma-Gamma) atas seluruh histori; dashboard hanya membaca customer_clv.
+    if clv:
+        refresh_customer_clv(dw_engine)
+    # Co-occurrence produk dibangun ulang dari fact_sales; batch CDC hanya menerapkan delta.
+    if basket and 'fact_sales' in transformed_data and refresh_basket(dw_engine):
+        clear_pending_refresh(dw_engine, [REFRESH_BASKET])
+    # Insight semua tahun x filter kategori dihitung sekarang, bukan saat dashboard dibuka.
+    if insights:
+        refresh_insights(dw_engine)
 
     # Menutup koneksi
     if dw_engine:
@@ -40,6 +145,136 @@ def run_etl():
     print("=" * 50)
     print("=== SUCCESS: ETL Pipeline Selesai! ✅            ===")
     print("=" * 50)
+    return True
+
+def _refresh_pending_aggregates(dw_engine) -> bool:
+    """
+    Hitung ulang agregat bulanan sejak date_key yang ditandai pending (delta
+    batch ini + batch sebelumnya yang refresh-nya gagal). Tanda dihapus hanya
+    jika semua refresh berhasil.
+    """
+    pending_refresh = read_pending_refresh(dw_engine)
+    if pending_refresh is None:
+        return False
+    if REFRESH_AGGREGATES not in pending_refresh:
+        return True
+    since = pending_refresh[REFRESH_AGGREGATES]
+    return (refresh_monthly_aggregates(dw_engine, since_date_key=since)
+            and refresh_org_aggregates(dw_engine, since_date_key=since)
+            and clear_pending_refresh(dw_engine, [REFRESH_AGGREGATES]))
+
+
+def _update_basket(dw_engine, old_facts: pd.DataFrame = None, new_facts: pd.DataFrame = None) -> bool:
+    """
+    Terapkan delta basket, atau bangun ulang penuh jika tanpa delta (tanda
+    basket pending dari batch yang gagal). Tanda dihapus hanya jika berhasil.
+    """
+    if old_facts is None:
+        updated = refresh_basket(dw_engine)
+    else:
+        updated = apply_basket_delta(old_facts, new_facts, dw_engine)
+    return updated and clear_pending_refresh(dw_engine, [REFRESH_BASKET])
+
+
+def run_incremental_etl(source: Source, dw_engine=None, key_cache: DimensionKeyCache = None) -> int:
+    """
+    Satu batch CDC: baca delta dari source, transform hanya order yang
+    terdampak, lalu ganti baris fact-nya. Mengembalikan jumlah order terdampak
+    (-1 jika gagal; offset source tidak di-commit sehingga batch diulang).
+
+    key_cache: cache key dimensi persisten (dipakai ulang antar batch oleh
+    daemon); hanya disinkronkan dari warehouse jika delta memuat key baru.
+    """
+    dw_engine = dw_engine or get_dw_engine()
+    if dw_engine is None:
+        print("❌ ETL DIBATALKAN: Koneksi database gagal.")
+        return -1
+
+    print("\n--- FASE: EKSTRAKSI (CDC) ---")
+    changes = source.extract()
+    # Dibaca sebelum delta: tanda basket dari batch sebelumnya berarti C tidak bisa lagi di-delta.
+    pending_refresh = read_pending_refresh(dw_engine)
+    if pending_refresh is None:
+        return -1
+    basket = os.getenv("ETL_BASKET", "1") == "1"
+    basket_dirty = basket and REFRESH_BASKET in pending_refresh
+
+    if not changes:
+        print("Tidak ada perubahan baru.")
+        if not _refresh_pending_aggregates(dw_engine) or (basket_dirty and not _update_basket(dw_engine)):
+            return -1
+        source.commit()
+        return 0
+
+    print("\n--- FASE: TRANSFORMASI (DELTA) ---")
+    key_cache = key_cache or DimensionKeyCache()
+    key_maps = key_cache.key_maps()
+    if has_unknown_business_keys(changes, key_maps):
+        key_cache.refresh_from(read_dimension_keys(dw_engine))
+        key_maps = key_cache.key_maps()
+    affected = affected_order_ids(changes)
+    existing_facts = read_facts_for_orders(dw_engine, affected)
+    pending = read_pending_orders(dw_engine, affected)
+    order_ids, fact_delta, pending = transform_fact_delta(changes, key_maps, existing_facts, pending)
+    fact_delta, rejects = validate_fact_delta(fact_delta, key_maps)
+    if not load_rejects(rejects, dw_engine):
+        return -1
+
+    # Hanya bulan yang disentuh delta (baris lama maupun baru) yang dihitung ulang.
+    touched = pd.concat([existing_facts['date_key'], fact_delta['date_key']]).dropna()
+    # Bulan paling awal dicatat di transaksi fact: jika refresh gagal, batch
+    # ulangan (yang sudah melihat baris baru) tetap tahu bulan lama yang harus dihitung.
+    refresh_marks = {REFRESH_AGGREGATES: int(touched.min())} if not touched.empty else {}
+    if basket:
+        refresh_marks[REFRESH_BASKET] = None
+
+    print("\n--- FASE: PEMUATAN (DELTA) ---")
+    if not apply_fact_delta(order_ids, fact_delta, dw_engine, pending, refresh_marks):
+        return -1
+    # State inkremental (agregat, sketch, basket) harus ikut ter-update; jika
+    # gagal, offset tidak di-commit agar batch diulang.
+    state_steps = [lambda: _refresh_pending_aggregates(dw_engine),
+                   lambda: merge_delta_sketches(fact_delta, dw_engine)]
+    if basket_dirty:
+        state_steps.append(lambda: _update_basket(dw_engine))
+    elif basket:
+        state_steps.append(lambda: _update_basket(dw_engine, existing_facts, fact_delta))
+    if not all([step() for step in state_steps]):
+        print("❌ Batch CDC tidak di-commit: state agregat gagal diperbarui.")
+        return -1
+    # Fit ulang semua seri mahal: hanya jika bulan yang sudah di-fit berubah atau hasilnya
+    # lebih tua dari ETL_FORECAST_CDC_INTERVAL_S, bukan setiap micro-batch.
+    if (not touched.empty and os.getenv("ETL_FORECAST", "1") == "1"
+            and forecasts_stale(dw_engine, since_date_key=int(touched.min()))):
+        refresh_forecasts(dw_engine)
+    # Fit CLV memakai seluruh histori: dibatasi sekali per ETL_CLV_CDC_INTERVAL_S, bukan setiap batch.
+    if not touched.empty and os.getenv("ETL_CLV", "1") == "1" and customer_clv_stale(dw_engine):
+        refresh_customer_clv(dw_engine)
+    if not touched.empty and os.getenv("ETL_INSIGHTS", "1") == "1":
+        # Tahun yang disentuh + tahun berikutnya (pembandingnya tahun lalu).
+        # Dibatasi per tahun (INSIGHT_CDC_INTERVAL_S): satu refresh = filter x query per tahun.
+        years = set((touched.astype('int64') // 10000).tolist())
+        stale_years = stale_insight_years(dw_engine, years | {year + 1 for year in years})
+        if stale_years:
+            refresh_insights(dw_engine, years=stale_years)
+    source.commit()
+    return len(order_ids)
+
 
 if __name__ == "__main__":
-    run_etl()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Northwind Data Warehouse ETL")
+    parser.add_argument("--cdc", metavar="CHANGE_LOG",
+                        help="Terapkan delta dari change log JSONL (orders/order_details), bukan full load CSV")
+    args = parser.parse_args()
+
+    from etl_daemon import STATE_DIR, EtlLock, EtlLockBusy
+
+    try:
+        # Lock yang sama dengan etl_daemon: run manual tidak tumpang tindih dengan daemon.
+        with EtlLock(os.path.join(STATE_DIR, 'etl.lock')):
+            if args.cdc:
+                run_incremental_etl(ChangeLogSource(args.cdc))
+            else:
+                run_etl()
+    except EtlLockBusy as e:
+        print(f"❌ ETL DIBATALKAN: {e}")
\ No newline at end of file
@@ -0,0 +1,271 @@
+import argparse
+import datetime
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from arrow_copy import copy_arrow_table
+from dw_schema import FORECAST_TABLE, MONTHLY_AGG_TABLE
+from load import DW_SCHEMA, FACT_TABLE, _qualified, table_exists
+from period_aggregates import month_from_date_key
+from stream_read import read_sql_streaming
+
+# Forecast revenue bulanan per kategori & per negara, hanya NumPy.
+# Model: Holt-Winters aditif dengan trend teredam (musiman 12 bulan jika
+# histori >= 2 tahun, tanpa musiman jika lebih pendek). Parameter dipilih
+# dengan grid search SSE one-step-ahead; semua kombinasi grid dihitung
+# sekaligus sebagai vektor, loop hanya atas waktu.
+
+FORECAST_HORIZON = int(os.getenv("ETL_FORECAST_HORIZON", "12"))
+FORECAST_WORKERS = int(os.getenv("ETL_FORECAST_WORKERS", str(os.cpu_count() or 1)))
+# Di bawah jumlah seri ini, overhead process pool lebih besar dari manfaatnya.
+FORECAST_PARALLEL_MIN_SERIES = int(os.getenv("ETL_FORECAST_PARALLEL_MIN_SERIES", "500"))
+# Batch CDC fit ulang paling sering sekali per interval ini (detik), kecuali
+# delta mengubah bulan yang sudah di-fit.
+FORECAST_CDC_INTERVAL_S = int(os.getenv("ETL_FORECAST_CDC_INTERVAL_S", "3600"))
+SEASON = 12
+
+ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETAS = (0.0, 0.05, 0.1, 0.2)
+PHIS = (0.8, 0.9, 0.98)
+GAMMAS = (0.0, 0.1, 0.3)
+
+FORECAST_COLUMNS = ['series_type', 'series_key', 'month_start', 'forecast', 'stderr', 'model', 'fitted_through']
+
+
+def _grid(seasonal: bool) -> Tuple[np.ndarray, ...]:
+    gammas = GAMMAS if seasonal else (0.0,)
+    mesh = np.meshgrid(ALPHAS, BETAS, PHIS, gammas, indexing='ij')
+    return tuple(axis.ravel() for axis in mesh)
+
+
+def _smooth(y: np.ndarray, alpha, beta, phi, gamma, seasonal: bool) -> tuple:
+    """Jalankan smoothing untuk semua kombinasi grid (G,) -> (sse, level, trend, season, n_err)."""
+    n, g = len(y), len(alpha)
+    period = SEASON if seasonal else 1
+    if seasonal:
+        first, second = y[:SEASON].mean(), y[SEASON:2 * SEASON].mean()
+        level = np.full(g, first)
+        trend = np.full(g, (second - first) / SEASON)
+        season = np.tile(y[:SEASON] - first, (g, 1))
+        start = 0
+    else:
+        span = min(n - 1, 3)
+        level = np.full(g, y[0])
+        trend = np.full(g, (y[span] - y[0]) / span)
+        season = np.zeros((g, 1))
+        start = 1
+    sse = np.zeros(g)
+    for t in range(start, n):
+        idx = t % period
+        prediction = level + phi * trend + season[:, idx]
+        sse += (y[t] - prediction) ** 2
+        new_level = alpha * (y[t] - season[:, idx]) + (1 - alpha) * (level + phi * trend)
+        trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        season[:, idx] = gamma * (y[t] - new_level) + (1 - gamma) * season[:, idx]
+        level = new_level
+    return sse, level, trend, season, n - start
+
+
+def fit_forecast(y: np.ndarray, horizon: int = FORECAST_HORIZON) -> Tuple[np.ndarray, np.ndarray, str]:
+    """Revenue bulanan (rapat, urut waktu) -> (forecast, stderr, nama model) untuk horizon bulan."""
+    y = np.asarray(y, dtype=np.float64)
+    steps = np.arange(1, horizon + 1)
+    if len(y) < 4 or not np.any(y):
+        mean = y.mean() if len(y) else 0.0
+        spread = y.std() if len(y) > 1 else mean * 0.5
+        return np.full(horizon, mean), np.full(horizon, spread), 'mean'
+
+    seasonal = len(y) >= 2 * SEASON
+    alpha, beta, phi, gamma = _grid(seasonal)
+    sse, level, trend, season, n_err = _smooth(y, alpha, beta, phi, gamma, seasonal)
+    best = int(np.argmin(sse))
+
+    damping = np.cumsum(phi[best] ** steps)
+    period = season.shape[1]
+    seasonal_part = season[best, (len(y) + steps - 1) % period]
+    forecast = np.maximum(level[best] + damping * trend[best] + seasonal_part, 0.0)
+    sigma = np.sqrt(sse[best] / max(n_err - 3, 1))
+    # Varian galat h-langkah, pendekatan SES: sigma^2 * (1 + (h-1) * alpha^2).
+    stderr = sigma * np.sqrt(1 + (steps - 1) * alpha[best] ** 2)
+    return forecast, stderr, 'holt_winters_damped' if seasonal else 'holt_damped'
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _fit_series_chunk(items: List[tuple]) -> List[dict]:
+    """[(series_type, series_key, bulan terakhir, revenue)] -> baris forecast (jalan di worker)."""
+    rows = []
+    for series_type, series_key, last_month, values in items:
+        forecast, stderr, model = fit_forecast(values)
+        for h, (value, error) in enumerate(zip(forecast, stderr), start=1):
+            rows.append({'series_type': series_type, 'series_key': series_key,
+                         'month_start': add_months(last_month, h), 'forecast': float(value),
+                         'stderr': float(error), 'model': model, 'fitted_through': last_month})
+    return rows
+
+
+def fit_all_series(series: pd.DataFrame, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    series: (series_type, series_key, month_start, revenue), rapat per seri.
+    Seri dibagi rata ke process pool (fork); data kecil di satu proses.
+    """
+    items = [
+        (series_type, series_key, group['month_start'].iloc[-1], group['revenue'].to_numpy(np.float64))
+        for (series_type, series_key), group in series.sort_values('month_start').groupby(
+            ['series_type', 'series_key'], sort=True)
+    ]
+    workers = workers or FORECAST_WORKERS
+    if workers <= 1 or len(items) < FORECAST_PARALLEL_MIN_SERIES or 'fork' not in mp.get_all_start_methods():
+        rows = _fit_series_chunk(items)
+    else:
+        chunks = [items[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork')) as pool:
+            rows = [row for chunk in pool.map(_fit_series_chunk, chunks) for row in chunk]
+    return pd.DataFrame(rows, columns=FORECAST_COLUMNS)
+
+
+# ------------------------------------------
+# Baca seri dari warehouse & simpan hasil
+# ------------------------------------------
+
+def read_revenue_series(dw_engine: Engine) -> pd.DataFrame:
+    """
+    Seri revenue bulanan per kategori (agregat, termasuk '*') dan per negara,
+    rapat s.d. bulan lengkap terakhir. Bulan terakhir yang datanya belum
+    sampai akhir bulan (mis. Mei 1998, 6 hari) tidak ikut di-fit.
+    """
+    categories = read_sql_streaming(
+        f"SELECT 'category' AS series_type, category_name AS series_key, month_start, revenue "
+        f"FROM {_qualified(MONTHLY_AGG_TABLE)}",
+        dw_engine
+    )
+    countries = read_sql_streaming(f"""
+        SELECT 'country' AS series_type, COALESCE(dc.country, 'Unknown') AS series_key,
+               date_trunc('month', dd.full_date)::date AS month_start, SUM(fs.revenue) AS revenue
+        FROM {_qualified(FACT_TABLE)} fs
+        JOIN {_qualified('dim_date')} dd ON fs.date_key = dd.date_key
+        JOIN {_qualified('dim_customer')} dc ON fs.customer_key = dc.customer_key
+        GROUP BY 1, 2, 3
+    """, dw_engine)
+    last_date = read_sql_streaming(f"""
+        SELECT MAX(dd.full_date) AS last_date
+        FROM {_qualified(FACT_TABLE)} fs
+        JOIN {_qualified('dim_date')} dd ON fs.date_key = dd.date_key
+    """, dw_engine)['last_date'].iloc[0]
+    series = pd.concat([categories, countries], ignore_index=True)
+    if series.empty or pd.isna(last_date):
+        return series.iloc[0:0]
+    last_date = pd.Timestamp(last_date)
+    last_complete = last_date.to_period('M').to_timestamp()
+    if not last_date.is_month_end:
+        last_complete -= pd.offsets.MonthBegin(1)
+
+    # Semua seri diakhiri bulan lengkap terakhir yang sama: negara tanpa order di akhir tetap diforecast dari 0.
+    series['month_start'] = pd.to_datetime(series['month_start'])
+    series = series[series['month_start'] <= last_complete]
+    if series.empty:
+        return series
+    months = pd.date_range(series['month_start'].min(), last_complete, freq='MS')
+    dense = []
+    for (series_type, series_key), group in series.groupby(['series_type', 'series_key'], sort=False):
+        values = group.set_index('month_start')['revenue'].reindex(months[months >= group['month_start'].min()],
+                                                                   fill_value=0.0)
+        dense.append(pd.DataFrame({'series_type': series_type, 'series_key': series_key,
+                                   'month_start': values.index.date, 'revenue': values.to_numpy(np.float64)}))
+    return pd.concat(dense, ignore_index=True)
+
+
+def _ensure_forecast_table(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(FORECAST_TABLE)} (
+            series_type TEXT NOT NULL,
+            series_key TEXT NOT NULL,
+            month_start DATE NOT NULL,
+            forecast DOUBLE PRECISION NOT NULL,
+            stderr DOUBLE PRECISION NOT NULL,
+            model TEXT NOT NULL,
+            fitted_through DATE NOT NULL,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (series_type, series_key, month_start)
+        )
+    """))
+
+
+def has_forecasts(dw_engine: Engine) -> bool:
+    return table_exists(dw_engine, FORECAST_TABLE)
+
+
+def forecasts_stale(dw_engine: Engine, since_date_key: Optional[int] = None,
+                    max_age_s: float = FORECAST_CDC_INTERVAL_S) -> bool:
+    """
+    True jika revenue_forecast belum ada / kosong, lebih tua dari max_age_s
+    detik, atau since_date_key jatuh di bulan yang sudah di-fit. Delta yang
+    hanya menyentuh bulan berjalan (belum lengkap) tidak mengubah hasil fit.
+    """
+    try:
+        if not has_forecasts(dw_engine):
+            return True
+        state = read_sql_streaming(
+            f"SELECT EXTRACT(EPOCH FROM now() - MAX(computed_at)) AS age_s, MAX(fitted_through) AS fitted_through "
+            f"FROM {_qualified(FORECAST_TABLE)}",
+            dw_engine
+        ).iloc[0]
+    except Exception as e:
+        print(f"⚠️ Umur {FORECAST_TABLE} tidak terbaca, dianggap kedaluwarsa. Error: {e}")
+        return True
+    if pd.isna(state['age_s']) or float(state['age_s']) >= max_age_s:
+        return True
+    return (since_date_key is not None
+            and month_from_date_key(since_date_key) <= pd.Timestamp(state['fitted_through']).date())
+
+
+def refresh_forecasts(dw_engine: Engine, workers: Optional[int] = None) -> bool:
+    """Fit ulang semua seri dan ganti isi revenue_forecast (dashboard hanya membaca)."""
+    print(f"--- 🚀 Refresh {FORECAST_TABLE} ---")
+    start = time.perf_counter()
+    try:
+        series = read_revenue_series(dw_engine)
+        forecasts = fit_all_series(series, workers) if not series.empty else pd.DataFrame(columns=FORECAST_COLUMNS)
+        with dw_engine.begin() as connection:
+            _ensure_forecast_table(connection)
+        forecasts = forecasts.assign(month_start=pd.to_datetime(forecasts['month_start']),
+                                     fitted_through=pd.to_datetime(forecasts['fitted_through']))
+        copy_arrow_table(pa.Table.from_pandas(forecasts, preserve_index=False),
+                         FORECAST_TABLE, DW_SCHEMA, dw_engine, replace=True)
+        n_series = forecasts.groupby(['series_type', 'series_key']).ngroups
+        print(f"✅ {FORECAST_TABLE}: {n_series} seri x {FORECAST_HORIZON} bulan "
+              f"({time.perf_counter() - start:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL refresh {FORECAST_TABLE}. Error: {e}")
+        return False
+
+
+def main(argv: Optional[list] = None):
+    from db_connection import get_dw_engine
+
+    parser = argparse.ArgumentParser(description="Fit & simpan forecast revenue bulanan")
+    parser.add_argument('--workers', type=int, default=FORECAST_WORKERS)
+    args = parser.parse_args(argv)
+
+    engine = get_dw_engine()
+    if engine is None:
+        raise SystemExit("❌ Konfigurasi database di file .env tidak lengkap.")
+    if not refresh_forecasts(engine, args.workers):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
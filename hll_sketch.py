@@ -0,0 +1,182 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from arrow_copy import copy_arrow_table
+from dw_schema import HLL_PRECISION, SKETCH_TABLE, hll_alpha
+from load import DW_SCHEMA, FACT_TABLE, _qualified, table_exists
+from stream_read import read_sql_streaming
+
+# HyperLogLog: 2^p register per sketch, galat standar ~1.04 / sqrt(2^p)
+# (p=12 -> ~1.6%). Sketch bisa digabung (max per register), jadi distinct
+# count untuk kombinasi filter apa pun dihitung dari sketch, bukan fact.
+
+# metric -> kolom fact yang dihitung distinct-nya
+SKETCH_METRICS = {'orders': 'order_id', 'customers': 'customer_key'}
+SKETCH_DIMENSIONS = ['month_start', 'category_name', 'country']
+SKETCH_COLUMNS = ['metric', *SKETCH_DIMENSIONS, 'reg_idx', 'reg_val']
+
+
+def hash64(values) -> np.ndarray:
+    # Samakan ke int64 dulu: hash pandas bergantung dtype (int32 != int64).
+    return pd.util.hash_pandas_object(pd.Series(values).astype('int64'), index=False).to_numpy()
+
+
+def _leading_zeros(x: np.ndarray) -> np.ndarray:
+    """Jumlah bit 0 di depan setiap uint64 (vektor, pencarian biner 6 langkah)."""
+    x = x.copy()
+    zeros = np.zeros(len(x), dtype=np.int16)
+    for shift in (32, 16, 8, 4, 2, 1):
+        small = x < (np.uint64(1) << np.uint64(64 - shift))
+        zeros[small] += shift
+        x[small] <<= np.uint64(shift)
+    zeros[x == 0] += 1
+    return zeros
+
+
+def register_updates(hashes: np.ndarray, precision: int = HLL_PRECISION) -> tuple:
+    """Hash -> (indeks register = p bit teratas, rank = posisi bit 1 pertama sisanya)."""
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int32)
+    rank = np.minimum(_leading_zeros(hashes << np.uint64(precision)) + 1, 64 - precision + 1)
+    return index, rank.astype(np.int16)
+
+
+def estimate(registers: np.ndarray) -> float:
+    """Estimasi kardinalitas dari register padat (dengan linear counting untuk n kecil)."""
+    m = len(registers)
+    raw = hll_alpha(m) * m * m / np.exp2(-registers.astype(np.float64)).sum()
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * m and zeros:
+        return m * np.log(m / zeros)
+    return float(raw)
+
+
+def dense_registers(rows: pd.DataFrame, precision: int = HLL_PRECISION) -> np.ndarray:
+    """Gabungkan baris register (reg_idx, reg_val) jadi satu sketch padat."""
+    registers = np.zeros(1 << precision, dtype=np.int16)
+    np.maximum.at(registers, rows['reg_idx'].to_numpy(np.int64), rows['reg_val'].to_numpy(np.int16))
+    return registers
+
+
+# ------------------------------------------
+# Membangun sketch dari fact
+# ------------------------------------------
+
+def sketch_inputs(fact: pd.DataFrame, categories: pd.Series, countries: pd.Series) -> pd.DataFrame:
+    """
+    Baris fact -> (month_start, category_name, country, order_id, customer_key).
+    categories: product_key -> category_name, countries: customer_key -> country.
+    """
+    year_month = fact['date_key'].to_numpy(np.int64) // 100
+    month_start = pd.to_datetime(pd.DataFrame({'year': year_month // 100, 'month': year_month % 100, 'day': 1}))
+    return pd.DataFrame({
+        'month_start': month_start.to_numpy(),
+        'category_name': fact['product_key'].map(categories).astype(object).fillna('Unknown').to_numpy(),
+        'country': fact['customer_key'].map(countries).astype(object).fillna('Unknown').to_numpy(),
+        'order_id': fact['order_id'].to_numpy(),
+        'customer_key': fact['customer_key'].to_numpy(),
+    })
+
+
+def build_sketches(inputs: pd.DataFrame, precision: int = HLL_PRECISION) -> pd.DataFrame:
+    """Register per metric x bulan x kategori x negara; hanya register bukan nol yang disimpan."""
+    frames = []
+    for metric, column in SKETCH_METRICS.items():
+        index, rank = register_updates(hash64(inputs[column]), precision)
+        registers = (
+            inputs[SKETCH_DIMENSIONS]
+            .assign(reg_idx=index, reg_val=rank)
+            .groupby([*SKETCH_DIMENSIONS, 'reg_idx'], sort=False)['reg_val'].max()
+            .reset_index()
+        )
+        registers.insert(0, 'metric', metric)
+        frames.append(registers)
+    return pd.concat(frames, ignore_index=True)[SKETCH_COLUMNS]
+
+
+def sketches_from_transformed(transformed_data: Dict[str, pd.DataFrame],
+                              precision: int = HLL_PRECISION) -> Optional[pd.DataFrame]:
+    fact = transformed_data.get(FACT_TABLE)
+    dim_product = transformed_data.get('dim_product')
+    dim_customer = transformed_data.get('dim_customer')
+    if fact is None or dim_product is None or dim_customer is None:
+        return None
+    inputs = sketch_inputs(
+        fact,
+        dim_product.set_index('product_key')['category_name'],
+        dim_customer.set_index('customer_key')['country'],
+    )
+    return build_sketches(inputs, precision)
+
+
+# ------------------------------------------
+# Simpan ke warehouse
+# ------------------------------------------
+
+def _ensure_sketch_table(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(SKETCH_TABLE)} (
+            metric TEXT NOT NULL,
+            month_start DATE NOT NULL,
+            category_name TEXT NOT NULL,
+            country TEXT NOT NULL,
+            reg_idx SMALLINT NOT NULL,
+            reg_val SMALLINT NOT NULL,
+            PRIMARY KEY (metric, month_start, category_name, country, reg_idx)
+        )
+    """))
+
+
+def has_sketches(dw_engine: Engine) -> bool:
+    return table_exists(dw_engine, SKETCH_TABLE)
+
+
+def load_sketches(sketches: pd.DataFrame, dw_engine: Engine) -> bool:
+    """Ganti seluruh isi hll_sketches (full load) lewat COPY binary."""
+    print(f"--- 🚀 Memuat {SKETCH_TABLE} ({len(sketches)} register) ---")
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_sketch_table(connection)
+        copy_arrow_table(pa.Table.from_pandas(sketches, preserve_index=False),
+                         SKETCH_TABLE, DW_SCHEMA, dw_engine, replace=True)
+        print(f"✅ {SKETCH_TABLE} berhasil dimuat.")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL memuat {SKETCH_TABLE}. Error: {e}")
+        return False
+
+
+def merge_delta_sketches(fact_delta: pd.DataFrame, dw_engine: Engine,
+                         precision: int = HLL_PRECISION) -> bool:
+    """
+    Gabungkan sketch dari delta CDC ke sketch yang ada (GREATEST per register).
+    HLL tidak bisa menghapus: order yang dihapus tetap terhitung sampai full load berikutnya.
+    """
+    if fact_delta.empty or not has_sketches(dw_engine):
+        return True
+    try:
+        categories = read_sql_streaming(f"SELECT product_key, category_name FROM {_qualified('dim_product')}",
+                                        dw_engine).set_index('product_key')['category_name']
+        countries = read_sql_streaming(f"SELECT customer_key, country FROM {_qualified('dim_customer')}",
+                                       dw_engine).set_index('customer_key')['country']
+        delta = build_sketches(sketch_inputs(fact_delta, categories, countries), precision)
+        with dw_engine.begin() as connection:
+            connection.execute(text(f"""
+                INSERT INTO {_qualified(SKETCH_TABLE)} AS s ({", ".join(SKETCH_COLUMNS)})
+                VALUES (:metric, :month_start, :category_name, :country, :reg_idx, :reg_val)
+                ON CONFLICT (metric, month_start, category_name, country, reg_idx) DO UPDATE
+                SET reg_val = GREATEST(s.reg_val, EXCLUDED.reg_val)
+            """), [
+                {**row, 'month_start': row['month_start'].date(),
+                 'reg_idx': int(row['reg_idx']), 'reg_val': int(row['reg_val'])}
+                for row in delta.to_dict('records')
+            ])
+        print(f"✅ {SKETCH_TABLE}: {len(delta)} register delta digabung.")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL menggabung delta {SKETCH_TABLE}. Error: {e}")
+        return False
@@ -0,0 +1,578 @@
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+import kpi_queries
+from chart_prep import format_currency, format_percent
+from dw_schema import ALL_CATEGORIES, INSIGHTS_TABLE
+from stream_read import read_sql_streaming
+
+# Mesin insight berbasis aturan. Data diambil dari dataset yang sudah
+# teragregasi (agg_sales_monthly, ringkasan per negara/pelanggan/produk),
+# setiap dataset disiapkan sekali (kolom turunan vektor), lalu semua aturan
+# dataset tersebut hanya berupa mask + template pesan di atas frame yang sama.
+
+Z_THRESHOLD = float(os.getenv("INSIGHT_Z_THRESHOLD", "2.0"))
+MOM_THRESHOLD_PCT = float(os.getenv("INSIGHT_MOM_PCT", "30"))
+YOY_THRESHOLD_PCT = float(os.getenv("INSIGHT_YOY_PCT", "20"))
+SHARE_SHIFT_PP = float(os.getenv("INSIGHT_SHARE_SHIFT_PP", "5"))
+CONCENTRATION_PCT = float(os.getenv("INSIGHT_CONCENTRATION_PCT", "30"))
+TOP_MOVERS = int(os.getenv("INSIGHT_TOP_MOVERS", "3"))
+# Filter yang dihitung batch setelah ETL: 'single' = semua + tiap kategori, 'all' = semua subset.
+BATCH_FILTERS = os.getenv("INSIGHT_BATCH_FILTERS", "single")
+# Batch CDC menghitung ulang insight satu tahun paling sering sekali per interval ini (detik).
+CDC_REFRESH_INTERVAL_S = int(os.getenv("INSIGHT_CDC_INTERVAL_S", "3600"))
+
+TOTAL_LABEL = 'Semua Kategori'
+SEVERITY_ORDER = {'error': 0, 'warning': 1, 'success': 2, 'info': 3}
+INSIGHT_COLUMNS = ['rule', 'dataset', 'severity', 'subject', 'message', 'value', 'score']
+SEGMENT_RANK = {'Lost': 0, 'At Risk': 1, 'New Customers': 2, 'Potential': 3, 'Loyal Customers': 4, 'Champions': 5}
+METRIC_LABELS = {'revenue': 'Revenue', 'orders': 'Order', 'quantity': 'Unit terjual'}
+
+# Dataset sumber (kpi_queries) -> frame yang disiapkan darinya.
+SOURCE_KPIS = {
+    'monthly': 'insight_monthly',
+    'country': 'insight_country',
+    'rfm_shift': 'insight_rfm_shift',
+    'stock': 'insight_stock',
+}
+
+
+class InsightRule:
+    """
+    Aturan insight untuk satu frame hasil prepare (mirip validate.Rule).
+    when(df) -> mask boolean baris yang memicu insight; message(df) -> teks
+    per baris (Series, dihitung hanya untuk baris yang lolos); value(df) ->
+    angka yang ditampilkan, score(df) -> bobot untuk mengurutkan.
+    """
+
+    def __init__(self, frame: str, name: str, severity: str, when: Callable,
+                 message: Callable, value: Callable, score: Optional[Callable] = None):
+        self.frame = frame
+        self.name = name
+        self.severity = severity
+        self.when = when
+        self.message = message
+        self.value = value
+        self.score = score or (lambda df: value(df).abs())
+
+
+# ------------------------------------------
+# Prepare: satu pass vektor per dataset
+# ------------------------------------------
+
+def _pct_change(current: pd.Series, previous: pd.Series) -> pd.Series:
+    return (current - previous) / previous.where(previous > 0) * 100
+
+
+def prepare_monthly(df: pd.DataFrame, year: int) -> Dict[str, pd.DataFrame]:
+    """Seri bulanan per kategori -> frame 'monthly' (kategori x bulan) dan 'category_year'."""
+    if df.empty:
+        return {'monthly': pd.DataFrame(), 'category_year': pd.DataFrame()}
+    df = df.assign(month_start=pd.to_datetime(df['month_start']))
+    metrics = list(METRIC_LABELS)
+    if (df['category_name'] == ALL_CATEGORIES).any():
+        df = df.assign(category_name=df['category_name'].replace(ALL_CATEGORIES, TOTAL_LABEL))
+    elif df['category_name'].nunique() > 1:
+        # Dengan filter kategori total dijumlah dari seri terpilih (seperti _series_filter).
+        total = df.groupby('month_start', as_index=False)[metrics].sum().assign(category_name=TOTAL_LABEL)
+        df = pd.concat([df, total], ignore_index=True)
+    df = df.sort_values(['category_name', 'month_start'], ignore_index=True)
+
+    by_cat = df.groupby('category_name', sort=False)
+    previous_year = df[['category_name', 'month_start', *metrics]].assign(
+        month_start=df['month_start'] + pd.DateOffset(years=1))
+    df = df.merge(previous_year, on=['category_name', 'month_start'], how='left', suffixes=('', '_py'))
+    for metric in metrics:
+        df[f'{metric}_prev'] = by_cat[metric].shift(1)
+        df[f'{metric}_mom_pct'] = _pct_change(df[metric], df[f'{metric}_prev'])
+        df[f'{metric}_yoy_pct'] = _pct_change(df[metric], df[f'{metric}_py'])
+    df['revenue_max_2y'] = by_cat['revenue'].transform('max')
+
+    monthly = df[df['month_start'].dt.year == year].reset_index(drop=True)
+    if monthly.empty:
+        return {'monthly': monthly, 'category_year': pd.DataFrame()}
+    by_cat = monthly.groupby('category_name', sort=False)
+    for metric in metrics:
+        std = by_cat[metric].transform('std')
+        monthly[f'{metric}_z'] = (monthly[metric] - by_cat[metric].transform('mean')) / std.where(std > 0)
+    monthly['category_revenue_year'] = by_cat['revenue'].transform('sum')
+    monthly['month_label'] = monthly['month_start'].dt.strftime('%b %Y')
+    monthly['subject'] = monthly['category_name'] + ' ' + monthly['month_label']
+
+    annual = df.assign(year=df['month_start'].dt.year).pivot_table(
+        index='category_name', columns='year', values='revenue', aggfunc='sum', fill_value=0)
+    category_year = pd.DataFrame({
+        'category_name': annual.index,
+        'revenue': annual.get(year, 0),
+        'revenue_prev': annual.get(year - 1, 0),
+    }).reset_index(drop=True)
+    category_year['yoy_pct'] = _pct_change(category_year['revenue'], category_year['revenue_prev'])
+    is_total = category_year['category_name'] == TOTAL_LABEL
+    parts = category_year[~is_total]
+    category_year['share'] = category_year['revenue'] / parts['revenue'].sum() * 100
+    category_year['share_prev'] = category_year['revenue_prev'] / parts['revenue_prev'].sum() * 100
+    category_year['share_shift_pp'] = category_year['share'] - category_year['share_prev']
+    category_year['is_total'] = is_total
+    growth = category_year['yoy_pct'].where(~is_total)
+    category_year['grow_rank'] = growth.rank(ascending=False, method='first')
+    category_year['decline_rank'] = growth.rank(ascending=True, method='first')
+    category_year['subject'] = category_year['category_name']
+    return {'monthly': monthly, 'category_year': category_year}
+
+
+def prepare_country(df: pd.DataFrame, year: int) -> Dict[str, pd.DataFrame]:
+    if df.empty:
+        return {'country': df}
+    df = df.assign(change=df['revenue'] - df['revenue_prev'])
+    df['change_pct'] = _pct_change(df['revenue'], df['revenue_prev'])
+    df['share'] = df['revenue'] / df['revenue'].sum() * 100 if df['revenue'].sum() else 0.0
+    df['grow_rank'] = df['change'].where(df['change'] > 0).rank(ascending=False, method='first')
+    df['decline_rank'] = df['change'].where(df['change'] < 0).rank(ascending=True, method='first')
+    df['subject'] = df['country']
+    return {'country': df.reset_index(drop=True)}
+
+
+def prepare_rfm_shift(df: pd.DataFrame, year: int) -> Dict[str, pd.DataFrame]:
+    """Per pelanggan -> per transisi segmen (tahun lalu -> tahun ini) dengan jumlah & contoh."""
+    if df.empty:
+        return {'rfm_transition': df}
+    df = df.assign(segment=df['segment'].fillna('-'), segment_prev=df['segment_prev'].fillna('-'))
+    df = df.sort_values('monetary_prev', ascending=False)
+    transitions = df.groupby(['segment_prev', 'segment'], as_index=False, sort=False).agg(
+        customers=('customer_name', 'size'),
+        monetary=('monetary', 'sum'),
+        monetary_prev=('monetary_prev', 'sum'),
+        examples=('customer_name', lambda names: ', '.join(names.head(3))),
+    )
+    transitions['rank'] = transitions['segment'].map(SEGMENT_RANK)
+    transitions['rank_prev'] = transitions['segment_prev'].map(SEGMENT_RANK)
+    transitions['moved'] = transitions['segment'] != transitions['segment_prev']
+    transitions['subject'] = transitions['segment_prev'] + ' → ' + transitions['segment']
+    return {'rfm_transition': transitions}
+
+
+def prepare_stock(df: pd.DataFrame, year: int) -> Dict[str, pd.DataFrame]:
+    if df.empty:
+        return {'stock': df}
+    df = df.assign(discontinued=df['discontinued'].fillna(False).astype(bool))
+    for col in ('units_in_stock', 'units_on_order', 'reorder_level', 'sold_year'):
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    monthly_demand = df['sold_year'] / 12
+    df['months_cover'] = df['units_in_stock'] / monthly_demand.where(monthly_demand > 0)
+    df['active'] = ~df['discontinued']
+    df['below_reorder'] = df['active'] & (df['reorder_level'] > 0) & (df['units_in_stock'] <= df['reorder_level'])
+    df['subject'] = df['product_name']
+    return {'stock': df.reset_index(drop=True)}
+
+
+PREPARERS = {
+    'monthly': prepare_monthly,
+    'country': prepare_country,
+    'rfm_shift': prepare_rfm_shift,
+    'stock': prepare_stock,
+}
+
+
+# ------------------------------------------
+# Aturan
+# ------------------------------------------
+
+def _fmt_metric(metric: str, values: pd.Series) -> pd.Series:
+    if metric == 'revenue':
+        return format_currency(values)
+    return values.round().astype('Int64').astype(str)
+
+
+def _monthly_rules(metric: str) -> List[InsightRule]:
+    label = METRIC_LABELS[metric]
+    z, mom, yoy, prev = f'{metric}_z', f'{metric}_mom_pct', f'{metric}_yoy_pct', f'{metric}_prev'
+
+    def describe(suffix: str) -> Callable:
+        return lambda df: df['subject'] + f': {label} ' + _fmt_metric(metric, df[metric]) + suffix(df)
+
+    return [
+        InsightRule('monthly', f'{metric}_anomaly_high', 'success',
+                    lambda df: df[z] > Z_THRESHOLD,
+                    describe(lambda df: ' jauh di atas rata-rata bulanan (z=' + format_percent(df[z], '%.1f') + ')'),
+                    lambda df: df[z]),
+        InsightRule('monthly', f'{metric}_anomaly_low', 'warning',
+                    lambda df: df[z] < -Z_THRESHOLD,
+                    describe(lambda df: ' jauh di bawah rata-rata bulanan (z=' + format_percent(df[z], '%.1f') + ')'),
+                    lambda df: df[z]),
+        InsightRule('monthly', f'{metric}_mom_drop', 'warning',
+                    lambda df: (df[mom] < -MOM_THRESHOLD_PCT) & (df[prev] > 0),
+                    describe(lambda df: ', turun ' + format_percent(-df[mom], '%.0f%%') + ' dari bulan sebelumnya'),
+                    lambda df: df[mom], lambda df: df[mom].abs() / 100),
+        InsightRule('monthly', f'{metric}_mom_jump', 'success',
+                    lambda df: df[mom] > MOM_THRESHOLD_PCT,
+                    describe(lambda df: ', naik ' + format_percent(df[mom], '%.0f%%') + ' dari bulan sebelumnya'),
+                    lambda df: df[mom], lambda df: df[mom].abs() / 100),
+        InsightRule('monthly', f'{metric}_yoy_drop', 'warning',
+                    lambda df: df[yoy] < -YOY_THRESHOLD_PCT,
+                    describe(lambda df: ', turun ' + format_percent(-df[yoy], '%.0f%%') + ' dari bulan yang sama tahun lalu'),
+                    lambda df: df[yoy], lambda df: df[yoy].abs() / 100),
+        InsightRule('monthly', f'{metric}_yoy_growth', 'success',
+                    lambda df: df[yoy] > YOY_THRESHOLD_PCT,
+                    describe(lambda df: ', naik ' + format_percent(df[yoy], '%.0f%%') + ' dari bulan yang sama tahun lalu'),
+                    lambda df: df[yoy], lambda df: df[yoy].abs() / 100),
+    ]
+
+
+def _change_score(df: pd.DataFrame) -> pd.Series:
+    return df['change'].abs() / (df['revenue'] + df['revenue_prev']).clip(lower=1)
+
+
+def _customer_score(df: pd.DataFrame) -> pd.Series:
+    # ~10 pelanggan setara bobot satu anomali kuat.
+    return df['customers'] / 10
+
+
+def _top_label(rank_col: str) -> Callable:
+    return lambda df: ' (#' + df[rank_col].astype('Int64').astype(str) + ')'
+
+
+RULES: List[InsightRule] = [
+    *itertools.chain.from_iterable(_monthly_rules(metric) for metric in METRIC_LABELS),
+    InsightRule('monthly', 'revenue_record_month', 'success',
+                lambda df: (df['revenue'] > 0) & (df['revenue'] >= df['revenue_max_2y']),
+                lambda df: df['subject'] + ': revenue tertinggi dalam dua tahun (' + format_currency(df['revenue']) + ')',
+                lambda df: df['revenue'], lambda df: pd.Series(1.0, index=df.index)),
+    InsightRule('monthly', 'revenue_zero_month', 'error',
+                lambda df: (df['revenue'] <= 0) & (df['category_revenue_year'] > 0),
+                lambda df: df['subject'] + ': tidak ada penjualan sama sekali',
+                lambda df: df['revenue'], lambda df: pd.Series(2.0, index=df.index)),
+
+    InsightRule('category_year', 'category_top_grower', 'success',
+                lambda df: (df['grow_rank'] <= TOP_MOVERS) & (df['yoy_pct'] > 0),
+                lambda df: 'Kategori ' + df['subject'] + _top_label('grow_rank')(df) + ' tumbuh '
+                + format_percent(df['yoy_pct'], '%.1f%%') + ' YoY menjadi ' + format_currency(df['revenue']),
+                lambda df: df['yoy_pct'], lambda df: df['yoy_pct'].abs() / 100),
+    InsightRule('category_year', 'category_top_decliner', 'warning',
+                lambda df: (df['decline_rank'] <= TOP_MOVERS) & (df['yoy_pct'] < 0),
+                lambda df: 'Kategori ' + df['subject'] + _top_label('decline_rank')(df) + ' turun '
+                + format_percent(-df['yoy_pct'], '%.1f%%') + ' YoY menjadi ' + format_currency(df['revenue']),
+                lambda df: df['yoy_pct'], lambda df: df['yoy_pct'].abs() / 100),
+    InsightRule('category_year', 'category_share_gain', 'info',
+                lambda df: ~df['is_total'] & (df['share_shift_pp'] > SHARE_SHIFT_PP),
+                lambda df: 'Porsi revenue ' + df['subject'] + ' naik ' + format_percent(df['share_shift_pp'], '%.1f')
+                + ' poin menjadi ' + format_percent(df['share']),
+                lambda df: df['share_shift_pp'], lambda df: df['share_shift_pp'].abs() / 10),
+    InsightRule('category_year', 'category_share_loss', 'warning',
+                lambda df: ~df['is_total'] & (df['share_shift_pp'] < -SHARE_SHIFT_PP),
+                lambda df: 'Porsi revenue ' + df['subject'] + ' turun ' + format_percent(-df['share_shift_pp'], '%.1f')
+                + ' poin menjadi ' + format_percent(df['share']),
+                lambda df: df['share_shift_pp'], lambda df: df['share_shift_pp'].abs() / 10),
+    InsightRule('category_year', 'total_yoy_growth', 'success',
+                lambda df: df['is_total'] & (df['yoy_pct'] > 0),
+                lambda df: 'Total revenue naik ' + format_percent(df['yoy_pct'], '%.1f%%') + ' YoY ('
+                + format_currency(df['revenue_prev']) + ' → ' + format_currency(df['revenue']) + ')',
+                lambda df: df['yoy_pct'], lambda df: df['yoy_pct'].abs() / 100 + 1),
+    InsightRule('category_year', 'total_yoy_decline', 'error',
+                lambda df: df['is_total'] & (df['yoy_pct'] < 0),
+                lambda df: 'Total revenue turun ' + format_percent(-df['yoy_pct'], '%.1f%%') + ' YoY ('
+                + format_currency(df['revenue_prev']) + ' → ' + format_currency(df['revenue']) + ')',
+                lambda df: df['yoy_pct'], lambda df: df['yoy_pct'].abs() / 100 + 1),
+
+    InsightRule('country', 'country_top_grower', 'success',
+                lambda df: df['grow_rank'] <= TOP_MOVERS,
+                lambda df: df['subject'] + _top_label('grow_rank')(df) + ': revenue bertambah '
+                + format_currency(df['change']) + ' dari tahun lalu',
+                lambda df: df['change'], _change_score),
+    InsightRule('country', 'country_top_decliner', 'warning',
+                lambda df: df['decline_rank'] <= TOP_MOVERS,
+                lambda df: df['subject'] + _top_label('decline_rank')(df) + ': revenue berkurang '
+                + format_currency(-df['change']) + ' dari tahun lalu',
+                lambda df: df['change'], _change_score),
+    InsightRule('country', 'country_new_market', 'success',
+                lambda df: (df['revenue_prev'] <= 0) & (df['revenue'] > 0),
+                lambda df: df['subject'] + ': pasar baru tahun ini (' + format_currency(df['revenue']) + ', '
+                + df['customers'].astype(str) + ' pelanggan)',
+                lambda df: df['revenue'], _change_score),
+    InsightRule('country', 'country_lost_market', 'error',
+                lambda df: (df['revenue_prev'] > 0) & (df['revenue'] <= 0),
+                lambda df: df['subject'] + ': tidak ada penjualan tahun ini (tahun lalu '
+                + format_currency(df['revenue_prev']) + ')',
+                lambda df: df['revenue_prev'], _change_score),
+    InsightRule('country', 'country_concentration', 'info',
+                lambda df: df['share'] > CONCENTRATION_PCT,
+                lambda df: df['subject'] + ' menyumbang ' + format_percent(df['share']) + ' revenue: risiko konsentrasi',
+                lambda df: df['share'], lambda df: df['share'] / 100),
+
+    InsightRule('rfm_transition', 'rfm_new_champions', 'success',
+                lambda df: (df['segment'] == 'Champions') & df['moved'],
+                lambda df: df['customers'].astype(str) + ' pelanggan naik ke Champions dari ' + df['segment_prev']
+                + ' (mis. ' + df['examples'] + ')',
+                lambda df: df['customers'], _customer_score),
+    InsightRule('rfm_transition', 'rfm_champions_slipping', 'warning',
+                lambda df: (df['segment_prev'] == 'Champions') & df['moved'] & (df['segment'] != '-'),
+                lambda df: df['customers'].astype(str) + ' Champions tahun lalu kini ' + df['segment']
+                + ' (mis. ' + df['examples'] + ')',
+                lambda df: df['customers'], _customer_score),
+    InsightRule('rfm_transition', 'rfm_slipped_to_at_risk', 'error',
+                lambda df: (df['segment'] == 'At Risk') & df['segment_prev'].isin(['Champions', 'Loyal Customers']),
+                lambda df: df['customers'].astype(str) + ' pelanggan ' + df['segment_prev'] + ' kini At Risk ('
+                + format_currency(df['monetary_prev']) + ' belanja tahun lalu; mis. ' + df['examples'] + ')',
+                lambda df: df['customers'], _customer_score),
+    InsightRule('rfm_transition', 'rfm_churned_to_lost', 'error',
+                lambda df: (df['segment'] == 'Lost') & df['moved'] & (df['segment_prev'] != '-'),
+                lambda df: df['customers'].astype(str) + ' pelanggan ' + df['segment_prev'] + ' kini Lost (mis. '
+                + df['examples'] + ')',
+                lambda df: df['customers'], _customer_score),
+    InsightRule('rfm_transition', 'rfm_won_back', 'success',
+                lambda df: df['segment_prev'].isin(['At Risk', 'Lost']) & (df['rank'] >= SEGMENT_RANK['Potential']),
+                lambda df: df['customers'].astype(str) + ' pelanggan ' + df['segment_prev'] + ' kembali aktif sebagai '
+                + df['segment'] + ' (mis. ' + df['examples'] + ')',
+                lambda df: df['customers'], _customer_score),
+    InsightRule('rfm_transition', 'rfm_inactive_this_year', 'warning',
+                lambda df: (df['segment'] == '-') & (df['segment_prev'] != '-'),
+                lambda df: df['customers'].astype(str) + ' pelanggan ' + df['segment_prev']
+                + ' tahun lalu tidak belanja tahun ini (' + format_currency(df['monetary_prev']) + '; mis. '
+                + df['examples'] + ')',
+                lambda df: df['customers'], _customer_score),
+    InsightRule('rfm_transition', 'rfm_first_year_customers', 'info',
+                lambda df: (df['segment_prev'] == '-') & (df['segment'] != '-'),
+                lambda df: df['customers'].astype(str) + ' pelanggan tanpa pembelian tahun lalu kini ' + df['segment']
+                + ' (' + format_currency(df['monetary']) + ')',
+                lambda df: df['customers'], _customer_score),
+
+    InsightRule('stock', 'stock_out', 'error',
+                lambda df: df['active'] & (df['units_in_stock'] <= 0),
+                lambda df: df['subject'] + ' (' + df['category_name'] + '): stok habis, '
+                + df['units_on_order'].astype('int64').astype(str) + ' unit dalam pemesanan',
+                lambda df: df['units_in_stock'], lambda df: pd.Series(1.5, index=df.index)),
+    InsightRule('stock', 'stock_below_reorder_no_incoming', 'error',
+                lambda df: df['below_reorder'] & (df['units_in_stock'] > 0) & (df['units_on_order'] <= 0),
+                lambda df: df['subject'] + ': stok ' + df['units_in_stock'].astype('int64').astype(str)
+                + ' ≤ reorder level ' + df['reorder_level'].astype('int64').astype(str) + ' dan belum dipesan ulang',
+                lambda df: df['units_in_stock'], lambda df: pd.Series(1.2, index=df.index)),
+    InsightRule('stock', 'stock_below_reorder', 'warning',
+                lambda df: df['below_reorder'] & (df['units_in_stock'] > 0) & (df['units_on_order'] > 0),
+                lambda df: df['subject'] + ': stok ' + df['units_in_stock'].astype('int64').astype(str)
+                + ' ≤ reorder level ' + df['reorder_level'].astype('int64').astype(str) + ', '
+                + df['units_on_order'].astype('int64').astype(str) + ' unit sedang dipesan',
+                lambda df: df['units_in_stock'], lambda df: pd.Series(1.0, index=df.index)),
+    InsightRule('stock', 'stock_low_cover', 'warning',
+                lambda df: df['active'] & ~df['below_reorder'] & (df['months_cover'] < 1),
+                lambda df: df['subject'] + ': stok hanya cukup ~' + format_percent(df['months_cover'], '%.1f')
+                + ' bulan pada laju penjualan tahun ini',
+                lambda df: df['months_cover'], lambda df: 1 / df['months_cover'].clip(lower=0.01)),
+    InsightRule('stock', 'stock_discontinued_remaining', 'info',
+                lambda df: df['discontinued'] & (df['units_in_stock'] > 0),
+                lambda df: df['subject'] + ' sudah discontinued, sisa stok '
+                + df['units_in_stock'].astype('int64').astype(str) + ' unit',
+                lambda df: df['units_in_stock'], lambda df: pd.Series(0.5, index=df.index)),
+]
+
+
+def evaluate_rules(frames: Dict[str, pd.DataFrame], rules: List[InsightRule] = RULES) -> pd.DataFrame:
+    """Semua aturan atas frame yang sudah disiapkan -> satu tabel insight terurut."""
+    results = []
+    for rule in rules:
+        df = frames.get(rule.frame)
+        if df is None or df.empty:
+            continue
+        mask = rule.when(df).fillna(False).to_numpy(dtype=bool)
+        if not mask.any():
+            continue
+        hits = df[mask]
+        results.append(pd.DataFrame({
+            'rule': rule.name,
+            'dataset': rule.frame,
+            'severity': rule.severity,
+            'subject': hits['subject'].astype(str).to_numpy(),
+            'message': rule.message(hits).to_numpy(),
+            'value': pd.to_numeric(rule.value(hits), errors='coerce').astype(float).to_numpy(),
+            'score': pd.to_numeric(rule.score(hits), errors='coerce').astype(float).to_numpy(),
+        }))
+    if not results:
+        return pd.DataFrame(columns=INSIGHT_COLUMNS)
+    insights = pd.concat(results, ignore_index=True)
+    order = insights['severity'].map(SEVERITY_ORDER)
+    return (insights.assign(_order=order)
+            .sort_values(['_order', 'score'], ascending=[True, False], na_position='last')
+            .drop(columns='_order').reset_index(drop=True))
+
+
+def compute_insights(sources: Dict[str, pd.DataFrame], year: int,
+                     rules: List[InsightRule] = RULES) -> pd.DataFrame:
+    """Dataset sumber (SOURCE_KPIS) -> insight; tanpa akses database."""
+    frames = {}
+    for name, df in sources.items():
+        frames.update(PREPARERS[name](df, int(year)))
+    return evaluate_rules(frames, rules)
+
+
+def fetch_sources(engine: Engine, year: int, category_sql: str = "") -> Dict[str, pd.DataFrame]:
+    with ThreadPoolExecutor(max_workers=len(SOURCE_KPIS), thread_name_prefix='insight-fetch') as pool:
+        futures = {name: pool.submit(kpi_queries.fetch_kpi, engine, kpi_type, year, category_sql)
+                   for name, kpi_type in SOURCE_KPIS.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def generate_insights(engine: Engine, year: int, categories: Iterable[str] = (),
+                      all_categories: Iterable[str] = ()) -> pd.DataFrame:
+    # Semua kategori -> tanpa filter (seri '*'), sama seperti filter_key.
+    category_sql = kpi_queries.create_category_filter(sorted(categories), all_categories)
+    return compute_insights(fetch_sources(engine, year, category_sql), year)
+
+
+def filter_key(categories: Iterable[str], all_categories: Iterable[str] = ()) -> str:
+    """Key cache per set kategori; semua kategori (atau tanpa filter) -> '*'."""
+    selected = set(categories)
+    if not selected or (all_categories and selected >= set(all_categories)):
+        return ALL_CATEGORIES
+    return '|'.join(sorted(selected))
+
+
+# ------------------------------------------
+# Hasil batch di warehouse
+# ------------------------------------------
+
+def _ensure_insights_table(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {INSIGHTS_TABLE} (
+            year INT NOT NULL,
+            filter_key TEXT NOT NULL,
+            position INT NOT NULL,
+            rule TEXT NOT NULL,
+            dataset TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            subject TEXT,
+            message TEXT NOT NULL,
+            value DOUBLE PRECISION,
+            score DOUBLE PRECISION,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (year, filter_key, position)
+        )
+    """))
+
+
+def save_insights(engine: Engine, year: int, key: str, insights: pd.DataFrame):
+    """Ganti insight satu (tahun, filter) dalam satu transaksi."""
+    rows = [
+        {'year': int(year), 'filter_key': key, 'position': position, **{
+            col: (None if pd.isna(value) else value) for col, value in record.items()}}
+        for position, record in enumerate(insights[INSIGHT_COLUMNS].to_dict('records'))
+    ]
+    with engine.begin() as connection:
+        _ensure_insights_table(connection)
+        connection.execute(text(f"DELETE FROM {INSIGHTS_TABLE} WHERE year = :year AND filter_key = :key"),
+                           {'year': int(year), 'key': key})
+        if rows:
+            connection.execute(text(f"""
+                INSERT INTO {INSIGHTS_TABLE} (year, filter_key, position, {", ".join(INSIGHT_COLUMNS)})
+                VALUES (:year, :filter_key, :position, {", ".join(':' + col for col in INSIGHT_COLUMNS)})
+            """), rows)
+
+
+def read_insights(engine: Engine, year: int, key: str) -> Optional[pd.DataFrame]:
+    """Insight hasil batch, atau None jika belum pernah dihitung untuk filter ini."""
+    if not has_insights(engine):
+        return None
+    df = read_sql_streaming(
+        f"SELECT {', '.join(INSIGHT_COLUMNS)} FROM {INSIGHTS_TABLE} "
+        "WHERE year = :year AND filter_key = :key ORDER BY position",
+        engine, params={'year': int(year), 'key': key}
+    )
+    return df if not df.empty else None
+
+
+def has_insights(engine: Engine) -> bool:
+    with engine.connect() as connection:
+        return bool(connection.execute(text("SELECT to_regclass(:name) IS NOT NULL"),
+                                       {'name': INSIGHTS_TABLE}).scalar())
+
+
+def stale_insight_years(engine: Engine, years: Iterable[int],
+                        max_age_s: float = CDC_REFRESH_INTERVAL_S) -> set:
+    """Tahun yang insight-nya belum ada atau lebih tua dari max_age_s detik (untuk batch CDC)."""
+    years = {int(year) for year in years}
+    try:
+        if not years or not has_insights(engine):
+            return years
+        ages = read_sql_streaming(
+            f"SELECT year, EXTRACT(EPOCH FROM now() - MIN(computed_at)) AS age_s FROM {INSIGHTS_TABLE} "
+            "WHERE year = ANY(:years) GROUP BY year",
+            engine, params={'years': sorted(years)}
+        )
+    except Exception as e:
+        print(f"⚠️ Umur {INSIGHTS_TABLE} tidak terbaca, semua tahun dihitung ulang. Error: {e}")
+        return years
+    fresh = set(ages.loc[ages['age_s'].astype(float) < max_age_s, 'year'].astype(int).tolist())
+    return years - fresh
+
+
+def get_insights(engine: Engine, year: int, categories: Iterable[str] = (),
+                 all_categories: Iterable[str] = ()) -> pd.DataFrame:
+    """Insight untuk filter dashboard: hasil batch jika ada, jika tidak dihitung langsung."""
+    stored = read_insights(engine, year, filter_key(categories, all_categories))
+    return stored if stored is not None else generate_insights(engine, year, categories, all_categories)
+
+
+def batch_filters(categories: List[str], mode: str = BATCH_FILTERS) -> List[tuple]:
+    """Kombinasi kategori yang dihitung batch ('single' atau 'all' subset)."""
+    if mode == 'all':
+        return [combo for size in range(1, len(categories) + 1)
+                for combo in itertools.combinations(sorted(categories), size)]
+    return [tuple(sorted(categories))] + [(category,) for category in sorted(categories)]
+
+
+def refresh_insights(engine: Engine, years: Optional[Iterable[int]] = None, mode: str = BATCH_FILTERS) -> bool:
+    """Batch setelah ETL: hitung & simpan insight untuk setiap tahun x filter kategori."""
+    print(f"--- 🚀 Refresh {INSIGHTS_TABLE} ---")
+    start = time.perf_counter()
+    try:
+        available = read_sql_streaming(
+            "SELECT DISTINCT dd.year FROM fact_sales fs JOIN dim_date dd ON fs.date_key = dd.date_key", engine
+        )['year'].astype(int).tolist()
+        years = sorted(set(available) & {int(y) for y in years}) if years is not None else sorted(available)
+        categories = read_sql_streaming("SELECT DISTINCT category_name FROM dim_product", engine)[
+            'category_name'].dropna().astype(str).tolist()
+        filters = batch_filters(categories, mode)
+        total = 0
+        for year in years:
+            for combo in filters:
+                insights = generate_insights(engine, year, combo, categories)
+                save_insights(engine, year, filter_key(combo, categories), insights)
+                total += len(insights)
+        print(f"✅ {INSIGHTS_TABLE}: {total} insight untuk {len(years)} tahun x {len(filters)} filter "
+              f"({time.perf_counter() - start:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL refresh {INSIGHTS_TABLE}. Error: {e}")
+        return False
+
+
+def main(argv: Optional[list] = None):
+    from db_connection import get_dw_engine
+
+    parser = argparse.ArgumentParser(description="Insight otomatis berbasis aturan")
+    parser.add_argument('--year', type=int, help="Tampilkan insight satu tahun")
+    parser.add_argument('--categories', default='', help="Daftar kategori dipisah koma")
+    parser.add_argument('--batch', action='store_true', help="Hitung & simpan semua tahun x filter")
+    parser.add_argument('--filters', choices=['single', 'all'], default=BATCH_FILTERS)
+    args = parser.parse_args(argv)
+
+    engine = get_dw_engine()
+    if engine is None:
+        raise SystemExit("❌ Konfigurasi database di file .env tidak lengkap.")
+    if args.batch:
+        refresh_insights(engine, [args.year] if args.year else None, args.filters)
+        return
+    if args.year is None:
+        parser.error("--year wajib tanpa --batch")
+    insights = generate_insights(engine, args.year, [c for c in args.categories.split(',') if c])
+    with pd.option_context('display.max_colwidth', 120, 'display.width', 200):
+        print(insights[['severity', 'rule', 'message']].to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+import pandas as pd
+
+STATE_DIR = os.getenv("ETL_STATE_DIR", ".etl_state")
+KEY_CACHE_PATH = os.path.join(STATE_DIR, 'dim_keys.sqlite')
+# SQLite dibaca lewat memory-mapped I/O; halaman yang sering dipakai tetap di page cache OS.
+KEY_CACHE_MMAP_BYTES = int(os.getenv("ETL_KEY_CACHE_MMAP_BYTES", str(256 * 1024 ** 2)))
+
+DIMENSIONS = ('customer', 'product', 'employee', 'shipper')
+
+
+class DimensionKeyCache:
+    """
+    Cache persisten business key -> surrogate key per dimensi (SQLite lokal,
+    memory-mapped). Peta satu dimensi baru dibaca saat pertama dipakai, lalu
+    disimpan di memori; key baru ditambahkan secara incremental (hanya baris
+    baru yang ditulis), sehingga surrogate key stabil antar run.
+    """
+
+    def __init__(self, path: str = KEY_CACHE_PATH):
+        self.path = path
+        self._maps: Dict[str, pd.Series] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(f"PRAGMA mmap_size = {KEY_CACHE_MMAP_BYTES}")
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            # business_key tanpa tipe: int tetap int, string tetap string.
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS dim_keys (
+                    dimension TEXT NOT NULL,
+                    business_key NOT NULL,
+                    surrogate_key INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, business_key)
+                )
+            """)
+        return self._conn
+
+    def lookup(self, dimension: str) -> pd.Series:
+        """Series business key -> surrogate key (dimuat lazily)."""
+        with self._lock:
+            if dimension not in self._maps:
+                rows = self._connection().execute(
+                    "SELECT business_key, surrogate_key FROM dim_keys WHERE dimension = ?",
+                    (dimension,)
+                ).fetchall()
+                keys = pd.Series(
+                    [row[1] for row in rows],
+                    index=pd.Index([row[0] for row in rows]),
+                    dtype='int64'
+                )
+                self._maps[dimension] = keys
+            return self._maps[dimension]
+
+    def key_maps(self) -> Dict[str, pd.Series]:
+        return {dimension: self.lookup(dimension) for dimension in DIMENSIONS}
+
+    def _write(self, dimension: str, new_keys: pd.Series, replace: bool = False):
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                f"{verb} INTO dim_keys (dimension, business_key, surrogate_key) VALUES (?, ?, ?)",
+                ((dimension, _to_python(bk), int(sk)) for bk, sk in new_keys.items())
+            )
+
+    def assign(self, dimension: str, business_keys: pd.Series) -> pd.Series:
+        """
+        Surrogate key untuk setiap business key; key yang belum dikenal
+        mendapat nomor berikutnya dan langsung dipersist.
+        """
+        known = self.lookup(dimension)
+        unique_keys = pd.Index(business_keys.dropna().unique())
+        missing = unique_keys.difference(known.index, sort=False)
+        if len(missing):
+            start = int(known.max()) + 1 if len(known) else 1
+            new_keys = pd.Series(range(start, start + len(missing)), index=missing, dtype='int64')
+            self._write(dimension, new_keys)
+            with self._lock:
+                self._maps[dimension] = pd.concat([known, new_keys])
+        return business_keys.map(self._maps[dimension])
+
+    def refresh_from(self, key_maps: Dict[str, pd.Series]):
+        """Samakan cache dengan peta key dari warehouse; hanya baris berbeda yang ditulis."""
+        for dimension, source in key_maps.items():
+            known = self.lookup(dimension)
+            aligned = known.reindex(source.index)
+            changed = source[aligned.isna() | (aligned != source)]
+            if changed.empty:
+                continue
+            self._write(dimension, changed, replace=True)
+            with self._lock:
+                merged = pd.concat([known.drop(changed.index, errors='ignore'), changed])
+                self._maps[dimension] = merged.astype('int64')
+
+    def invalidate(self):
+        """Lupakan peta di memori; dibaca ulang dari file saat dibutuhkan."""
+        with self._lock:
+            self._maps.clear()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _to_python(value):
+    # numpy scalar -> tipe Python supaya bisa diikat ke parameter SQLite.
+    return value.item() if hasattr(value, 'item') else value
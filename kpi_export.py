@@ -0,0 +1,274 @@
+import argparse
+import io
+import os
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pyarrow as pa
+from sqlalchemy.engine import Engine
+
+import kpi_queries
+from key_cache import STATE_DIR
+from stream_read import iter_chunks
+
+# Dataset KPI yang bisa diekspor (sama dengan query dashboard).
+EXPORT_KPIS = ('financial_trend', 'geo_performance', 'customer_clv', 'clv_predicted', 'rfm_segments', 'rfm_raw_data')
+EXPORT_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', '.arrows'),
+    'csv': ('text/csv', '.csv'),
+}
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+# Hasil ekspor disimpan di disk dan dipakai bersama semua peminta selama TTL
+# (sama dengan cache_data dashboard), jadi ekstrak berulang tidak ke warehouse.
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(STATE_DIR, 'exports'))
+EXPORT_CACHE_TTL_S = int(os.getenv("EXPORT_CACHE_TTL_S", "600"))
+# Alamat HTTP API ekspor seperti dilihat browser pengguna dashboard.
+EXPORT_PUBLIC_URL = os.getenv("EXPORT_PUBLIC_URL", "http://127.0.0.1:8502")
+
+# OID tipe PostgreSQL -> tipe Arrow; skema tetap dari deskripsi cursor, bukan dari isi chunk.
+PG_ARROW_TYPES = {
+    16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(), 26: pa.int64(),
+    700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(), 1114: pa.timestamp('us'), 1184: pa.timestamp('us', tz='UTC'),
+}
+
+
+def arrow_schema(description) -> pa.Schema:
+    return pa.schema([pa.field(col.name, PG_ARROW_TYPES.get(col.type_code, pa.string()))
+                      for col in description])
+
+
+def iter_record_batches(engine: Engine, query: str,
+                        chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pa.RecordBatch]:
+    """
+    Hasilkan RecordBatch per chunk_rows baris dari server-side cursor
+    (stream_read.iter_chunks); hasil penuh tidak pernah ada di memori sekaligus.
+    Hasil tanpa baris tetap menghasilkan satu batch kosong (skema dari cursor).
+    """
+    schema = None
+    for description, rows in iter_chunks(engine, query, fetch_size=chunk_rows):
+        if schema is None:
+            schema = arrow_schema(description)
+            if not rows:
+                yield pa.RecordBatch.from_pylist([], schema=schema)
+        if not rows:
+            continue
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema
+        )
+
+
+class _Drain(io.RawIOBase):
+    """Sink writer Arrow/Parquet; byte yang sudah ditulis diambil per chunk."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def _writer(fmt: str, sink, schema: pa.Schema):
+    # Writer Parquet/CSV diimpor saat file benar-benar ditulis (API/CLI), bukan saat
+    # dashboard hanya membaca daftar KPI & format untuk link ekspor.
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(sink, schema)
+    if fmt == 'arrow':
+        return pa.ipc.new_stream(sink, schema)
+    if fmt == 'csv':
+        import pyarrow.csv as pacsv
+        return pacsv.CSVWriter(sink, schema)
+    raise ValueError(f"Format ekspor tidak dikenal: {fmt}")
+
+
+def encode_batches(batches: Iterator[pa.RecordBatch], fmt: str) -> Iterator[bytes]:
+    """RecordBatch -> potongan byte file Parquet / Arrow IPC stream / CSV."""
+    sink = _Drain()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            # Writer dibuka pada batch pertama meski kosong: file selalu memuat skema.
+            writer = _writer(fmt, sink, batch.schema)
+        if batch.num_rows:
+            writer.write_batch(batch)
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+    if writer is None:
+        return
+    writer.close()
+    chunk = sink.take()
+    if chunk:
+        yield chunk
+
+
+def _cache_path(kpi_type: str, year: int, category_sql: str, fmt: str) -> str:
+    key = uuid.uuid5(uuid.NAMESPACE_URL, f"{kpi_type}|{year}|{category_sql}|{fmt}").hex
+    return os.path.join(EXPORT_CACHE_DIR, f"{kpi_type}-{year}-{key}{EXPORT_FORMATS[fmt][1]}")
+
+
+def _read_file(path: str, chunk_bytes: int = 1 << 20) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                return
+            yield chunk
+
+
+def export_kpi(engine: Engine, kpi_type: str, year: int, category_sql: str = "",
+               fmt: str = 'parquet', use_cache: bool = True) -> Iterator[bytes]:
+    """
+    Stream satu dataset KPI sebagai potongan byte. Hasil yang masih segar di
+    cache disk dikirim dari file; jika tidak, data di-stream dari cursor dan
+    sekaligus ditulis ke cache (file baru dipakai hanya jika stream selesai).
+    """
+    if kpi_type not in EXPORT_KPIS:
+        raise ValueError(f"KPI tidak bisa diekspor: {kpi_type}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format ekspor tidak dikenal: {fmt}")
+    query = kpi_queries.build_kpi_query(kpi_type, year, category_sql)
+
+    path = _cache_path(kpi_type, year, category_sql, fmt)
+    if use_cache and os.path.exists(path) and time.time() - os.path.getmtime(path) < EXPORT_CACHE_TTL_S:
+        yield from _read_file(path)
+        return
+
+    chunks = encode_batches(iter_record_batches(engine, query.strip().rstrip(';')), fmt)
+    if not use_cache:
+        yield from chunks
+        return
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def export_filename(kpi_type: str, year: int, fmt: str) -> str:
+    return f"{kpi_type}_{year}{EXPORT_FORMATS[fmt][1]}"
+
+
+def export_url(kpi_type: str, year: int, fmt: str, categories: List[str] = (),
+               base_url: str = EXPORT_PUBLIC_URL) -> str:
+    """URL HTTP API untuk satu ekspor (kategori kosong = semua kategori)."""
+    params = {'year': int(year), 'format': fmt}
+    if categories:
+        params['categories'] = ','.join(sorted(categories))
+    return f"{base_url.rstrip('/')}/export/{kpi_type}?{urlencode(params)}"
+
+
+# ==========================================
+# HTTP API: GET /export/<kpi>?year=1997&format=parquet&categories=A,B
+# ==========================================
+
+def _make_handler(engine: Engine):
+    class ExportHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip('/').split('/')
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if len(parts) != 2 or parts[0] != 'export':
+                return self.send_error(404, "Gunakan /export/<kpi>?year=YYYY&format=parquet|arrow|csv")
+            kpi_type, fmt = parts[1], params.get('format', 'parquet')
+            try:
+                year = int(params['year'])
+            except (KeyError, ValueError):
+                return self.send_error(400, "Parameter year wajib (angka)")
+            if kpi_type not in EXPORT_KPIS or fmt not in EXPORT_FORMATS:
+                return self.send_error(400, f"kpi: {', '.join(EXPORT_KPIS)}; format: {', '.join(EXPORT_FORMATS)}")
+            categories = [c for c in params.get('categories', '').split(',') if c]
+            category_sql = kpi_queries.create_category_filter(categories)
+
+            chunks = export_kpi(engine, kpi_type, year, category_sql, fmt)
+            try:
+                first = next(chunks, b'')
+            except Exception as e:
+                return self.send_error(500, f"Ekspor gagal: {e}")
+            self.send_response(200)
+            self.send_header('Content-Type', EXPORT_FORMATS[fmt][0])
+            self.send_header('Content-Disposition', f'attachment; filename="{export_filename(kpi_type, year, fmt)}"')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in ([first] if first else []):
+                self._write_chunk(chunk)
+            for chunk in chunks:
+                self._write_chunk(chunk)
+            self.wfile.write(b'0\r\n\r\n')
+
+        def _write_chunk(self, chunk: bytes):
+            self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b'\r\n')
+
+    return ExportHandler
+
+
+def serve(engine: Engine, host: str = '127.0.0.1', port: int = 8502):
+    server = ThreadingHTTPServer((host, port), _make_handler(engine))
+    print(f"📤 Export API di http://{host}:{port}/export/<kpi>?year=YYYY&format=parquet")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv: Optional[list] = None):
+    from db_connection import get_dw_engine
+
+    parser = argparse.ArgumentParser(description="Ekspor data KPI (Parquet / Arrow IPC / CSV)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    dump = sub.add_parser('dump', help="Tulis satu dataset ke file atau stdout")
+    dump.add_argument('kpi', choices=EXPORT_KPIS)
+    dump.add_argument('--year', type=int, required=True)
+    dump.add_argument('--format', choices=list(EXPORT_FORMATS), default='parquet')
+    dump.add_argument('--categories', default='', help="Daftar kategori dipisah koma")
+    dump.add_argument('-o', '--output', help="File tujuan (default stdout)")
+    api = sub.add_parser('serve', help="Jalankan HTTP export API")
+    # Default hanya loopback; expose ke jaringan harus eksplisit (EXPORT_HOST / --host).
+    api.add_argument('--host', default=os.getenv("EXPORT_HOST", "127.0.0.1"))
+    api.add_argument('--port', type=int, default=int(os.getenv("EXPORT_PORT", "8502")))
+    args = parser.parse_args(argv)
+
+    engine = get_dw_engine()
+    if engine is None:
+        sys.exit("❌ Konfigurasi database di file .env tidak lengkap.")
+    if args.command == 'serve':
+        serve(engine, args.host, args.port)
+        return
+    category_sql = kpi_queries.create_category_filter([c for c in args.categories.split(',') if c])
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_kpi(engine, args.kpi, args.year, category_sql, args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,591 @@
+import datetime
+
+import pandas as pd
+
+from dw_schema import (AFFINITY_TABLE, ALL_CATEGORIES, CLV_TABLE, EMPLOYEE_CLOSURE_TABLE, EMPLOYEE_MONTHLY_TABLE,
+                       FORECAST_TABLE, HLL_PRECISION, MONTHLY_AGG_TABLE, SHIPPER_MONTHLY_TABLE, SKETCH_TABLE,
+                       hll_alpha)
+from result_shaping import shape_query
+from stream_read import read_sql_streaming
+
+# Query KPI dashboard. Dipisah dari app.py supaya bisa dipakai tanpa
+# Streamlit (prefetch di background thread, ekspor, job batch).
+KPI_TYPES = (
+    'financial_trend', 'retention_rate', 'customer_clv', 'product_performance',
+    'category_performance', 'geo_performance', 'rfm_raw_data', 'rfm_segments',
+    'rolling_12m', 'yoy_monthly', 'qoq', 'agg_month_bounds',
+    'financial_trend_approx', 'active_customers_approx', 'geo_performance_approx',
+    'insight_monthly', 'insight_country', 'insight_rfm_shift', 'insight_stock',
+    'revenue_forecast', 'country_forecast', 'clv_predicted', 'product_affinity',
+    'employee_sales', 'shipper_freight',
+)
+
+
+def create_category_filter(selected_categories, all_categories=()):
+    """
+    Filter SQL kategori (alias dp). Semua kategori terpilih = tanpa filter,
+    sehingga agregat memakai seri '*' dan order tidak terhitung per kategori.
+    """
+    if all_categories and set(selected_categories) >= set(all_categories):
+        return ""
+    if selected_categories:
+        cats_formatted = "', '".join([c.replace("'", "''") for c in selected_categories])
+        return f" AND dp.category_name IN ('{cats_formatted}')"
+    return ""
+
+
+def _series_filter(category_sql):
+    """
+    Filter seri agregat bulanan (alias dp). Tanpa filter kategori dipakai
+    seri semua kategori; dengan filter, seri kategori terpilih dijumlah
+    (order yang memuat beberapa kategori terpilih terhitung per kategori).
+    """
+    if not category_sql.strip():
+        return f"dp.category_name = '{ALL_CATEGORIES}'"
+    return "TRUE" + category_sql
+
+
+def approx_distinct_query(metric, selected_year, category_sql="", group_cols=()):
+    """
+    Distinct count perkiraan dari sketch HLL (alias dp): register digabung
+    dengan MAX per reg_idx untuk filter apa pun, lalu diestimasi di server.
+    Hasil: group_cols + approx_count, paling banyak satu baris per grup.
+    """
+    m = 1 << HLL_PRECISION
+    groups = "".join(f"{col}, " for col in group_cols)
+    group_by = f"GROUP BY {', '.join(group_cols)}" if group_cols else ""
+    return f"""
+        WITH merged AS (
+            SELECT {groups}reg_idx, MAX(reg_val) AS reg_val
+            FROM {SKETCH_TABLE} dp
+            WHERE dp.metric = '{metric}'
+              AND dp.month_start BETWEEN make_date({int(selected_year)}, 1, 1) AND make_date({int(selected_year)}, 12, 1)
+              {category_sql}
+            GROUP BY {groups}reg_idx
+        ),
+        raw AS (
+            SELECT {groups}{hll_alpha(m)} * {m}.0 * {m} / (COALESCE(SUM(power(2.0, -reg_val)), 0) + {m} - COUNT(*)) AS raw_estimate,
+                   {m} - COUNT(*) AS zeros
+            FROM merged
+            {group_by}
+        )
+        SELECT {groups}ROUND(CASE WHEN raw_estimate <= {2.5 * m} AND zeros > 0
+                                  THEN {m} * ln({m}.0 / zeros) ELSE raw_estimate END) AS approx_count
+        FROM raw
+    """
+
+
+def build_kpi_query(kpi_type, selected_year, category_sql=""):
+    """SQL untuk satu jenis KPI, atau None jika jenisnya tidak dikenal."""
+    if kpi_type == 'financial_trend':
+        query = f"""
+        SELECT dd.year, dd.month, dd.month_name, 
+               SUM(fs.revenue) AS total_revenue, 
+               COUNT(DISTINCT fs.order_id) as total_orders
+        FROM fact_sales fs 
+        JOIN dim_date dd ON fs.date_key = dd.date_key 
+        JOIN dim_product dp ON fs.product_key = dp.product_key 
+        WHERE dd.year = {selected_year}
+        {category_sql} 
+        GROUP BY 1, 2, 3 
+        ORDER BY dd.year, dd.month;
+        """
+        
+    elif kpi_type == 'retention_rate':
+        query = f"""
+        WITH customer_monthly AS (
+            SELECT 
+                dd.year, 
+                dd.month,
+                fs.customer_key,
+                MIN(dd.full_date) as first_purchase_date
+            FROM fact_sales fs 
+            JOIN dim_date dd ON fs.date_key = dd.date_key 
+            JOIN dim_product dp ON fs.product_key = dp.product_key
+            WHERE dd.year IN ({selected_year}, {selected_year} - 1)
+            {category_sql}
+            GROUP BY 1, 2, 3
+        ),
+        customer_first_purchase AS (
+            SELECT 
+                customer_key,
+                MIN(first_purchase_date) as global_first_purchase
+            FROM customer_monthly
+            GROUP BY customer_key
+        ),
+        monthly_metrics AS (
+            SELECT 
+                cm.year,
+                cm.month,
+                COUNT(DISTINCT cm.customer_key) as end_customers,
+                COUNT(DISTINCT CASE 
+                    WHEN EXTRACT(YEAR FROM cfp.global_first_purchase) = cm.year 
+                         AND EXTRACT(MONTH FROM cfp.global_first_purchase) = cm.month 
+                    THEN cm.customer_key 
+                END) as new_customers
+            FROM customer_monthly cm
+            JOIN customer_first_purchase cfp ON cm.customer_key = cfp.customer_key
+            GROUP BY cm.year, cm.month
+        ),
+        retention_calc AS (
+            SELECT 
+                year,
+                month,
+                LAG(end_customers) OVER (ORDER BY year, month) as start_customers,
+                end_customers,
+                new_customers,
+                ROUND(
+                    100.0 * (end_customers - new_customers) / 
+                    NULLIF(LAG(end_customers) OVER (ORDER BY year, month), 0),
+                    2
+                ) as retention_rate,
+                ROUND(
+                    100.0 * (end_customers - LAG(end_customers) OVER (ORDER BY year, month)) / 
+                    NULLIF(LAG(end_customers) OVER (ORDER BY year, month), 0),
+                    2
+                ) as growth_rate,
+                ROUND(
+                    100.0 - (100.0 * (end_customers - new_customers) / 
+                    NULLIF(LAG(end_customers) OVER (ORDER BY year, month), 0)),
+                    2
+                ) as churn_rate
+            FROM monthly_metrics
+        )
+        SELECT * FROM retention_calc
+        WHERE year = {selected_year}
+        ORDER BY month;
+        """
+        
+    elif kpi_type == 'customer_clv':
+        query = f"""
+        SELECT dc.company_name, 
+               COUNT(DISTINCT fs.order_id) as frequency, 
+               SUM(fs.revenue) as monetary_value
+        FROM fact_sales fs 
+        JOIN dim_customer dc ON fs.customer_key = dc.customer_key 
+        JOIN dim_date dd ON fs.date_key = dd.date_key 
+        JOIN dim_product dp ON fs.product_key = dp.product_key
+        WHERE dd.year = {selected_year}
+        {category_sql} 
+        GROUP BY 1 
+        ORDER BY monetary_value DESC;
+        """
+        
+    elif kpi_type == 'clv_predicted':
+        # CLV hasil batch ETL (clv_model.py, seluruh histori) untuk pelanggan yang aktif di filter terpilih.
+        query = f"""
+        SELECT dc.company_name, dc.country,
+               cc.frequency + 1 AS total_orders, cc.avg_order_value,
+               cc.p_alive, cc.expected_purchases, cc.expected_order_value, cc.predicted_clv
+        FROM {CLV_TABLE} cc
+        JOIN dim_customer dc ON cc.customer_key = dc.customer_key
+        WHERE EXISTS (
+            SELECT 1
+            FROM fact_sales fs
+            JOIN dim_date dd ON fs.date_key = dd.date_key
+            JOIN dim_product dp ON fs.product_key = dp.product_key
+            WHERE fs.customer_key = cc.customer_key
+              AND dd.year = {selected_year}
+            {category_sql}
+        )
+        ORDER BY cc.predicted_clv DESC;
+        """
+
+    elif kpi_type == 'product_performance':
+        query = f"""
+        SELECT dp.product_name, dp.category_name, 
+               SUM(fs.revenue) AS total_revenue, 
+               SUM(fs.quantity) as total_sold
+        FROM fact_sales fs 
+        JOIN dim_product dp ON fs.product_key = dp.product_key 
+        JOIN dim_date dd ON fs.date_key = dd.date_key
+        WHERE dd.year = {selected_year}
+        {category_sql} 
+        GROUP BY 1, 2 
+        ORDER BY total_revenue DESC;
+        """
+        
+    elif kpi_type == 'product_affinity':
+        # Top-K pasangan per produk hasil batch ETL (basket.py), seluruh histori order.
+        # Filter kategori berlaku untuk produk utama (alias dp).
+        query = f"""
+        SELECT dp.product_name, dp.category_name,
+               rp.product_name AS related_product, rp.category_name AS related_category,
+               af.rank, af.pair_orders, af.support, af.confidence, af.lift
+        FROM {AFFINITY_TABLE} af
+        JOIN dim_product dp ON af.product_key = dp.product_key
+        JOIN dim_product rp ON af.related_product_key = rp.product_key
+        WHERE TRUE
+        {category_sql}
+        ORDER BY af.lift DESC, af.pair_orders DESC;
+        """
+
+    elif kpi_type == 'category_performance':
+        query = f"""
+        SELECT dp.category_name, 
+               SUM(fs.revenue) AS total_revenue
+        FROM fact_sales fs 
+        JOIN dim_product dp ON fs.product_key = dp.product_key 
+        JOIN dim_date dd ON fs.date_key = dd.date_key
+        WHERE dd.year = {selected_year}
+        {category_sql} 
+        GROUP BY 1 
+        ORDER BY total_revenue DESC;
+        """
+
+    elif kpi_type == 'geo_performance':
+        query = f"""
+        SELECT dc.country, 
+               SUM(fs.revenue) AS total_revenue,
+               COUNT(DISTINCT fs.order_id) as total_orders
+        FROM fact_sales fs 
+        JOIN dim_customer dc ON fs.customer_key = dc.customer_key
+        JOIN dim_date dd ON fs.date_key = dd.date_key
+        JOIN dim_product dp ON fs.product_key = dp.product_key
+        WHERE dd.year = {selected_year}
+        {category_sql} 
+        GROUP BY 1 
+        ORDER BY total_revenue DESC;
+        """
+    
+    elif kpi_type == 'rfm_raw_data':
+        query = f"""
+        SELECT 
+            dc.company_name as customer_name,
+            MAX(dd.full_date) as last_order_date,
+            COUNT(DISTINCT fs.order_id) as frequency,
+            SUM(fs.revenue) as monetary
+        FROM fact_sales fs
+        JOIN dim_customer dc ON fs.customer_key = dc.customer_key
+        JOIN dim_date dd ON fs.date_key = dd.date_key
+        JOIN dim_product dp ON fs.product_key = dp.product_key
+        WHERE dd.year = {selected_year}
+        {category_sql}
+        GROUP BY 1;
+        """
+
+    elif kpi_type == 'rfm_segments':
+        # Segmentasi RFM di server (satu baris per pelanggan): skor kuintil
+        # NTILE setara qcut atas rank, tanggal analisis = 31 Des tahun terpilih.
+        rfm_raw = build_kpi_query('rfm_raw_data', selected_year, category_sql).strip().rstrip(';')
+        query = f"""
+        WITH rfm AS ({rfm_raw}),
+        scored AS (
+            SELECT rfm.*,
+                   DATE '{int(selected_year)}-12-31' - last_order_date AS recency,
+                   6 - NTILE(5) OVER (ORDER BY last_order_date DESC, customer_name) AS r_score,
+                   NTILE(5) OVER (ORDER BY frequency, customer_name) AS f_score
+            FROM rfm
+        )
+        SELECT customer_name, last_order_date, recency, frequency, monetary, r_score, f_score,
+               CASE
+                   WHEN r_score <= 2 AND f_score <= 2 THEN 'Lost'
+                   WHEN r_score <= 2 THEN 'At Risk'
+                   WHEN f_score = 1 THEN 'New Customers'
+                   WHEN r_score <= 4 AND f_score <= 3 THEN 'Potential'
+                   WHEN r_score <= 4 OR f_score <= 3 THEN 'Loyal Customers'
+                   ELSE 'Champions'
+               END AS segment
+        FROM scored;
+        """
+
+    elif kpi_type == 'rolling_12m':
+        # Trailing 12 bulan = cum[bulan] - cum[bulan - 12], seluruh histori s.d. akhir tahun terpilih.
+        query = f"""
+        SELECT dp.month_start,
+               SUM(dp.cum_revenue - COALESCE(prev.cum_revenue, 0)) AS revenue_12m,
+               SUM(dp.cum_orders - COALESCE(prev.cum_orders, 0)) AS orders_12m
+        FROM {MONTHLY_AGG_TABLE} dp
+        LEFT JOIN {MONTHLY_AGG_TABLE} prev
+               ON prev.category_name = dp.category_name
+              AND prev.month_start = dp.month_start - interval '12 months'
+        WHERE dp.month_start <= make_date({int(selected_year)}, 12, 1)
+          AND {_series_filter(category_sql)}
+        GROUP BY 1
+        ORDER BY 1;
+        """
+
+    elif kpi_type == 'yoy_monthly':
+        # Bulan vs bulan yang sama tahun lalu, plus YTD = cum[bulan] - cum[Des tahun lalu].
+        query = f"""
+        SELECT EXTRACT(MONTH FROM dp.month_start)::int AS month,
+               to_char(dp.month_start, 'Mon') AS month_name,
+               SUM(dp.revenue) AS revenue,
+               SUM(py.revenue) AS revenue_prev_year,
+               SUM(dp.cum_revenue - COALESCE(ye.cum_revenue, 0)) AS ytd_revenue,
+               SUM(py.cum_revenue - COALESCE(ye_prev.cum_revenue, 0)) AS ytd_revenue_prev_year
+        FROM {MONTHLY_AGG_TABLE} dp
+        LEFT JOIN {MONTHLY_AGG_TABLE} py
+               ON py.category_name = dp.category_name
+              AND py.month_start = dp.month_start - interval '1 year'
+        LEFT JOIN {MONTHLY_AGG_TABLE} ye
+               ON ye.category_name = dp.category_name
+              AND ye.month_start = make_date({int(selected_year) - 1}, 12, 1)
+        LEFT JOIN {MONTHLY_AGG_TABLE} ye_prev
+               ON ye_prev.category_name = dp.category_name
+              AND ye_prev.month_start = make_date({int(selected_year) - 2}, 12, 1)
+        WHERE dp.month_start BETWEEN make_date({int(selected_year)}, 1, 1) AND make_date({int(selected_year)}, 12, 1)
+          AND {_series_filter(category_sql)}
+        GROUP BY 1, 2
+        ORDER BY 1;
+        """
+
+    elif kpi_type == 'qoq':
+        # Kuartal = cum[bulan akhir kuartal] - cum[3 bulan sebelumnya].
+        query = f"""
+        SELECT q.quarter,
+               SUM(dp.cum_revenue - COALESCE(prev.cum_revenue, 0)) AS revenue,
+               SUM(prev.cum_revenue - COALESCE(prev2.cum_revenue, 0)) AS revenue_prev_quarter,
+               SUM(dp.cum_orders - COALESCE(prev.cum_orders, 0)) AS orders
+        FROM generate_series(1, 4) AS q(quarter)
+        JOIN {MONTHLY_AGG_TABLE} dp
+          ON dp.month_start = make_date({int(selected_year)}, q.quarter * 3, 1)
+        LEFT JOIN {MONTHLY_AGG_TABLE} prev
+               ON prev.category_name = dp.category_name
+              AND prev.month_start = dp.month_start - interval '3 months'
+        LEFT JOIN {MONTHLY_AGG_TABLE} prev2
+               ON prev2.category_name = dp.category_name
+              AND prev2.month_start = dp.month_start - interval '6 months'
+        WHERE {_series_filter(category_sql)}
+        GROUP BY 1
+        ORDER BY 1;
+        """
+
+    elif kpi_type == 'financial_trend_approx':
+        # Revenue dari agregat bulanan, order distinct dari sketch HLL: tanpa scan fact_sales.
+        orders = approx_distinct_query('orders', selected_year, category_sql, group_cols=('month_start',))
+        query = f"""
+        WITH orders AS ({orders})
+        SELECT EXTRACT(YEAR FROM dp.month_start)::int AS year,
+               EXTRACT(MONTH FROM dp.month_start)::int AS month,
+               to_char(dp.month_start, 'FMMonth') AS month_name,
+               SUM(dp.revenue) AS total_revenue,
+               MAX(o.approx_count) AS total_orders
+        FROM {MONTHLY_AGG_TABLE} dp
+        LEFT JOIN orders o ON o.month_start = dp.month_start
+        WHERE dp.month_start BETWEEN make_date({int(selected_year)}, 1, 1) AND make_date({int(selected_year)}, 12, 1)
+          AND {_series_filter(category_sql)}
+        GROUP BY dp.month_start
+        HAVING SUM(dp.orders) > 0
+        ORDER BY dp.month_start;
+        """
+
+    elif kpi_type == 'active_customers_approx':
+        # Bentuk sama dengan shape ('count',) atas customer_clv.
+        customers = approx_distinct_query('customers', selected_year, category_sql)
+        query = f"SELECT approx_count AS total_rows FROM ({customers}) c;"
+
+    elif kpi_type == 'geo_performance_approx':
+        orders = approx_distinct_query('orders', selected_year, category_sql, group_cols=('country',))
+        query = f"""
+        WITH orders AS ({orders}),
+        revenue AS (
+            SELECT dc.country, SUM(fs.revenue) AS total_revenue
+            FROM fact_sales fs
+            JOIN dim_customer dc ON fs.customer_key = dc.customer_key
+            JOIN dim_date dd ON fs.date_key = dd.date_key
+            JOIN dim_product dp ON fs.product_key = dp.product_key
+            WHERE dd.year = {selected_year}
+            {category_sql}
+            GROUP BY 1
+        )
+        SELECT r.country, r.total_revenue, o.approx_count AS total_orders
+        FROM revenue r
+        LEFT JOIN orders o ON o.country = r.country
+        ORDER BY r.total_revenue DESC;
+        """
+
+    elif kpi_type == 'insight_monthly':
+        # Seri bulanan per kategori (tahun terpilih + tahun lalu) dari agregat, untuk insights.py.
+        # Tanpa filter kategori seri '*' ikut diambil (order distinct yang benar untuk total).
+        series = "TRUE" if not category_sql.strip() else f"dp.category_name <> '{ALL_CATEGORIES}'{category_sql}"
+        query = f"""
+        SELECT dp.category_name, dp.month_start, dp.revenue, dp.orders, dp.quantity
+        FROM {MONTHLY_AGG_TABLE} dp
+        WHERE dp.month_start BETWEEN make_date({int(selected_year) - 1}, 1, 1) AND make_date({int(selected_year)}, 12, 1)
+          AND ({series})
+        ORDER BY 1, 2;
+        """
+
+    elif kpi_type == 'insight_country':
+        # Revenue per negara tahun terpilih vs tahun lalu dalam satu scan.
+        query = f"""
+        SELECT dc.country,
+               COALESCE(SUM(fs.revenue) FILTER (WHERE dd.year = {int(selected_year)}), 0) AS revenue,
+               COALESCE(SUM(fs.revenue) FILTER (WHERE dd.year = {int(selected_year) - 1}), 0) AS revenue_prev,
+               COUNT(DISTINCT fs.customer_key) FILTER (WHERE dd.year = {int(selected_year)}) AS customers
+        FROM fact_sales fs
+        JOIN dim_customer dc ON fs.customer_key = dc.customer_key
+        JOIN dim_date dd ON fs.date_key = dd.date_key
+        JOIN dim_product dp ON fs.product_key = dp.product_key
+        WHERE dd.year IN ({int(selected_year)}, {int(selected_year) - 1})
+        {category_sql}
+        GROUP BY 1;
+        """
+
+    elif kpi_type == 'insight_rfm_shift':
+        # Segmen RFM setiap pelanggan tahun ini vs tahun lalu (NULL = tidak belanja di tahun itu).
+        current = build_kpi_query('rfm_segments', selected_year, category_sql).strip().rstrip(';')
+        previous = build_kpi_query('rfm_segments', int(selected_year) - 1, category_sql).strip().rstrip(';')
+        query = f"""
+        WITH cur AS ({current}),
+        prev AS ({previous})
+        SELECT COALESCE(cur.customer_name, prev.customer_name) AS customer_name,
+               cur.segment, prev.segment AS segment_prev,
+               COALESCE(cur.monetary, 0) AS monetary, COALESCE(prev.monetary, 0) AS monetary_prev
+        FROM cur
+        FULL OUTER JOIN prev ON prev.customer_name = cur.customer_name;
+        """
+
+    elif kpi_type == 'insight_stock':
+        query = f"""
+        SELECT dp.product_name, dp.category_name, dp.units_in_stock, dp.units_on_order,
+               dp.reorder_level, dp.discontinued, COALESCE(s.sold, 0) AS sold_year
+        FROM dim_product dp
+        LEFT JOIN (
+            SELECT fs.product_key, SUM(fs.quantity) AS sold
+            FROM fact_sales fs
+            JOIN dim_date dd ON fs.date_key = dd.date_key
+            WHERE dd.year = {int(selected_year)}
+            GROUP BY 1
+        ) s ON s.product_key = dp.product_key
+        WHERE TRUE
+        {category_sql};
+        """
+
+    elif kpi_type == 'revenue_forecast':
+        # Forecast hasil batch ETL (forecasting.py) untuk bulan di tahun terpilih.
+        # Seri kategori terpilih dijumlah; galat diasumsikan independen antar seri.
+        query = f"""
+        SELECT EXTRACT(MONTH FROM dp.month_start)::int AS month, dp.month_start,
+               SUM(dp.forecast) AS forecast,
+               SQRT(SUM(dp.stderr * dp.stderr)) AS stderr,
+               MAX(dp.fitted_through) AS fitted_through
+        FROM (
+            SELECT series_key AS category_name, month_start, forecast, stderr, fitted_through
+            FROM {FORECAST_TABLE}
+            WHERE series_type = 'category'
+        ) dp
+        WHERE EXTRACT(YEAR FROM dp.month_start) = {int(selected_year)}
+          AND {_series_filter(category_sql)}
+        GROUP BY 1, 2
+        ORDER BY 2;
+        """
+
+    elif kpi_type == 'country_forecast':
+        # Forecast 3 bulan ke depan per negara (seluruh kategori).
+        query = f"""
+        SELECT series_key AS country,
+               SUM(forecast) AS forecast_3m,
+               SQRT(SUM(stderr * stderr)) AS stderr_3m,
+               MIN(month_start) AS first_month
+        FROM {FORECAST_TABLE}
+        WHERE series_type = 'country'
+          AND month_start <= (SELECT MAX(fitted_through) FROM {FORECAST_TABLE}) + interval '3 months'
+        GROUP BY 1
+        ORDER BY forecast_3m DESC;
+        """
+
+    elif kpi_type == 'employee_sales':
+        # Revenue langsung + rollup tim (semua bawahan lewat closure table), dari agregat bulanan.
+        query = f"""
+        WITH direct AS (
+            SELECT dp.employee_key, SUM(dp.revenue) AS revenue, SUM(dp.orders) AS orders
+            FROM {EMPLOYEE_MONTHLY_TABLE} dp
+            WHERE EXTRACT(YEAR FROM dp.month_start) = {int(selected_year)}
+              AND {_series_filter(category_sql)}
+            GROUP BY 1
+        ), levels AS (
+            SELECT descendant_key AS employee_key, MAX(depth) AS level
+            FROM {EMPLOYEE_CLOSURE_TABLE}
+            GROUP BY 1
+        )
+        SELECT de.full_name AS employee_name, de.title, de.reports_to_name AS manager_name,
+               MAX(lv.level) AS level,
+               COUNT(*) - 1 AS team_size,
+               COALESCE(SUM(d.revenue) FILTER (WHERE ec.depth = 0), 0) AS direct_revenue,
+               COALESCE(SUM(d.orders) FILTER (WHERE ec.depth = 0), 0) AS direct_orders,
+               COALESCE(SUM(d.revenue), 0) AS team_revenue,
+               COALESCE(SUM(d.orders), 0) AS team_orders
+        FROM {EMPLOYEE_CLOSURE_TABLE} ec
+        JOIN dim_employee de ON ec.ancestor_key = de.employee_key
+        JOIN levels lv ON lv.employee_key = de.employee_key
+        LEFT JOIN direct d ON d.employee_key = ec.descendant_key
+        GROUP BY de.employee_key, de.full_name, de.title, de.reports_to_name
+        ORDER BY team_revenue DESC;
+        """
+
+    elif kpi_type == 'shipper_freight':
+        # Freight per shipper per bulan (sekali per order); filter kategori tidak berlaku.
+        query = f"""
+        SELECT ds.company_name AS shipper_name, EXTRACT(MONTH FROM sm.month_start)::int AS month,
+               sm.month_start, sm.orders, sm.freight, sm.revenue,
+               sm.freight / NULLIF(sm.orders, 0) AS freight_per_order,
+               sm.freight / NULLIF(sm.revenue, 0) * 100 AS freight_pct
+        FROM {SHIPPER_MONTHLY_TABLE} sm
+        JOIN dim_shipper ds ON sm.shipper_key = ds.shipper_key
+        WHERE EXTRACT(YEAR FROM sm.month_start) = {int(selected_year)}
+        ORDER BY sm.month_start, ds.company_name;
+        """
+
+    elif kpi_type == 'agg_month_bounds':
+        query = f"""
+        SELECT MIN(month_start) AS first_month, MAX(month_start) AS last_month
+        FROM {MONTHLY_AGG_TABLE};
+        """
+
+    else:
+        return None
+
+    return query
+
+
+def add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def build_range_query(start_month, end_month, category_sql=""):
+    """
+    KPI rentang bulan [start_month, end_month] dan periode sebelumnya dengan
+    panjang sama, masing-masing dari dua baris kumulatif per seri.
+    """
+    length = (end_month.year - start_month.year) * 12 + end_month.month - start_month.month + 1
+    periods = [
+        ('current', start_month, end_month),
+        ('previous', add_months(start_month, -length), add_months(start_month, -1)),
+    ]
+    selects = [
+        f"""
+        SELECT '{label}' AS period, DATE '{start:%Y-%m-%d}' AS start_month, DATE '{end:%Y-%m-%d}' AS end_month,
+               SUM(dp.cum_revenue - COALESCE(b.cum_revenue, 0)) AS revenue,
+               SUM(dp.cum_orders - COALESCE(b.cum_orders, 0)) AS orders,
+               SUM(dp.cum_quantity - COALESCE(b.cum_quantity, 0)) AS quantity
+        FROM {MONTHLY_AGG_TABLE} dp
+        LEFT JOIN {MONTHLY_AGG_TABLE} b
+               ON b.category_name = dp.category_name
+              AND b.month_start = DATE '{add_months(start, -1):%Y-%m-%d}'
+        WHERE dp.month_start = DATE '{end:%Y-%m-%d}'
+          AND {_series_filter(category_sql)}
+        """
+        for label, start, end in periods
+    ]
+    return " UNION ALL ".join(selects) + ";"
+
+
+def fetch_kpi(engine, kpi_type, selected_year, category_sql="", shape=None):
+    """
+    Jalankan query KPI; error dilempar ke pemanggil.
+    shape: bentuk hasil di server (lihat result_shaping.shape_query),
+    mis. satu halaman atau top-N, supaya payload tetap kecil.
+    """
+    query = build_kpi_query(kpi_type, selected_year, category_sql)
+    if query is None:
+        return pd.DataFrame()
+    if shape:
+        query = shape_query(query, shape)
+    return read_sql_streaming(query, engine)
+
+
+def fetch_range_kpi(engine, start_month, end_month, category_sql=""):
+    return read_sql_streaming(build_range_query(start_month, end_month, category_sql), engine)
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List
+
+import pandas as pd
+
+from result_shaping import SAMPLE_PER_GROUP, SCATTER_BINS, TOP_N
+
+PREFETCH_WORKERS = int(os.getenv("DASH_PREFETCH_WORKERS", "2"))
+# Jumlah kombinasi filter (tahun, kategori) yang disimpan per sesi.
+SESSION_FILTER_SLOTS = int(os.getenv("DASH_SESSION_FILTER_SLOTS", "3"))
+# Umur memo sesi (detik), sama dengan TTL cache KPI di app.py: hasil ETL baru
+# terlihat di sesi yang sudah terbuka paling lambat setelah TTL ini.
+DATASET_TTL = int(os.getenv("DASH_DATASET_TTL", "600"))
+
+# Satu pool per proses server, dipakai bersama semua sesi.
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='kpi-prefetch')
+
+# Nama dataset -> (kpi_type, offset tahun terhadap tahun terpilih, bentuk hasil).
+# Bentuk hasil (result_shaping) membatasi ukuran payload di server.
+DATASETS = {
+    'trend': ('financial_trend', 0, None),
+    'retention': ('retention_rate', 0, None),
+    'retention_prev': ('retention_rate', -1, None),
+    'clv_count': ('customer_clv', 0, ('count',)),
+    'clv_top': ('customer_clv', 0, ('page', 'monetary_value DESC', 10, 0)),
+    'product': ('product_performance', 0,
+                ('top', ('product_name', 'category_name'), 'total_revenue', TOP_N, ('total_sold',))),
+    'category': ('category_performance', 0, None),
+    # Dari agregat kumulatif (period_aggregates), bukan scan fact_sales.
+    'rolling': ('rolling_12m', 0, None),
+    'yoy': ('yoy_monthly', 0, None),
+    'qoq': ('qoq', 0, None),
+    'agg_bounds': ('agg_month_bounds', 0, None),
+    # Forecast hasil batch ETL (forecasting.py); tidak ada fitting di request.
+    'forecast': ('revenue_forecast', 0, None),
+    'country_forecast': ('country_forecast', 0, None),
+    # Karyawan (rollup hierarki) & freight shipper dari agregat org_aggregates.py.
+    'employee_sales': ('employee_sales', 0, None),
+    'shipper_freight': ('shipper_freight', 0, None),
+    # Peta per negara: jumlah negara terbatas, tetap dijaga top-N agar payload terbatas.
+    'geo': ('geo_performance', 0, ('top', ('country',), 'total_revenue', 250, ('total_orders',))),
+    'rfm_counts': ('rfm_segments', 0, ('groups', 'segment')),
+    'rfm_points': ('rfm_segments', 0, ('sample', 'segment', SAMPLE_PER_GROUP, 'md5(customer_name)')),
+    'rfm_bins': ('rfm_segments', 0, ('bins', 'recency', 'monetary', SCATTER_BINS)),
+}
+
+# Pengganti saat mode perkiraan aktif: COUNT(DISTINCT ...) diganti sketch HLL.
+APPROX_DATASETS = {
+    'trend': ('financial_trend_approx', 0, None),
+    'clv_count': ('active_customers_approx', 0, None),
+    'geo': ('geo_performance_approx', 0, DATASETS['geo'][2]),
+}
+
+class LazyDatasets:
+    """
+    Dataset KPI satu sesi dashboard. Dataset baru diambil saat pertama
+    diakses lewat get(), lalu dimemo per (tahun, filter kategori) selama
+    DATASET_TTL detik. Hasil kosong (termasuk query gagal) tidak dimemo.
+    prefetch() mengambil dataset lain di background thread selama user
+    belum membutuhkannya; get() menunggu hasil prefetch jika sedang jalan.
+
+    fetch: loader di thread utama (boleh menampilkan error di UI).
+    background_fetch: loader untuk thread prefetch, tanpa elemen UI; sebaiknya
+    cache tingkat proses yang sama dengan fetch agar sesi lain ikut memakai hasilnya.
+    Keduanya dipanggil dengan (kpi_type, year, category_sql, shape).
+    """
+
+    def __init__(self, fetch: Callable, background_fetch: Callable):
+        self.fetch = fetch
+        self.background_fetch = background_fetch
+        self._lock = threading.Lock()
+        # Per filter: nama dataset -> (waktu kedaluwarsa, DataFrame atau Future prefetch).
+        self._slots: "OrderedDict[tuple, Dict[str, tuple]]" = OrderedDict()
+        self.year = None
+        self.category_sql = ""
+        self.approx = False
+
+    def bind(self, year, category_sql: str = "", approx: bool = False):
+        """Set filter aktif; memo filter lama disimpan terbatas (LRU)."""
+        self.year, self.category_sql, self.approx = year, category_sql, approx
+        with self._lock:
+            slot = (year, category_sql, approx)
+            self._slots.setdefault(slot, {})
+            self._slots.move_to_end(slot)
+            while len(self._slots) > SESSION_FILTER_SLOTS:
+                self._slots.popitem(last=False)
+        return self
+
+    def _entries(self) -> Dict[str, tuple]:
+        return self._slots.setdefault((self.year, self.category_sql, self.approx), {})
+
+    def _live(self, name: str):
+        """Entri memo yang belum kedaluwarsa -> (expires_at, nilai), atau None."""
+        memo = self._entries().get(name)
+        if memo is None or memo[0] <= time.monotonic():
+            return None
+        return memo
+
+    def _args(self, name: str) -> tuple:
+        kpi_type, year_offset, shape = (APPROX_DATASETS if self.approx and name in APPROX_DATASETS
+                                        else DATASETS)[name]
+        return kpi_type, self.year + year_offset, self.category_sql, shape
+
+    def get(self, name: str) -> pd.DataFrame:
+        with self._lock:
+            expires_at, entry = self._live(name) or (None, None)
+        if isinstance(entry, Future):
+            try:
+                entry = entry.result()
+            except Exception:
+                # Prefetch gagal: ulangi di thread utama supaya error tampil di UI.
+                entry = None
+        if entry is None:
+            expires_at = time.monotonic() + DATASET_TTL
+            entry = self.fetch(*self._args(name))
+        with self._lock:
+            if entry is None or entry.empty:
+                self._entries().pop(name, None)
+            else:
+                self._entries()[name] = (expires_at, entry)
+        return entry
+
+    def need(self, *names: str) -> List[pd.DataFrame]:
+        return [self.get(name) for name in names]
+
+    def query(self, kpi_type: str, shape: tuple) -> pd.DataFrame:
+        """Hasil KPI dengan bentuk bebas (mis. halaman tabel) untuk filter aktif, tanpa memo sesi."""
+        return self.fetch(kpi_type, self.year, self.category_sql, shape)
+
+    def prefetch(self, names: Iterable[str]):
+        """Jadwalkan dataset yang belum ada (atau kedaluwarsa) di memo untuk diambil di background."""
+        with self._lock:
+            entries = self._entries()
+            for name in names:
+                if self._live(name) is None:
+                    entries[name] = (time.monotonic() + DATASET_TTL,
+                                     _prefetch_pool.submit(self.background_fetch, *self._args(name)))
+
+    def status(self) -> Dict[str, str]:
+        with self._lock:
+            entries = {name: self._live(name) for name in self._entries()}
+        return {
+            name: ('loading' if isinstance(memo[1], Future) and not memo[1].done() else 'ready')
+            for name, memo in entries.items() if memo is not None
+        }
@@ -1,45 +1,689 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
 import pandas as pd
-from sqlalchemy.engine import Engine
+import pyarrow as pa
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
 
-def load_data_to_dw(df: pd.DataFrame, table_name: str, dw_engine: Engine):
-    if df is None or df.empty:
-        print(f"⚠️ Skip Load {table_name}: DataFrame kosong.")
-        return
+from arrow_copy import copy_arrow_table
+from calendar_dim import build_dim_date
+from stream_read import read_sql_streaming
+from transform import FACT_COLUMNS, empty_pending_orders, expand_compact_frame
 
-    print(f"--- 🚀 Mulai Load {table_name} ({len(df)} baris) ---")
-    
-    try:
+DW_SCHEMA = 'northwind-dw'
 
-        df.to_sql(
-            table_name,
-            con=dw_engine,
-            if_exists='append',
-            index=False,
-            schema='northwind-dw'
-        )
-        print(f"✅ Load {table_name} berhasil.")
+DIMENSION_TABLES = [
+    'dim_date', 'dim_shipper', 'dim_customer',
+    'dim_employee', 'dim_product'
+]
+FACT_TABLE = 'fact_sales'
+STAR_TABLES = DIMENSION_TABLES + [FACT_TABLE]
+STAGE_SUFFIX = '__stage'
+
+LOAD_WORKERS = int(os.getenv("ETL_LOAD_WORKERS", "4"))
+LOAD_CHUNKSIZE = int(os.getenv("ETL_LOAD_CHUNKSIZE", "1000"))
+
+
+def _row_count(df) -> int:
+    if df is None:
+        return 0
+    return df.num_rows if isinstance(df, pa.Table) else len(df)
+
+
+def load_data_to_dw(df, table_name: str, dw_engine: Engine,
+                    label: Optional[str] = None, raise_errors: bool = False) -> bool:
+    """
+    Load satu DataFrame atau Arrow table. Arrow table ditulis lewat COPY
+    binary langsung dari buffer kolomnya (tanpa objek Python per baris).
+    """
+    label = label or table_name
+    if _row_count(df) == 0:
+        print(f"⚠️ Skip Load {label}: DataFrame kosong.")
+        return True
+
+    print(f"--- 🚀 Mulai Load {label} ({_row_count(df)} baris) ---")
+
+    try:
+        if isinstance(df, pa.Table):
+            copy_arrow_table(df, table_name, DW_SCHEMA, dw_engine)
+        else:
+            df = expand_compact_frame(df)
+            # Satu transaksi per tabel/partisi, di koneksi pool sendiri.
+            with dw_engine.begin() as connection:
+                df.to_sql(
+                    table_name,
+                    con=connection,
+                    if_exists='append',
+                    index=False,
+                    schema=DW_SCHEMA,
+                    method='multi',
+                    chunksize=LOAD_CHUNKSIZE
+                )
+        print(f"✅ Load {label} berhasil.")
+        return True
     except Exception as e:
-        print(f"❌ GAGAL Load {table_name}. Cek DataFrames dan skema DB Anda. Error: {e}")
+        print(f"❌ GAGAL Load {label}. Cek DataFrames dan skema DB Anda. Error: {e}")
+        if raise_errors:
+            raise
+        return False
+
+
+def partition_fact_sales(fact_sales, partition_by: str = 'year',
+                         n_partitions: int = LOAD_WORKERS) -> dict:
+    """Pecah fact_sales (DataFrame atau Arrow table) per tahun dari date_key atau per hash order_id."""
+    if _row_count(fact_sales) == 0:
+        return {}
+
+    is_arrow = isinstance(fact_sales, pa.Table)
+
+    def column(name: str) -> np.ndarray:
+        if is_arrow:
+            return fact_sales.column(name).to_numpy()
+        return fact_sales[name].to_numpy()
+
+    if partition_by == 'year':
+        keys = column('date_key').astype(np.int64) // 10000
+        names = {y: f"{FACT_TABLE}[{y}]" for y in np.unique(keys)}
+    elif partition_by == 'hash':
+        keys = pd.util.hash_array(column('order_id')) % max(n_partitions, 1)
+        names = {b: f"{FACT_TABLE}[hash {b}/{n_partitions}]" for b in np.unique(keys)}
+    else:
+        raise ValueError(f"partition_by tidak dikenal: {partition_by}")
+
+    partitions = {}
+    for key, label in sorted(names.items(), key=lambda item: item[1]):
+        rows = np.flatnonzero(keys == key)
+        partitions[label] = fact_sales.take(rows) if is_arrow else fact_sales.iloc[rows]
+    return partitions
 
-def load_all_data(transformed_data: dict[str, pd.DataFrame], dw_engine: Engine):
+
+def _load_parallel(frames: Dict[str, pd.DataFrame], table_name: str,
+                   dw_engine: Engine, workers: int) -> Dict[str, bool]:
+    if not frames:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(frames)))) as pool:
+        futures = {
+            label: pool.submit(load_data_to_dw, df, table_name, dw_engine, label)
+            for label, df in frames.items()
+        }
+        return {label: future.result() for label, future in futures.items()}
+
+
+def _load_star(transformed_data: Dict[str, pd.DataFrame], dw_engine: Engine,
+               workers: int, partition_by: str, table_suffix: str = '') -> dict:
+    report = {
+        'dimensions': {},
+        'fact_partitions': {},
+        'failed': [],
+        'partition_by': partition_by,
+        'workers': workers,
+        'table_suffix': table_suffix,
+    }
+
+    # Dimensi yang tidak ada di transformed_data (mis. tidak berubah) tidak dimuat.
+    dims = {name: transformed_data[name] for name in DIMENSION_TABLES if name in transformed_data}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(dims) or 1))) as pool:
+        futures = {
+            name: pool.submit(load_data_to_dw, df, name + table_suffix, dw_engine, name)
+            for name, df in dims.items()
+        }
+        report['dimensions'] = {name: future.result() for name, future in futures.items()}
+
+    failed_dims = [name for name, ok in report['dimensions'].items() if not ok]
+    if failed_dims:
+        report['failed'] = failed_dims
+        print(f"\n❌ Load fact_sales dibatalkan, dimensi gagal: {', '.join(failed_dims)}")
+        return report
+
+    partitions = partition_fact_sales(transformed_data.get(FACT_TABLE), partition_by, workers)
+    report['fact_partitions'] = _load_parallel(partitions, FACT_TABLE + table_suffix, dw_engine, workers)
+    report['failed'] = [label for label, ok in report['fact_partitions'].items() if not ok]
+    return report
+
+
+def load_all_data(transformed_data: Dict[str, pd.DataFrame], dw_engine: Engine,
+                  workers: int = LOAD_WORKERS, partition_by: str = 'year') -> dict:
+    """
+    Load dimensi secara paralel, lalu fact_sales per partisi lewat beberapa
+    koneksi pool. Mengembalikan laporan status; partisi yang gagal bisa
+    diulang dengan retry_failed_partitions().
+    """
     print("\n" + "=" * 50)
     print("PHASE 3: LOADING DATA TO WAREHOUSE")
     print("=" * 50)
-    
-    dim_order = [
-        'dim_date', 'dim_shipper', 'dim_customer', 
-        'dim_employee', 'dim_product'
-    ]
-
-    for dim_name in dim_order:
-        load_data_to_dw(transformed_data.get(dim_name), dim_name, dw_engine)
-
-    fact_name = 'fact_sales'
-    load_data_to_dw(transformed_data.get(fact_name), fact_name, dw_engine)
-    
+
+    report = _load_star(transformed_data, dw_engine, workers, partition_by)
+
+    print("\n" + "=" * 50)
+    if report['failed']:
+        print(f"ETL LOAD SELESAI DENGAN {len(report['failed'])} PARTISI GAGAL: {report['failed']}")
+    else:
+        print("ETL PROCESS COMPLETED SUCCESSFULLY!")
+    print("=" * 50)
+    return report
+
+
+def retry_failed_partitions(report: dict, transformed_data: Dict[str, pd.DataFrame],
+                            dw_engine: Engine) -> dict:
+    """Ulangi hanya partisi fact_sales yang gagal pada laporan sebelumnya."""
+    failed: List[str] = [label for label in report.get('failed', []) if label.startswith(FACT_TABLE)]
+    if not failed:
+        return report
+
+    partitions = partition_fact_sales(
+        transformed_data.get(FACT_TABLE), report['partition_by'], report['workers']
+    )
+    retry = {label: partitions[label] for label in failed if label in partitions}
+    table_name = FACT_TABLE + report.get('table_suffix', '')
+    results = _load_parallel(retry, table_name, dw_engine, report['workers'])
+
+    report['fact_partitions'].update(results)
+    report['failed'] = [label for label, ok in report['fact_partitions'].items() if not ok]
+    return report
+
+
+# ==========================================
+# STAGED LOAD: shadow table + atomic swap
+# ==========================================
+
+def _qualified(table_name: str) -> str:
+    return f'"{DW_SCHEMA}"."{table_name}"'
+
+
+def table_exists(dw_engine: Engine, table_name: str) -> bool:
+    try:
+        with dw_engine.connect() as connection:
+            return connection.execute(text("SELECT to_regclass(:name) IS NOT NULL"),
+                                      {'name': _qualified(table_name)}).scalar()
+    except Exception:
+        return False
+
+
+def _table_constraints(connection: Connection, table_name: str) -> List[tuple]:
+    rows = connection.execute(text("""
+        SELECT con.conname, con.contype, pg_get_constraintdef(con.oid)
+        FROM pg_constraint con
+        JOIN pg_class rel ON rel.oid = con.conrelid
+        JOIN pg_namespace nsp ON nsp.oid = rel.relnamespace
+        WHERE nsp.nspname = :schema AND rel.relname = :table
+        ORDER BY con.contype DESC, con.conname
+    """), {'schema': DW_SCHEMA, 'table': table_name})
+    return [tuple(row) for row in rows]
+
+
+def _foreign_keys_to(connection: Connection, tables: List[str]) -> List[tuple]:
+    """FK (tabel, nama, definisi) di schema DW yang menunjuk ke salah satu tabel."""
+    rows = connection.execute(text("""
+        SELECT rel.relname, con.conname, pg_get_constraintdef(con.oid)
+        FROM pg_constraint con
+        JOIN pg_class rel ON rel.oid = con.conrelid
+        JOIN pg_class ref ON ref.oid = con.confrelid
+        JOIN pg_namespace nsp ON nsp.oid = ref.relnamespace
+        WHERE con.contype = 'f' AND nsp.nspname = :schema
+          AND ref.relname = ANY(:tables)
+        ORDER BY rel.relname, con.conname
+    """), {'schema': DW_SCHEMA, 'tables': list(tables)})
+    return [tuple(row) for row in rows]
+
+
+def _table_plain_indexes(connection: Connection, table_name: str) -> List[tuple]:
+    rows = connection.execute(text("""
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = :schema AND t.relname = :table
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+    """), {'schema': DW_SCHEMA, 'table': table_name})
+    return [tuple(row) for row in rows]
+
+
+def create_stage_tables(dw_engine: Engine, tables: List[str] = STAR_TABLES):
+    """Buat shadow table kosong tanpa index/constraint (lebih cepat diisi)."""
+    with dw_engine.begin() as connection:
+        for table_name in tables:
+            stage = _qualified(table_name + STAGE_SUFFIX)
+            connection.execute(text(f"DROP TABLE IF EXISTS {stage}"))
+            connection.execute(text(
+                f"CREATE TABLE {stage} (LIKE {_qualified(table_name)} "
+                f"INCLUDING DEFAULTS INCLUDING IDENTITY)"
+            ))
+
+
+def drop_stage_tables(dw_engine: Engine, tables: List[str] = STAR_TABLES):
+    with dw_engine.begin() as connection:
+        for table_name in tables:
+            connection.execute(text(f"DROP TABLE IF EXISTS {_qualified(table_name + STAGE_SUFFIX)}"))
+
+
+def _build_stage_index(dw_engine: Engine, table_name: str):
+    stage_name = table_name + STAGE_SUFFIX
+    stage = _qualified(stage_name)
+    with dw_engine.begin() as connection:
+        for conname, contype, condef in _table_constraints(connection, table_name):
+            # FK dipasang ulang setelah swap, supaya menunjuk ke tabel baru.
+            if contype in ('p', 'u'):
+                connection.execute(text(
+                    f'ALTER TABLE {stage} ADD CONSTRAINT "{conname}{STAGE_SUFFIX}" {condef}'
+                ))
+        for index_name, index_def in _table_plain_indexes(connection, table_name):
+            index_def = re.sub(r'INDEX \S+ ON \S+ ', f'INDEX "{index_name}{STAGE_SUFFIX}" ON {stage} ',
+                               index_def, count=1)
+            connection.execute(text(index_def))
+    with dw_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"ANALYZE {stage}"))
+    print(f"✓ Index & ANALYZE {stage_name} selesai.")
+
+
+def build_stage_indexes(dw_engine: Engine, workers: int = LOAD_WORKERS,
+                        tables: List[str] = STAR_TABLES):
+    """Bangun index/constraint & ANALYZE per shadow table secara paralel."""
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tables)))) as pool:
+        for future in [pool.submit(_build_stage_index, dw_engine, t) for t in tables]:
+            future.result()
+
+
+def swap_stage_tables(dw_engine: Engine, tables: List[str] = STAR_TABLES):
+    """
+    Tukar tabel star schema (default semua) dengan shadow table dalam SATU
+    transaksi. Query dashboard melihat data lama sampai commit, lalu data baru utuh.
+    """
+    with dw_engine.begin() as connection:
+        live_constraints = {t: _table_constraints(connection, t) for t in STAR_TABLES}
+        live_indexes = {t: _table_plain_indexes(connection, t) for t in STAR_TABLES}
+
+        locked = ", ".join(_qualified(t) for t in STAR_TABLES)
+        connection.execute(text(f"LOCK TABLE {locked} IN ACCESS EXCLUSIVE MODE"))
+
+        # FK yang menunjuk ke tabel yang ditukar dilepas per nama (bukan CASCADE):
+        # objek lain yang bergantung (mis. view) membuat DROP gagal dan swap dibatalkan.
+        referencing = _foreign_keys_to(connection, tables)
+        for table_name, conname, _ in referencing:
+            connection.execute(text(f'ALTER TABLE {_qualified(table_name)} DROP CONSTRAINT "{conname}"'))
+        incoming = [fk for fk in referencing if fk[0] not in tables]
+
+        for table_name in tables:
+            connection.execute(text(f"DROP TABLE {_qualified(table_name)}"))
+            connection.execute(text(
+                f'ALTER TABLE {_qualified(table_name + STAGE_SUFFIX)} RENAME TO "{table_name}"'
+            ))
+
+        # FK dipasang ulang tanpa NOT VALID: PostgreSQL memeriksa data baru saat ADD,
+        # jadi swap gagal (rollback, data lama tetap live) jika ada key yatim.
+        foreign_keys = [(table_name, conname, condef) for table_name in tables
+                        for conname, contype, condef in live_constraints[table_name] if contype == 'f']
+        for table_name, conname, condef in foreign_keys + incoming:
+            connection.execute(text(
+                f'ALTER TABLE {_qualified(table_name)} ADD CONSTRAINT "{conname}" {condef}'
+            ))
+
+        for table_name in tables:
+            live = _qualified(table_name)
+            for conname, contype, condef in live_constraints[table_name]:
+                if contype in ('p', 'u'):
+                    connection.execute(text(
+                        f'ALTER TABLE {live} RENAME CONSTRAINT "{conname}{STAGE_SUFFIX}" TO "{conname}"'
+                    ))
+            for index_name, _ in live_indexes[table_name]:
+                connection.execute(text(
+                    f'ALTER INDEX "{DW_SCHEMA}"."{index_name}{STAGE_SUFFIX}" RENAME TO "{index_name}"'
+                ))
+    print("✓ Swap shadow table -> live selesai (atomic).")
+
+
+def load_all_data_staged(transformed_data: Dict[str, pd.DataFrame], dw_engine: Engine,
+                         workers: int = LOAD_WORKERS, partition_by: str = 'year') -> dict:
+    """
+    Full load lewat shadow table: isi *__stage tanpa index, bangun index,
+    ANALYZE, lalu swap tabel star schema dalam satu transaksi. Hanya tabel
+    yang ada di transformed_data yang ditukar; tabel lain tetap live.
+    Jika ada partisi yang tetap gagal, tabel live tidak disentuh.
+    """
+    tables = [t for t in STAR_TABLES if t in transformed_data]
+    print("\n" + "=" * 50)
+    print("PHASE 3: LOADING DATA TO WAREHOUSE (STAGED)")
+    print("=" * 50)
+
+    try:
+        create_stage_tables(dw_engine, tables)
+    except Exception as e:
+        print(f"\n❌ Gagal membuat shadow table. Error: {e}")
+        return {'dimensions': {}, 'fact_partitions': {}, 'failed': ['stage'], 'swapped': False}
+
+    report = _load_star(transformed_data, dw_engine, workers, partition_by, STAGE_SUFFIX)
+    if report['failed'] and report['fact_partitions']:
+        report = retry_failed_partitions(report, transformed_data, dw_engine)
+
+    report['swapped'] = False
+    if report['failed']:
+        drop_stage_tables(dw_engine, tables)
+        print(f"\n❌ Staged load dibatalkan, tabel live tidak berubah. Gagal: {report['failed']}")
+        return report
+
+    try:
+        build_stage_indexes(dw_engine, workers, tables)
+        swap_stage_tables(dw_engine, tables)
+        report['swapped'] = True
+    except Exception as e:
+        drop_stage_tables(dw_engine, tables)
+        report['failed'] = ['swap']
+        print(f"\n❌ Swap gagal, tabel live tidak berubah. Error: {e}")
+        return report
+
     print("\n" + "=" * 50)
     print("ETL PROCESS COMPLETED SUCCESSFULLY!")
     print("=" * 50)
+    return report
+
+
+# ==========================================
+# INCREMENTAL (CDC) LOAD
+# ==========================================
+
+DIMENSION_KEY_COLUMNS = {
+    'customer': ('dim_customer', 'customer_id', 'customer_key'),
+    'product': ('dim_product', 'product_id', 'product_key'),
+    'employee': ('dim_employee', 'employee_id', 'employee_key'),
+    'shipper': ('dim_shipper', 'shipper_id', 'shipper_key'),
+}
+
+
+def read_dimension_keys(dw_engine: Engine) -> Dict[str, pd.Series]:
+    """Peta business key -> surrogate key dari dimensi di warehouse."""
+    key_maps = {}
+    for name, (table_name, business_key, surrogate_key) in DIMENSION_KEY_COLUMNS.items():
+        df = read_sql_streaming(
+            f"SELECT {business_key}, {surrogate_key} FROM {_qualified(table_name)}",
+            dw_engine
+        )
+        key_maps[name] = df.set_index(business_key)[surrogate_key]
+    return key_maps
+
+
+def read_facts_for_orders(dw_engine: Engine, order_ids) -> pd.DataFrame:
+    order_ids = [int(order_id) for order_id in order_ids]
+    if not order_ids:
+        return pd.DataFrame(columns=FACT_COLUMNS)
+    columns = ", ".join(FACT_COLUMNS)
+    return read_sql_streaming(
+        f"SELECT {columns} FROM {_qualified(FACT_TABLE)} WHERE order_id = ANY(:ids)",
+        dw_engine,
+        params={'ids': order_ids}
+    )
+
+
+def ensure_dim_date_covers(dw_engine: Engine, date_keys: pd.Series):
+    """Tambah tahun kalender yang belum ada di dim_date (untuk order baru)."""
+    years = set((pd.Series(date_keys).dropna().astype('int64') // 10000).unique().tolist())
+    if not years:
+        return
+    existing = set(read_sql_streaming(
+        f"SELECT DISTINCT year FROM {_qualified('dim_date')}", dw_engine
+    )['year'].tolist())
+    for year in sorted(years - existing):
+        load_data_to_dw(
+            build_dim_date(f"{year}-01-01", f"{year}-12-31"), 'dim_date', dw_engine,
+            label=f"dim_date[{year}]", raise_errors=True
+        )
+
+
+# Header order tanpa baris / baris tanpa header dari batch CDC sebelumnya,
+# menunggu pasangannya (lihat transform_fact_delta).
+PENDING_HEADERS_TABLE = 'etl_pending_headers'
+PENDING_LINES_TABLE = 'etl_pending_lines'
+PENDING_TABLES = {'headers': PENDING_HEADERS_TABLE, 'lines': PENDING_LINES_TABLE}
+
+
+def _ensure_pending_tables(connection: Connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(PENDING_HEADERS_TABLE)} (
+            order_id BIGINT PRIMARY KEY,
+            customer_key BIGINT,
+            employee_key BIGINT,
+            shipper_key BIGINT,
+            date_key BIGINT,
+            freight DOUBLE PRECISION
+        )
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(PENDING_LINES_TABLE)} (
+            order_id BIGINT NOT NULL,
+            product_key BIGINT,
+            unit_price DOUBLE PRECISION,
+            quantity DOUBLE PRECISION,
+            discount DOUBLE PRECISION
+        )
+    """))
+    connection.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS {PENDING_LINES_TABLE}_order_idx
+        ON {_qualified(PENDING_LINES_TABLE)} (order_id)
+    """))
+
+
+def read_pending_orders(dw_engine: Engine, order_ids) -> Dict[str, pd.DataFrame]:
+    """Header/baris pending untuk order terdampak ({'headers', 'lines'})."""
+    pending = empty_pending_orders()
+    order_ids = [int(order_id) for order_id in order_ids]
+    if not order_ids:
+        return pending
+    for kind, table in PENDING_TABLES.items():
+        if table_exists(dw_engine, table):
+            columns = ", ".join(pending[kind].columns)
+            pending[kind] = read_sql_streaming(
+                f"SELECT {columns} FROM {_qualified(table)} WHERE order_id = ANY(:ids)",
+                dw_engine,
+                params={'ids': order_ids}
+            )
+    return pending
+
+
+def apply_fact_delta(order_ids, fact_delta: pd.DataFrame, dw_engine: Engine,
+                     pending: Optional[Dict[str, pd.DataFrame]] = None,
+                     refresh_marks: Optional[Dict[str, Optional[int]]] = None) -> bool:
+    """
+    Ganti baris fact order terdampak dalam satu transaksi (delete + insert).
+    pending: header/baris yang belum lengkap untuk order tsb, disimpan di
+    transaksi yang sama agar tidak hilang saat offset CDC di-commit.
+    refresh_marks: state turunan yang wajib diperbarui setelah delta ini
+    (lihat mark_pending_refresh); tetap tercatat jika refresh-nya gagal.
+    """
+    order_ids = [int(order_id) for order_id in order_ids]
+    if not order_ids:
+        return True
+
+    print(f"--- 🚀 Apply delta fact_sales ({len(order_ids)} order, {len(fact_delta)} baris) ---")
+    try:
+        ensure_dim_date_covers(dw_engine, fact_delta['date_key'])
+        with dw_engine.begin() as connection:
+            connection.execute(
+                text(f"DELETE FROM {_qualified(FACT_TABLE)} WHERE order_id = ANY(:ids)"),
+                {'ids': order_ids}
+            )
+            clear_load_state(connection, [FACT_TABLE, 'dim_date'])
+            mark_pending_refresh(connection, refresh_marks)
+            _ensure_pending_tables(connection)
+            for kind, table in PENDING_TABLES.items():
+                connection.execute(
+                    text(f"DELETE FROM {_qualified(table)} WHERE order_id = ANY(:ids)"),
+                    {'ids': order_ids}
+                )
+                rows = (pending or {}).get(kind)
+                if rows is not None and not rows.empty:
+                    rows = rows.astype(object).where(rows.notna(), None)
+                    rows.to_sql(table, con=connection, if_exists='append', index=False,
+                                schema=DW_SCHEMA, method='multi', chunksize=LOAD_CHUNKSIZE)
+            if not fact_delta.empty:
+                expand_compact_frame(fact_delta).to_sql(
+                    FACT_TABLE,
+                    con=connection,
+                    if_exists='append',
+                    index=False,
+                    schema=DW_SCHEMA,
+                    method='multi',
+                    chunksize=LOAD_CHUNKSIZE
+                )
+        print("✅ Delta fact_sales berhasil.")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL apply delta fact_sales. Error: {e}")
+        return False
+
+
+# ==========================================
+# REJECTS (VALIDASI)
+# ==========================================
+
+REJECTS_TABLE = 'etl_rejects'
+
+
+def load_rejects(rejects: pd.DataFrame, dw_engine: Engine) -> bool:
+    """Simpan baris yang ditolak tahap validasi ke tabel etl_rejects (append)."""
+    if rejects is None or rejects.empty:
+        return True
+    try:
+        with dw_engine.begin() as connection:
+            connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {_qualified(REJECTS_TABLE)} (
+                    reject_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    table_name TEXT NOT NULL,
+                    rules TEXT NOT NULL,
+                    record JSONB,
+                    rejected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """))
+    except Exception as e:
+        print(f"❌ GAGAL membuat tabel {REJECTS_TABLE}. Error: {e}")
+        return False
+    return load_data_to_dw(rejects, REJECTS_TABLE, dw_engine)
+
+
+# ==========================================
+# LOAD STATE (hash isi tabel yang sudah dimuat)
+# ==========================================
+
+LOAD_STATE_TABLE = 'etl_load_state'
+
+
+def _ensure_load_state_table(connection: Connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(LOAD_STATE_TABLE)} (
+            table_name TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+
+
+def read_load_state(dw_engine: Engine) -> Dict[str, str]:
+    """Hash isi setiap tabel star schema pada load terakhir ({} jika belum ada)."""
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_load_state_table(connection)
+            rows = connection.execute(text(
+                f"SELECT table_name, content_hash FROM {_qualified(LOAD_STATE_TABLE)}"
+            ))
+            return {row[0]: row[1] for row in rows}
+    except Exception as e:
+        print(f"⚠️ Load state tidak terbaca, semua tabel dimuat ulang. Error: {e}")
+        return {}
+
+
+def write_load_state(dw_engine: Engine, content_hashes: Dict[str, str]):
+    if not content_hashes:
+        return
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_load_state_table(connection)
+            connection.execute(text(f"""
+                INSERT INTO {_qualified(LOAD_STATE_TABLE)} (table_name, content_hash, loaded_at)
+                VALUES (:table_name, :content_hash, now())
+                ON CONFLICT (table_name) DO UPDATE
+                SET content_hash = EXCLUDED.content_hash, loaded_at = EXCLUDED.loaded_at
+            """), [{'table_name': t, 'content_hash': h} for t, h in content_hashes.items()])
+    except Exception as e:
+        # Tanpa state, run berikutnya hanya memuat ulang semuanya.
+        print(f"⚠️ Load state tidak tersimpan. Error: {e}")
+
+
+def clear_load_state(connection: Connection, tables: List[str]):
+    """Tabel yang diubah di luar full load (mis. delta CDC) wajib dimuat ulang berikutnya."""
+    _ensure_load_state_table(connection)
+    connection.execute(
+        text(f"DELETE FROM {_qualified(LOAD_STATE_TABLE)} WHERE table_name = ANY(:tables)"),
+        {'tables': list(tables)}
+    )
+
+
+# ==========================================
+# PENDING REFRESH (state turunan yang belum diperbarui setelah delta CDC)
+# ==========================================
+
+PENDING_REFRESH_TABLE = 'etl_pending_refresh'
+REFRESH_AGGREGATES = 'aggregates'
+# C += C(baru) - C(lama) tidak bisa diulang setelah fact ter-commit: tanda ini memaksa rebuild penuh.
+REFRESH_BASKET = 'basket'
+
+
+def _ensure_pending_refresh_table(connection: Connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(PENDING_REFRESH_TABLE)} (
+            step TEXT PRIMARY KEY,
+            since_date_key BIGINT,
+            marked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+
+
+def mark_pending_refresh(connection: Connection, marks: Dict[str, Optional[int]]):
+    """
+    Tandai state turunan yang harus diperbarui, di transaksi yang sama dengan
+    perubahan fact. Tanda yang sudah ada digabung (date_key paling awal).
+    """
+    if not marks:
+        return
+    _ensure_pending_refresh_table(connection)
+    connection.execute(text(f"""
+        INSERT INTO {_qualified(PENDING_REFRESH_TABLE)} AS p (step, since_date_key, marked_at)
+        VALUES (:step, :since_date_key, now())
+        ON CONFLICT (step) DO UPDATE
+        SET since_date_key = LEAST(p.since_date_key, EXCLUDED.since_date_key), marked_at = EXCLUDED.marked_at
+    """), [{'step': step, 'since_date_key': None if since is None else int(since)}
+           for step, since in marks.items()])
+
+
+def read_pending_refresh(dw_engine: Engine) -> Optional[Dict[str, Optional[int]]]:
+    """Tanda pending refresh {step: since_date_key}; None jika tidak terbaca."""
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_pending_refresh_table(connection)
+            rows = connection.execute(text(
+                f"SELECT step, since_date_key FROM {_qualified(PENDING_REFRESH_TABLE)}"
+            ))
+            return {row[0]: row[1] for row in rows}
+    except Exception as e:
+        print(f"❌ GAGAL membaca {PENDING_REFRESH_TABLE}. Error: {e}")
+        return None
+
+
+def clear_pending_refresh(dw_engine: Engine, steps: List[str]) -> bool:
+    """Hapus tanda setelah refresh berhasil."""
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_pending_refresh_table(connection)
+            connection.execute(
+                text(f"DELETE FROM {_qualified(PENDING_REFRESH_TABLE)} WHERE step = ANY(:steps)"),
+                {'steps': list(steps)}
+            )
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL menghapus tanda {PENDING_REFRESH_TABLE}. Error: {e}")
+        return False
 
 
-load_data = load_all_data
\ No newline at end of file
+load_data = load_all_data
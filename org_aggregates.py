@@ -0,0 +1,154 @@
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from dw_schema import ALL_CATEGORIES, EMPLOYEE_CLOSURE_TABLE, EMPLOYEE_MONTHLY_TABLE, SHIPPER_MONTHLY_TABLE
+from load import FACT_TABLE, _qualified, table_exists
+from period_aggregates import month_from_date_key
+
+# Agregat untuk KPI karyawan & pengiriman:
+# - employee_closure: semua pasangan (atasan, bawahan) + kedalaman dari
+#   dim_employee.reports_to, dihitung sekali per ETL. Rollup tim di dashboard
+#   cukup JOIN biasa, tanpa query rekursif per page view.
+# - agg_employee_monthly: revenue/order per karyawan x kategori x bulan
+#   (seri '*' = semua kategori, seperti agg_sales_monthly).
+# - agg_shipper_monthly: order & freight per shipper x bulan. Freight di
+#   fact_sales diulang di setiap baris order, jadi diambil sekali per order.
+
+MAX_HIERARCHY_DEPTH = 32
+
+
+def _ensure_org_tables(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(EMPLOYEE_CLOSURE_TABLE)} (
+            ancestor_key INTEGER NOT NULL,
+            descendant_key INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_key, descendant_key)
+        )
+    """))
+    connection.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS {EMPLOYEE_CLOSURE_TABLE}_descendant_idx
+        ON {_qualified(EMPLOYEE_CLOSURE_TABLE)} (descendant_key)
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(EMPLOYEE_MONTHLY_TABLE)} (
+            employee_key INTEGER NOT NULL,
+            category_name TEXT NOT NULL,
+            month_start DATE NOT NULL,
+            revenue NUMERIC(18, 2) NOT NULL,
+            orders BIGINT NOT NULL,
+            quantity BIGINT NOT NULL,
+            PRIMARY KEY (employee_key, category_name, month_start)
+        )
+    """))
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(SHIPPER_MONTHLY_TABLE)} (
+            shipper_key INTEGER NOT NULL,
+            month_start DATE NOT NULL,
+            orders BIGINT NOT NULL,
+            freight NUMERIC(18, 2) NOT NULL,
+            revenue NUMERIC(18, 2) NOT NULL,
+            PRIMARY KEY (shipper_key, month_start)
+        )
+    """))
+
+
+def has_org_aggregates(dw_engine: Engine) -> bool:
+    return all(table_exists(dw_engine, table)
+               for table in (EMPLOYEE_CLOSURE_TABLE, EMPLOYEE_MONTHLY_TABLE, SHIPPER_MONTHLY_TABLE))
+
+
+def refresh_employee_closure(dw_engine: Engine) -> bool:
+    """Bangun ulang closure table hierarki karyawan (termasuk baris diri sendiri, depth 0)."""
+    print(f"--- 🚀 Refresh {EMPLOYEE_CLOSURE_TABLE} ---")
+    closure, dim_employee = _qualified(EMPLOYEE_CLOSURE_TABLE), _qualified('dim_employee')
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_org_tables(connection)
+            connection.execute(text(f"DELETE FROM {closure}"))
+            # Rekursi hanya di sini (sekali per ETL); batas kedalaman mencegah loop jika data reports_to siklik.
+            result = connection.execute(text(f"""
+                WITH RECURSIVE tree AS (
+                    SELECT employee_key AS ancestor_key, employee_key AS descendant_key, 0 AS depth
+                    FROM {dim_employee}
+                    UNION ALL
+                    SELECT t.ancestor_key, child.employee_key, t.depth + 1
+                    FROM tree t
+                    JOIN {dim_employee} parent ON parent.employee_key = t.descendant_key
+                    JOIN {dim_employee} child ON child.reports_to = parent.employee_id
+                    WHERE t.depth < :max_depth AND child.employee_key <> t.ancestor_key
+                )
+                INSERT INTO {closure} (ancestor_key, descendant_key, depth)
+                SELECT ancestor_key, descendant_key, MIN(depth)
+                FROM tree
+                GROUP BY 1, 2
+            """), {'max_depth': MAX_HIERARCHY_DEPTH})
+        print(f"✅ {EMPLOYEE_CLOSURE_TABLE}: {result.rowcount} pasangan atasan-bawahan.")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL refresh {EMPLOYEE_CLOSURE_TABLE}. Error: {e}")
+        return False
+
+
+def refresh_org_aggregates(dw_engine: Engine, since_date_key: Optional[int] = None) -> bool:
+    """
+    Hitung ulang agregat karyawan & shipper mulai bulan since_date_key
+    (None = semua). Tidak ada kolom kumulatif, jadi bulan lain tidak disentuh.
+    """
+    print(f"--- 🚀 Refresh {EMPLOYEE_MONTHLY_TABLE} & {SHIPPER_MONTHLY_TABLE} ---")
+    fact, dim_date, dim_product = _qualified(FACT_TABLE), _qualified('dim_date'), _qualified('dim_product')
+    employee_agg, shipper_agg = _qualified(EMPLOYEE_MONTHLY_TABLE), _qualified(SHIPPER_MONTHLY_TABLE)
+    start = month_from_date_key(since_date_key) if since_date_key is not None else None
+    month_filter = "AND dd.full_date >= :start" if start else ""
+    params = {'start': start} if start else {}
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_org_tables(connection)
+            for table in (employee_agg, shipper_agg):
+                if start:
+                    connection.execute(text(f"DELETE FROM {table} WHERE month_start >= :start"), params)
+                else:
+                    connection.execute(text(f"DELETE FROM {table}"))
+
+            employees = connection.execute(text(f"""
+                INSERT INTO {employee_agg} (employee_key, category_name, month_start, revenue, orders, quantity)
+                SELECT fs.employee_key,
+                       CASE WHEN GROUPING(dp.category_name) = 1 THEN '{ALL_CATEGORIES}'
+                            ELSE COALESCE(dp.category_name, 'Unknown') END,
+                       date_trunc('month', dd.full_date)::date,
+                       SUM(fs.revenue), COUNT(DISTINCT fs.order_id), SUM(fs.quantity)
+                FROM {fact} fs
+                JOIN {dim_date} dd ON fs.date_key = dd.date_key
+                JOIN {dim_product} dp ON fs.product_key = dp.product_key
+                WHERE fs.employee_key IS NOT NULL
+                {month_filter}
+                GROUP BY GROUPING SETS ((fs.employee_key, date_trunc('month', dd.full_date), dp.category_name),
+                                        (fs.employee_key, date_trunc('month', dd.full_date)))
+            """), params)
+
+            shippers = connection.execute(text(f"""
+                WITH orders AS (
+                    SELECT fs.order_id, MIN(fs.shipper_key) AS shipper_key,
+                           date_trunc('month', MIN(dd.full_date))::date AS month_start,
+                           MAX(fs.freight) AS freight, SUM(fs.revenue) AS revenue
+                    FROM {fact} fs
+                    JOIN {dim_date} dd ON fs.date_key = dd.date_key
+                    WHERE TRUE
+                    {month_filter}
+                    GROUP BY fs.order_id
+                )
+                INSERT INTO {shipper_agg} (shipper_key, month_start, orders, freight, revenue)
+                SELECT shipper_key, month_start, COUNT(*), COALESCE(SUM(freight), 0), SUM(revenue)
+                FROM orders
+                WHERE shipper_key IS NOT NULL
+                GROUP BY 1, 2
+            """), params)
+        since = f" sejak {start:%Y-%m}" if start else ""
+        print(f"✅ {EMPLOYEE_MONTHLY_TABLE}: {employees.rowcount} baris, "
+              f"{SHIPPER_MONTHLY_TABLE}: {shippers.rowcount} baris{since}.")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL refresh agregat karyawan/shipper. Error: {e}")
+        return False
@@ -0,0 +1,220 @@
+import datetime
+import os
+import tempfile
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+import seaborn as sns  # noqa: E402
+from fpdf import FPDF  # noqa: E402
+
+import chart_prep  # noqa: E402
+from result_shaping import OTHERS_LABEL  # noqa: E402
+
+# Laporan PDF (matplotlib/seaborn/fpdf). Modul ini diimpor app.py hanya saat
+# ekspor diminta, supaya dependensi berat tidak memperlambat start dashboard.
+sns.set_theme(style="whitegrid")
+
+class PDFReport(FPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 10)
+        self.set_text_color(150)
+        self.cell(0, 10, 'KELOMPOK 4 - STRATEGIC REPORT', 0, 1, 'R')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(128)
+        self.cell(0, 10, f'Halaman {self.page_no()}', 0, 0, 'C')
+
+    def chapter_title(self, label):
+        self.set_font('Arial', 'B', 16)
+        self.set_text_color(31, 119, 180) 
+        self.cell(0, 10, label, 0, 1, 'L')
+        self.line(10, self.get_y(), 200, self.get_y())
+        self.ln(5)
+
+    def chapter_body(self, text):
+        self.set_font('Arial', '', 11)
+        self.set_text_color(50)
+        self.multi_cell(0, 6, text)
+        self.ln()
+
+    def add_metric_box(self, label, value, x_pos, y_pos, width=45):
+        self.set_xy(x_pos, y_pos)
+        self.set_fill_color(240, 242, 246) 
+        self.rect(x_pos, y_pos, width, 25, 'F')
+        
+        self.set_xy(x_pos, y_pos + 3)
+        self.set_font('Arial', '', 9)
+        self.set_text_color(100)
+        self.cell(width, 5, label, 0, 2, 'C')
+        
+        self.set_font('Arial', 'B', 14)
+        self.set_text_color(0)
+        self.cell(width, 8, str(value), 0, 2, 'C')
+
+    def create_table(self, df, col_widths, col_names):
+        self.set_font('Arial', 'B', 10)
+        self.set_fill_color(31, 119, 180)
+        self.set_text_color(255)
+        
+        for col_name, width in zip(col_names, col_widths):
+            self.cell(width, 8, col_name, 1, 0, 'C', True)
+        self.ln()
+        
+        self.set_font('Arial', '', 9)
+        self.set_text_color(0)
+        fill = False
+        for _, row in df.iterrows():
+            for item, width in zip(row, col_widths):
+                text = str(item)
+                if len(text) > 25: text = text[:22] + "..." 
+                self.cell(width, 7, text, 1, 0, 'L', fill)
+            self.ln()
+            fill = not fill 
+
+def save_plot_to_image(fig):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmpfile:
+        fig.savefig(tmpfile.name, bbox_inches='tight', dpi=100)
+        return tmpfile.name
+
+def generate_pdf(data_dict, year_label, rev_target, ret_target):
+    pdf = PDFReport()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    
+    df_fin = data_dict.get('financial', pd.DataFrame())
+    df_cust = data_dict.get('retention', pd.DataFrame())
+    df_prod = data_dict.get('product', pd.DataFrame())
+    df_clv = data_dict.get('clv', pd.DataFrame())
+
+    # HALAMAN 1: Header
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 20)
+    pdf.cell(0, 15, f'Laporan Strategis Northwind: {year_label}', 0, 1, 'C')
+    pdf.set_font('Arial', 'I', 10)
+    pdf.cell(0, 5, f'Tanggal Cetak: {datetime.datetime.now().strftime("%d %B %Y")}', 0, 1, 'C')
+    pdf.ln(10)
+
+    start_y = pdf.get_y()
+    
+    total_rev = df_fin['total_revenue'].sum() if not df_fin.empty else 0
+    avg_ret = df_cust['retention_rate'].mean() if not df_cust.empty else 0
+    top_prod_name = df_prod.iloc[0]['product_name'] if not df_prod.empty else "-"
+    if len(top_prod_name) > 15: top_prod_name = top_prod_name[:12] + "..."
+
+    # Scorecards
+    pdf.add_metric_box("Total Revenue", f"${total_rev:,.0f}", 15, start_y)
+    pdf.add_metric_box("Avg Retention", f"{avg_ret:.1f}%", 65, start_y)
+    pdf.add_metric_box("Top Product", top_prod_name, 115, start_y)
+    pdf.add_metric_box("Active Month", f"{len(df_fin)} Bulan", 165, start_y)
+    
+    pdf.set_y(start_y + 35)
+
+    # 1. KEUANGAN (Revenue vs Target)
+    pdf.chapter_title('1. Pencapaian Target Keuangan')
+    if not df_fin.empty:
+        pdf.chapter_body(f"Total revenue tahun ini mencapai ${total_rev:,.0f} dengan target bulanan ${rev_target:,.0f}.")
+        
+        # CHART: Revenue Bar + Target Line (Matplotlib)
+        plt.figure(figsize=(10, 4))
+        sns.barplot(data=df_fin, x='month_name', y='total_revenue', color='#1f77b4', label='Actual')
+        plt.axhline(y=rev_target, color='red', linestyle='--', linewidth=2, label=f'Target (${rev_target:,.0f})')
+        plt.title(f'Monthly Revenue vs Target ({year_label})')
+        plt.ylabel('Revenue ($)')
+        plt.xlabel('')
+        plt.legend()
+        plt.grid(axis='y', linestyle='--', alpha=0.5)
+        plt.xticks(rotation=45)
+        
+        img_path = save_plot_to_image(plt.gcf())
+        pdf.image(img_path, x=10, w=190)
+        plt.close()
+        os.unlink(img_path)
+        
+        pdf.ln(5)
+        
+        # TABLE: Revenue Summary
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, 'Rincian Pencapaian Revenue Bulanan', 0, 1)
+        
+        # Prepare table data
+        # Teks tabel disiapkan vektor di chart_prep; df_fin (hasil cache) tidak diubah.
+        table_data = chart_prep.revenue_table_labels(df_fin, rev_target)
+        
+        pdf.create_table(
+            table_data, 
+            col_widths=[50, 45, 45, 40], 
+            col_names=['Bulan', 'Actual', 'Target', 'Achievement']
+        )
+    else:
+        pdf.chapter_body("Data keuangan tidak tersedia.")
+
+    # 2. CUSTOMER (Retention vs Target)
+    pdf.add_page()
+    pdf.chapter_title('2. Target Retensi Pelanggan')
+    
+    if not df_cust.empty:
+        pdf.chapter_body(f"Rata-rata retensi adalah {avg_ret:.1f}% dibandingkan target {ret_target}%.")
+
+        # CHART: Retention Line + Target Line
+        plt.figure(figsize=(10, 4))
+        plt.plot(df_cust['month'], df_cust['retention_rate'], marker='o', color='green', linewidth=2, label='Actual %')
+        plt.axhline(y=ret_target, color='red', linestyle='--', linewidth=2, label=f'Target ({ret_target}%)')
+        plt.title('Monthly Retention Rate vs Target')
+        plt.ylim(0, 150)
+        plt.ylabel('Retention Rate (%)')
+        plt.legend()
+        plt.grid(True, alpha=0.5)
+        
+        img_path = save_plot_to_image(plt.gcf())
+        pdf.image(img_path, x=10, w=190)
+        plt.close()
+        os.unlink(img_path)
+        pdf.ln(5)
+
+        # TABLE: Retention Summary
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, 'Analisis Gap Retensi', 0, 1)
+        
+        table_data_cust = chart_prep.retention_table_labels(df_cust, ret_target)
+        
+        pdf.create_table(
+            table_data_cust,
+            col_widths=[30, 50, 50, 50],
+            col_names=['Bulan', 'Actual Rate', 'Target Rate', 'Gap vs Target']
+        )
+    pdf.ln(10)
+
+    # 3. PRODUK & CLV (Tidak ada perubahan signifikan, tetap rapi)
+    pdf.add_page()
+    pdf.chapter_title('3. Top Produk & Pelanggan')
+
+    if not df_prod.empty:
+        # Chart Product
+        top_10 = df_prod[df_prod['product_name'] != OTHERS_LABEL].head(10).sort_values('total_revenue', ascending=True)
+        plt.figure(figsize=(10, 5))
+        bars = plt.barh(top_10['product_name'], top_10['total_revenue'], color='#1f77b4')
+        plt.title('Top 10 Produk (Revenue)')
+        plt.xlabel('Revenue ($)')
+        img_path = save_plot_to_image(plt.gcf())
+        pdf.image(img_path, x=10, w=180)
+        plt.close()
+        os.unlink(img_path)
+        pdf.ln(5)
+        
+    if not df_clv.empty:
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, 'Top 5 Pelanggan (High Value)', 0, 1)
+        
+        table_data = chart_prep.top_customers_table(df_clv, 5)
+        
+        pdf.create_table(
+            table_data, 
+            col_widths=[100, 30, 50], 
+            col_names=['Nama Perusahaan', 'Order', 'Total Belanja']
+        )
+
+    return pdf.output(dest='S').encode('latin-1')
@@ -0,0 +1,112 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from dw_schema import ALL_CATEGORIES, MONTHLY_AGG_TABLE
+from load import FACT_TABLE, _qualified, table_exists
+
+
+# Agregat bulanan + kolom kumulatif (prefix sum) per kategori. KPI rentang
+# tanggal apa pun = cum[bulan akhir] - cum[bulan sebelum awal]: dua baris per
+# seri, tidak bergantung pada panjang histori fact_sales.
+def _ensure_monthly_table(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {_qualified(MONTHLY_AGG_TABLE)} (
+            category_name TEXT NOT NULL,
+            month_start DATE NOT NULL,
+            revenue NUMERIC(18, 2) NOT NULL,
+            orders BIGINT NOT NULL,
+            quantity BIGINT NOT NULL,
+            cum_revenue NUMERIC(20, 2) NOT NULL,
+            cum_orders BIGINT NOT NULL,
+            cum_quantity BIGINT NOT NULL,
+            PRIMARY KEY (category_name, month_start)
+        )
+    """))
+
+
+def month_from_date_key(date_key: int) -> datetime.date:
+    """date_key YYYYMMDD -> tanggal 1 bulan tersebut."""
+    date_key = int(date_key)
+    return datetime.date(date_key // 10000, date_key // 100 % 100, 1)
+
+
+def has_monthly_aggregates(dw_engine: Engine) -> bool:
+    return table_exists(dw_engine, MONTHLY_AGG_TABLE)
+
+
+def refresh_monthly_aggregates(dw_engine: Engine, since_date_key: Optional[int] = None) -> bool:
+    """
+    Hitung ulang agregat bulanan mulai bulan since_date_key (None = semua).
+    Bulan sebelumnya tidak disentuh: kumulatif dilanjutkan dari baris
+    terakhir sebelum bulan awal, jadi delta CDC hanya membaca bulan terdampak.
+    Setiap seri dibuat rapat (tanpa bulan bolong) agar lookup cum selalu tepat.
+    """
+    print(f"--- 🚀 Refresh {MONTHLY_AGG_TABLE} ---")
+    fact, dim_date, dim_product = _qualified(FACT_TABLE), _qualified('dim_date'), _qualified('dim_product')
+    agg = _qualified(MONTHLY_AGG_TABLE)
+    try:
+        with dw_engine.begin() as connection:
+            _ensure_monthly_table(connection)
+            first, last = connection.execute(text(f"""
+                SELECT date_trunc('month', MIN(dd.full_date))::date, date_trunc('month', MAX(dd.full_date))::date
+                FROM {fact} fs JOIN {dim_date} dd ON fs.date_key = dd.date_key
+            """)).one()
+            if first is None:
+                connection.execute(text(f"DELETE FROM {agg}"))
+                print(f"✅ {MONTHLY_AGG_TABLE} dikosongkan (fact_sales kosong).")
+                return True
+
+            start = first if since_date_key is None else max(first, month_from_date_key(since_date_key))
+            if since_date_key is None:
+                connection.execute(text(f"DELETE FROM {agg}"))
+            else:
+                connection.execute(text(f"DELETE FROM {agg} WHERE month_start >= :start"), {'start': start})
+
+            result = connection.execute(text(f"""
+                WITH monthly AS (
+                    SELECT date_trunc('month', dd.full_date)::date AS month_start,
+                           CASE WHEN GROUPING(dp.category_name) = 1 THEN '{ALL_CATEGORIES}'
+                                ELSE COALESCE(dp.category_name, 'Unknown') END AS category_name,
+                           SUM(fs.revenue) AS revenue,
+                           COUNT(DISTINCT fs.order_id) AS orders,
+                           SUM(fs.quantity) AS quantity
+                    FROM {fact} fs
+                    JOIN {dim_date} dd ON fs.date_key = dd.date_key
+                    JOIN {dim_product} dp ON fs.product_key = dp.product_key
+                    WHERE dd.full_date >= :start
+                    GROUP BY GROUPING SETS ((date_trunc('month', dd.full_date), dp.category_name),
+                                            (date_trunc('month', dd.full_date)))
+                ),
+                base AS (
+                    SELECT DISTINCT ON (category_name) category_name, cum_revenue, cum_orders, cum_quantity
+                    FROM {agg}
+                    WHERE month_start < :start
+                    ORDER BY category_name, month_start DESC
+                ),
+                series AS (
+                    SELECT category_name FROM monthly UNION SELECT category_name FROM base
+                ),
+                months AS (
+                    SELECT generate_series(CAST(:start AS date), CAST(:last AS date), interval '1 month')::date AS month_start
+                )
+                INSERT INTO {agg} (category_name, month_start, revenue, orders, quantity,
+                                   cum_revenue, cum_orders, cum_quantity)
+                SELECT s.category_name, m.month_start,
+                       COALESCE(mo.revenue, 0), COALESCE(mo.orders, 0), COALESCE(mo.quantity, 0),
+                       COALESCE(b.cum_revenue, 0) + SUM(COALESCE(mo.revenue, 0)) OVER w,
+                       COALESCE(b.cum_orders, 0) + SUM(COALESCE(mo.orders, 0)) OVER w,
+                       COALESCE(b.cum_quantity, 0) + SUM(COALESCE(mo.quantity, 0)) OVER w
+                FROM months m
+                CROSS JOIN series s
+                LEFT JOIN monthly mo ON mo.month_start = m.month_start AND mo.category_name = s.category_name
+                LEFT JOIN base b ON b.category_name = s.category_name
+                WINDOW w AS (PARTITION BY s.category_name ORDER BY m.month_start)
+            """), {'start': start, 'last': last})
+        print(f"✅ {MONTHLY_AGG_TABLE}: {result.rowcount} baris sejak {start:%Y-%m}.")
+        return True
+    except Exception as e:
+        print(f"❌ GAGAL refresh {MONTHLY_AGG_TABLE}. Error: {e}")
+        return False
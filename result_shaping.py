@@ -0,0 +1,110 @@
+import os
+
+# Batas payload dashboard: berapa pun jumlah baris di DW, yang dikirim
+# ke browser hanya satu halaman, top-N + "Others", sampel, atau bin.
+PAGE_SIZE = int(os.getenv("DASH_PAGE_SIZE", "50"))
+TOP_N = int(os.getenv("DASH_TOP_N", "15"))
+SAMPLE_PER_GROUP = int(os.getenv("DASH_SAMPLE_PER_GROUP", "300"))
+SCATTER_BINS = int(os.getenv("DASH_SCATTER_BINS", "30"))
+OTHERS_LABEL = 'Others'
+
+
+def _base(query: str) -> str:
+    return query.strip().rstrip(';')
+
+
+def count_query(query: str) -> str:
+    return f"SELECT COUNT(*) AS total_rows FROM ({_base(query)}) q"
+
+
+def page_query(query: str, order_by: str, limit: int = PAGE_SIZE, offset: int = 0) -> str:
+    """Satu halaman hasil query (pagination di server)."""
+    return (f"SELECT * FROM ({_base(query)}) q ORDER BY {order_by} "
+            f"LIMIT {int(limit)} OFFSET {int(offset)}")
+
+
+def top_n_query(query: str, label_cols: tuple, value_col: str, n: int = TOP_N,
+                sum_cols: tuple = ()) -> str:
+    """
+    N baris teratas menurut value_col, sisanya dijumlah jadi satu baris
+    "Others" (urutan terakhir). sum_cols: kolom lain yang ikut dijumlah.
+    """
+    value_cols = [value_col, *[col for col in sum_cols if col != value_col]]
+    top_select = ", ".join([*label_cols, *value_cols])
+    others_select = ", ".join([f"'{OTHERS_LABEL}'" for _ in label_cols] + [f"SUM({col})" for col in value_cols])
+    return f"""
+        WITH base AS ({_base(query)}),
+        ranked AS (
+            SELECT base.*, ROW_NUMBER() OVER (ORDER BY {value_col} DESC) AS rank_no FROM base
+        )
+        SELECT {", ".join([*label_cols, *value_cols])} FROM (
+            SELECT {top_select}, rank_no FROM ranked WHERE rank_no <= {int(n)}
+            UNION ALL
+            SELECT {others_select}, {int(n) + 1} FROM ranked WHERE rank_no > {int(n)} HAVING COUNT(*) > 0
+        ) t
+        ORDER BY rank_no
+    """
+
+
+def group_count_query(query: str, group_col: str) -> str:
+    return (f"SELECT {group_col}, COUNT(*) AS jumlah FROM ({_base(query)}) q "
+            f"GROUP BY 1 ORDER BY 2 DESC")
+
+
+def sample_query(query: str, group_col: str, per_group: int = SAMPLE_PER_GROUP,
+                 order_by: str = 'random()') -> str:
+    """Maksimal per_group baris per grup (mis. titik scatter per segmen)."""
+    return f"""
+        SELECT * FROM (
+            SELECT q.*, ROW_NUMBER() OVER (PARTITION BY {group_col} ORDER BY {order_by}) AS sample_rank
+            FROM ({_base(query)}) q
+        ) s
+        WHERE sample_rank <= {int(per_group)}
+    """
+
+
+def bin_query(query: str, x_col: str, y_col: str, bins: int = SCATTER_BINS) -> str:
+    """Binning 2D di server: jumlah baris per sel grid bins x bins (untuk heatmap)."""
+    bins = int(bins)
+    return f"""
+        WITH base AS ({_base(query)}),
+        bounds AS (
+            SELECT MIN({x_col}) AS lo_x, GREATEST(MAX({x_col}), MIN({x_col}) + 1) AS hi_x,
+                   MIN({y_col}) AS lo_y, GREATEST(MAX({y_col}), MIN({y_col}) + 1) AS hi_y
+            FROM base
+        ),
+        binned AS (
+            SELECT LEAST(width_bucket({x_col}, lo_x, hi_x, {bins}), {bins}) AS x_bin,
+                   LEAST(width_bucket({y_col}, lo_y, hi_y, {bins}), {bins}) AS y_bin,
+                   lo_x, hi_x, lo_y, hi_y
+            FROM base CROSS JOIN bounds
+            WHERE {x_col} IS NOT NULL AND {y_col} IS NOT NULL
+        )
+        SELECT lo_x + (x_bin - 0.5) * (hi_x - lo_x) / {bins} AS {x_col},
+               lo_y + (y_bin - 0.5) * (hi_y - lo_y) / {bins} AS {y_col},
+               COUNT(*) AS jumlah
+        FROM binned
+        GROUP BY x_bin, y_bin, lo_x, hi_x, lo_y, hi_y
+    """
+
+
+SHAPES = {
+    'count': count_query,
+    'page': page_query,
+    'top': top_n_query,
+    'groups': group_count_query,
+    'sample': sample_query,
+    'bins': bin_query,
+}
+
+
+def shape_query(query: str, shape: tuple) -> str:
+    """
+    Bungkus query KPI sesuai bentuk hasil. shape = (nama, *argumen), mis.
+    ('page', 'monetary DESC', 50, 100) atau ('top', ('product_name',), 'total_revenue', 15).
+    Tuple (bukan dict) supaya bisa jadi key cache Streamlit.
+    """
+    name, *args = shape
+    if name not in SHAPES:
+        raise ValueError(f"Bentuk hasil tidak dikenal: {name}")
+    return SHAPES[name](query, *args)
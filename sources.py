@@ -0,0 +1,139 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from exctract import extract_data
+
+# Business key per tabel yang didukung change log.
+CDC_TABLE_KEYS = {
+    'orders': ['OrderID'],
+    'order_details': ['OrderID', 'ProductID'],
+}
+CDC_OPS = ('insert', 'update', 'delete')
+
+
+class Source(ABC):
+    """Sumber data ETL. extract() mengembalikan dict nama tabel -> DataFrame."""
+
+    incremental = False
+
+    @abstractmethod
+    def extract(self) -> Dict[str, pd.DataFrame]:
+        """Baca batch berikutnya (snapshot penuh atau delta CDC)."""
+
+    def commit(self):
+        """Tandai batch terakhir sudah dimuat (no-op untuk snapshot)."""
+
+
+class CsvSource(Source):
+    """Snapshot penuh dari folder CSV (perilaku ETL lama)."""
+
+    def __init__(self, data_folder: str = 'data'):
+        self.data_folder = data_folder
+
+    def extract(self) -> Dict[str, pd.DataFrame]:
+        return extract_data(self.data_folder)
+
+    def fingerprint(self) -> tuple:
+        """(nama, mtime, ukuran) file CSV; berubah jika ada file yang diekspor ulang."""
+        entries = []
+        for name in sorted(os.listdir(self.data_folder)):
+            if name.endswith('.csv'):
+                stat = os.stat(os.path.join(self.data_folder, name))
+                entries.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+
+
+class ChangeLogSource(Source):
+    """
+    Pembaca CDC dari change log append-only (JSONL/NDJSON), pengganti
+    logical replication. Satu baris per perubahan:
+
+        {"lsn": 42, "ts": 1729300000.0, "table": "orders", "op": "update", "row": {"OrderID": 10248, ...}}
+
+    extract() hanya membaca baris baru sejak offset terakhir yang di-commit;
+    offset disimpan di <log_path>.offset setelah commit(). "ts" (epoch detik,
+    opsional) dipakai untuk menghitung lag.
+    """
+
+    incremental = True
+
+    def __init__(self, log_path: str, offset_path: Optional[str] = None,
+                 max_changes: Optional[int] = None):
+        self.log_path = log_path
+        self.offset_path = offset_path or log_path + '.offset'
+        self.max_changes = max_changes
+        self._pending_offset = None
+
+    def committed_offset(self) -> dict:
+        if not os.path.exists(self.offset_path):
+            return {'position': 0, 'lsn': None, 'ts': None}
+        with open(self.offset_path) as f:
+            return json.load(f)
+
+    def backlog_bytes(self) -> int:
+        """Jumlah byte change log yang belum diproses (untuk back-pressure/lag)."""
+        if not os.path.exists(self.log_path):
+            return 0
+        return max(os.path.getsize(self.log_path) - self.committed_offset()['position'], 0)
+
+    def _read_records(self) -> List[dict]:
+        offset = self.committed_offset()
+        position, last_lsn = offset['position'], offset['lsn']
+        last_ts = offset.get('ts')
+        records = []
+        if not os.path.exists(self.log_path):
+            self._pending_offset = offset
+            return records
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(position)
+            for line in f:
+                # Baris terakhir yang belum lengkap ditinggal untuk batch berikutnya.
+                if not line.endswith(b'\n'):
+                    break
+                position += len(line)
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get('table') not in CDC_TABLE_KEYS or record.get('op') not in CDC_OPS:
+                    continue
+                records.append(record)
+                last_lsn = record.get('lsn', last_lsn)
+                last_ts = record.get('ts', last_ts)
+                if self.max_changes and len(records) >= self.max_changes:
+                    break
+
+        self._pending_offset = {'position': position, 'lsn': last_lsn, 'ts': last_ts}
+        return records
+
+    def extract(self) -> Dict[str, pd.DataFrame]:
+        """
+        Delta per tabel: kolom sesuai CSV sumber + _op dan _lsn. Beberapa
+        perubahan pada key yang sama diringkas jadi perubahan terakhir.
+        """
+        records = self._read_records()
+        changes = {}
+        for table, keys in CDC_TABLE_KEYS.items():
+            rows = [
+                {**record['row'], '_op': record['op'], '_lsn': record.get('lsn', i)}
+                for i, record in enumerate(records) if record['table'] == table
+            ]
+            if not rows:
+                continue
+            df = pd.DataFrame(rows).sort_values('_lsn', kind='stable')
+            changes[table] = df.drop_duplicates(subset=keys, keep='last').reset_index(drop=True)
+            print(f"✓ CDC {table}: {len(df)} perubahan ({len(changes[table])} key unik)")
+        return changes
+
+    def commit(self):
+        if self._pending_offset is None:
+            return
+        tmp_path = self.offset_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._pending_offset, f)
+        os.replace(tmp_path, self.offset_path)
+        self._pending_offset = None
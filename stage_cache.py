@@ -0,0 +1,131 @@
+import hashlib
+import os
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from key_cache import STATE_DIR
+
+STAGE_CACHE_DIR = os.getenv("ETL_STAGE_CACHE_DIR", os.path.join(STATE_DIR, 'stages'))
+# Hasil stage ikut berubah jika kode transform berubah.
+CODE_FILES = ('transform.py', 'calendar_dim.py')
+
+
+def frame_hash(df: Optional[pd.DataFrame]) -> str:
+    """Hash isi DataFrame (nilai, nama kolom, dtype), dihitung vektor tanpa loop baris."""
+    digest = hashlib.blake2b(digest_size=16)
+    if df is None:
+        return digest.hexdigest()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def series_hash(series: Optional[pd.Series]) -> str:
+    """
+    Hash pasangan index -> nilai sebuah Series, tidak bergantung urutan baris
+    (peta key dari SQLite dan dari memori bisa berurutan beda).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if series is not None:
+        rows = pd.util.hash_pandas_object(series, index=True).to_numpy()
+        digest.update(np.array([len(rows), rows.sum(), np.bitwise_xor.reduce(rows) if len(rows) else 0],
+                               dtype=np.uint64).tobytes())
+    return digest.hexdigest()
+
+
+def code_version(files: Iterable[str] = CODE_FILES) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in files:
+        with open(os.path.join(base, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Memoization hasil transform per stage (dim_customer, fact_sales, dst.)
+    di disk sebagai Parquet. Key = hash input stage + versi kode, sehingga
+    stage yang inputnya tidak berubah dibaca ulang alih-alih dihitung.
+    Satu file disimpan per stage; versi lama langsung dihapus.
+    """
+
+    def __init__(self, directory: str = STAGE_CACHE_DIR, version: Optional[str] = None):
+        self.directory = directory
+        self.version = version or code_version()
+        self.hits: List[str] = []
+        self.misses: List[str] = []
+
+    def _key(self, stage: str, parts: list) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in [self.version, stage, *parts]:
+            digest.update(str(part).encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.directory, f"{stage}-{key}.parquet")
+
+    def _read(self, stage: str, key: str) -> Optional[pd.DataFrame]:
+        path = self._path(stage, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            table = pq.read_table(path)
+            df = table.to_pandas()
+        except Exception as e:
+            print(f"   ⚠️ Cache stage {stage} rusak, dihitung ulang. Error: {e}")
+            return None
+        # Kolom object dikembalikan ke object (pandas baru membacanya sebagai str).
+        metadata = table.schema.pandas_metadata or {}
+        object_cols = [col['name'] for col in metadata.get('columns', [])
+                       if col.get('numpy_type') == 'object' and col['name'] in df.columns]
+        if object_cols:
+            df[object_cols] = df[object_cols].astype(object)
+        return df
+
+    def _write(self, stage: str, key: str, df: pd.DataFrame):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(stage, key)
+        tmp_path = path + '.tmp'
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"   ⚠️ Hasil stage {stage} tidak bisa di-cache. Error: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith(stage + '-') and name.endswith('.parquet') and name != os.path.basename(path):
+                os.unlink(os.path.join(self.directory, name))
+
+    def cached(self, stage: str, parts: Callable[[], list],
+               compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        parts() -> daftar hash input stage. Dipanggil lagi setelah compute,
+        karena compute bisa mengubah input (mis. key baru di key cache);
+        hasil disimpan di bawah key keadaan sesudahnya agar run berikut hit.
+        """
+        df = self._read(stage, self._key(stage, parts()))
+        if df is not None:
+            self.hits.append(stage)
+            return df
+        self.misses.append(stage)
+        df = compute()
+        self._write(stage, self._key(stage, parts()), df)
+        return df
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.parquet'):
+                os.unlink(os.path.join(self.directory, name))
+
+
+def table_hashes(frames: Dict[str, pd.DataFrame]) -> Dict[str, str]:
+    return {name: frame_hash(df) for name, df in frames.items()}
@@ -0,0 +1,128 @@
+import os
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# pd.read_sql membuffer seluruh hasil di client psycopg2 lalu menyalinnya
+# lagi ke DataFrame. Di sini hasil dibaca lewat named (server-side) cursor per
+# PG_FETCH_SIZE baris dan langsung disalin ke array kolom, jadi yang ada di
+# memori hanya satu chunk tuple + array akhir.
+FETCH_SIZE = int(os.getenv("PG_FETCH_SIZE", "10000"))
+
+# numeric -> float langsung di cursor (tanpa objek Decimal), sama seperti read_sql coerce_float.
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'STREAM_NUMERIC',
+    lambda value, cursor: float(value) if value is not None else None
+)
+
+# OID tipe PostgreSQL -> dtype array kolom; tipe lain disimpan sebagai object.
+PG_INT_TYPES = {20, 21, 23, 26}
+PG_FLOAT_TYPES = {700, 701, 1700}
+PG_TIMESTAMP_TYPES = {1114, 1184}
+
+
+def _compile(query, engine: Engine) -> str:
+    """Query string/text() -> SQL dengan paramstyle psycopg2 (%(nama)s, % di-escape)."""
+    return str(text(query if isinstance(query, str) else query.text).compile(dialect=engine.dialect))
+
+
+def iter_chunks(engine: Engine, query, params: Optional[Dict] = None,
+                fetch_size: int = FETCH_SIZE) -> Iterator[Tuple[tuple, List[tuple]]]:
+    """
+    Jalankan SELECT lewat named cursor; hasilkan (cursor.description, baris)
+    per fetch_size baris. Minimal satu chunk (bisa kosong) agar kolom tetap diketahui.
+    """
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor(name=f"stream_{uuid.uuid4().hex[:12]}") as cursor:
+            cursor.itersize = fetch_size
+            psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, cursor)
+            cursor.execute(_compile(query, engine), params or {})
+            first = True
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if rows or first:
+                    yield cursor.description, rows
+                first = False
+                if len(rows) < fetch_size:
+                    break
+        raw.commit()
+    finally:
+        raw.close()
+
+
+class ColumnBuilder:
+    """
+    Array kolom yang dialokasikan di depan dan diisi per chunk. Kapasitas
+    awal = expected_rows (atau satu chunk) dan digandakan bila penuh, jadi
+    tidak ada list Python per kolom yang tumbuh baris demi baris.
+    """
+
+    def __init__(self, description, capacity: int):
+        self.names = [col.name for col in description]
+        self.type_codes = [col.type_code for col in description]
+        self.arrays = [np.empty(max(capacity, 1), dtype=self._dtype(code)) for code in self.type_codes]
+        self.size = 0
+
+    @staticmethod
+    def _dtype(type_code):
+        if type_code in PG_INT_TYPES:
+            return np.int64
+        if type_code in PG_FLOAT_TYPES:
+            return np.float64
+        return object
+
+    def _grow(self, needed: int):
+        capacity = len(self.arrays[0]) if self.arrays else 0
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for i, array in enumerate(self.arrays):
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[i] = grown
+
+    def append(self, rows: List[tuple]):
+        if not rows:
+            return
+        end = self.size + len(rows)
+        self._grow(end)
+        for i, values in enumerate(zip(*rows)):
+            target = self.arrays[i]
+            if target.dtype == np.int64:
+                if None in values:
+                    # NULL di kolom integer: naik ke float64 (NaN), sama seperti read_sql.
+                    target = self.arrays[i] = target.astype(np.float64)
+                else:
+                    target[self.size:end] = values
+                    continue
+            if target.dtype == np.float64:
+                target[self.size:end] = np.array(values, dtype=np.float64)
+            else:
+                target[self.size:end] = values
+        self.size = end
+
+    def to_frame(self) -> pd.DataFrame:
+        columns = {}
+        for name, code, array in zip(self.names, self.type_codes, self.arrays):
+            values = array[:self.size]
+            if code in PG_TIMESTAMP_TYPES:
+                values = pd.to_datetime(values, utc=code == 1184)
+            columns[name] = values
+        return pd.DataFrame(columns, columns=self.names)
+
+
+def read_sql_streaming(query, engine: Engine, params: Optional[Dict] = None,
+                       fetch_size: int = FETCH_SIZE, expected_rows: Optional[int] = None) -> pd.DataFrame:
+    """Pengganti pd.read_sql(query, engine) dengan puncak memori lebih rendah untuk hasil besar."""
+    builder = None
+    for description, rows in iter_chunks(engine, query, params, fetch_size):
+        if builder is None:
+            builder = ColumnBuilder(description, expected_rows or len(rows))
+        builder.append(rows)
+    return builder.to_frame()
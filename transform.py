@@ -1,9 +1,36 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from calendar_dim import HolidayCalendar, build_dim_date, calendar_range, date_key_from_dates
+from key_cache import DimensionKeyCache
+from stage_cache import StageCache, frame_hash, series_hash
+
+
+# Kolom-kolom string dengan rasio nilai unik di bawah ini disimpan sebagai category.
+LOW_CARDINALITY_RATIO = 0.5
+CENTS_SUFFIX = '_cents'
+
+TRANSFORM_WORKERS = int(os.getenv("ETL_TRANSFORM_WORKERS", str(os.cpu_count() or 1)))
+# Di bawah jumlah baris order_details ini, overhead process pool lebih besar dari manfaatnya.
+PARALLEL_MIN_ROWS = int(os.getenv("ETL_PARALLEL_MIN_ROWS", "200000"))
 
 
-def get_normalized_data(raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+def get_normalized_data(raw_data: Dict[str, pd.DataFrame], copy: bool = True) -> Dict[str, pd.DataFrame]:
+    if not copy:
+        # Mode compact: frame mentah dipindah (bukan disalin) dari raw_data,
+        # sehingga bisa dibebaskan segera setelah dipakai.
+        normalized_data = {}
+        for key in list(raw_data):
+            df = raw_data.pop(key)
+            df.columns = df.columns.str.lower()
+            normalized_data[key] = df
+        return normalized_data
+
     normalized_data = {}
     for key, df in raw_data.items():
         temp_df = df.copy()
@@ -11,25 +38,189 @@ def get_normalized_data(raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataF
         normalized_data[key] = temp_df
     return normalized_data
 
+
+def _take(data: Dict[str, pd.DataFrame], key: str, compact: bool) -> pd.DataFrame:
+    return data.pop(key) if compact else data[key].copy()
+
+
+def compact_frame(df: pd.DataFrame, money_cols: list = ()) -> pd.DataFrame:
+    """
+    Representasi hemat memori: surrogate/business key integer -> int32,
+    integer lain di-downcast, string low-cardinality -> category,
+    kolom uang -> integer sen (<kolom>_cents).
+    """
+    for col in df.columns:
+        series = df[col]
+        if col.endswith('_key') or col.endswith('_id') or col == 'order_id':
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                df[col] = series.astype('Int32' if series.isna().any() else 'int32')
+        elif pd.api.types.is_integer_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)) \
+                and len(series) > 0 and series.nunique() / len(series) <= LOW_CARDINALITY_RATIO:
+            df[col] = series.astype('category')
+
+    for col in money_cols:
+        cents = (pd.to_numeric(df[col], errors='coerce') * 100).round()
+        df[col + CENTS_SUFFIX] = cents.astype('Int64' if cents.isna().any() else 'int64')
+        df = df.drop(columns=[col])
+    return df
+
+
+def expand_compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Kembalikan kolom <kolom>_cents ke nilai dolar sebelum ditulis ke DW."""
+    cents_cols = [c for c in df.columns if c.endswith(CENTS_SUFFIX)]
+    if not cents_cols:
+        return df
+    dollars = {c[:-len(CENTS_SUFFIX)]: df[c].astype('float64') / 100 for c in cents_cols}
+    return df.drop(columns=cents_cols).assign(**dollars)
+
+
+def memory_report(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    report = pd.DataFrame([
+        {
+            'table': name,
+            'rows': len(df),
+            'memory_mb': df.memory_usage(deep=True).sum() / 1024 ** 2,
+        }
+        for name, df in frames.items()
+    ])
+    return report
+
 def add_missing_columns(df: pd.DataFrame, required_cols: list) -> pd.DataFrame:
     for col in required_cols:
         if col not in df.columns:
             df[col] = pd.Series([np.nan] * len(df), index=df.index) 
     return df
 
-def transform_all_data(raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+def _surrogate_keys(df: pd.DataFrame, business_col: str, dimension: str,
+                    key_cache: Optional[DimensionKeyCache]):
+    if key_cache is None:
+        return df.index + 1
+    return key_cache.assign(dimension, df[business_col]).to_numpy()
+
+
+def resolve_fact_keys(fact_sales: pd.DataFrame, key_maps: Dict[str, pd.Series]) -> pd.DataFrame:
+    """Isi surrogate key fact dari peta business key (tanpa merge ke dimensi)."""
+    fact_sales['customer_key'] = fact_sales['customerid'].map(key_maps['customer'])
+    fact_sales['product_key'] = fact_sales['productid'].map(key_maps['product'])
+    fact_sales['employee_key'] = fact_sales['employeeid'].map(key_maps['employee'])
+    fact_sales['shipper_key'] = fact_sales['shipvia'].map(key_maps['shipper'])
+    return fact_sales
+
+
+def build_fact_sales(orders: pd.DataFrame, order_details: pd.DataFrame,
+                     key_maps: Dict[str, pd.Series]) -> pd.DataFrame:
+    """Fact sales (grain: baris order) dari orders & order_details yang sudah dinormalisasi."""
+    # Hanya kolom order yang dipakai fact, supaya merge berikutnya tidak
+    # ikut membawa kolom alamat pengiriman.
+    order_cols = ['orderid', 'customerid', 'employeeid', 'orderdate', 'shipvia', 'freight']
+    fact_sales = orders[order_cols].merge(
+        order_details, on='orderid', how='inner'
+    )
     
-    print("\n" + "=" * 50)
-    print("PHASE 2: TRANSFORMING DATA")
-    print("=" * 50)
+    fact_sales['total_sales'] = (
+        fact_sales['quantity'] * fact_sales['unitprice'] * (1 - fact_sales['discount'])
+    ).round(2)
+    fact_sales['revenue'] = fact_sales['total_sales'] 
     
-    transformed_data = {}
-    data = get_normalized_data(raw_data)
+    fact_sales = resolve_fact_keys(fact_sales, key_maps)
+    
+    # Date Key (Order Date): YYYYMMDD dihitung langsung, tanpa merge ke dim_date
+    fact_sales['date_key'] = date_key_from_dates(fact_sales['orderdate'])
 
-    # 1. DIMENSION: SHIPPER
-    print("\n1. Transforming dim_shipper...")
-    dim_shipper = data['shippers'].copy()
-    dim_shipper['shipper_key'] = dim_shipper.index + 1
+    fact_sales = fact_sales.drop(columns=['customerid', 'productid', 'employeeid', 'shipvia', 'orderdate'], errors='ignore')
+
+    fact_sales = fact_sales[[
+        'orderid', 'customer_key', 'product_key', 'date_key', 
+        'employee_key', 'shipper_key', 'unitprice', 'quantity', 'discount', 
+        'total_sales', 'revenue', 'freight'
+    ]].rename(columns={
+        'orderid': 'order_id',
+        'unitprice': 'unit_price',
+    })
+
+    # Baris dengan FK kosong tidak dibuang di sini; tahap validasi (validate.py)
+    # menolak dan mencatatnya di tabel rejects.
+    return fact_sales
+
+
+# Input shard diwariskan ke worker lewat fork (copy-on-write), bukan di-pickle.
+_SHARD_INPUTS = None
+
+
+def _fact_shard_worker(shard: int) -> pd.DataFrame:
+    orders, order_details, key_maps, order_pos, detail_pos = _SHARD_INPUTS
+    empty = np.array([], dtype=np.intp)
+    return build_fact_sales(
+        orders.take(order_pos.get(shard, empty)),
+        order_details.take(detail_pos.get(shard, empty)),
+        key_maps
+    )
+
+
+def build_fact_sales_sharded(orders: pd.DataFrame, order_details: pd.DataFrame,
+                             key_maps: Dict[str, pd.Series], workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    build_fact_sales paralel di process pool: orders & order_details dibagi
+    per hash order_id, lookup dimensi dibagikan sekali lewat fork. Jatuh ke
+    versi satu proses untuk data kecil atau jika fork tidak tersedia.
+    """
+    workers = workers or TRANSFORM_WORKERS
+    if (workers <= 1 or len(order_details) < PARALLEL_MIN_ROWS
+            or 'fork' not in mp.get_all_start_methods()):
+        return build_fact_sales(orders, order_details, key_maps)
+
+    global _SHARD_INPUTS
+    order_buckets = pd.util.hash_array(orders['orderid'].to_numpy()) % workers
+    detail_buckets = pd.util.hash_array(order_details['orderid'].to_numpy()) % workers
+    order_pos = pd.Series(order_buckets).groupby(order_buckets).indices
+    detail_pos = pd.Series(detail_buckets).groupby(detail_buckets).indices
+
+    _SHARD_INPUTS = (orders, order_details, key_maps, order_pos, detail_pos)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork')) as pool:
+            shards = list(pool.map(_fact_shard_worker, range(workers)))
+    finally:
+        _SHARD_INPUTS = None
+
+    return pd.concat(shards, ignore_index=True)
+
+
+MONEY_COLUMNS = {
+    'dim_employee': ['salary'],
+    'dim_product': ['unit_price'],
+    'fact_sales': ['unit_price', 'total_sales', 'revenue', 'freight'],
+}
+# Tabel mentah yang menjadi input setiap stage transform.
+STAGE_INPUTS = {
+    'dim_shipper': ['shippers'],
+    'dim_customer': ['customers'],
+    'dim_employee': ['employees'],
+    'dim_product': ['products', 'categories', 'suppliers'],
+    'dim_date': ['orders'],
+    'fact_sales': ['orders', 'order_details'],
+}
+BUSINESS_KEY_COLUMNS = {
+    'dim_shipper': 'shipperid',
+    'dim_customer': 'customerid',
+    'dim_employee': 'employeeid',
+    'dim_product': 'productid',
+}
+
+
+def _finish_dimension(name: str, df: pd.DataFrame, compact: bool) -> pd.DataFrame:
+    # Kolom Business Key dihapus dari Dimensi
+    df = df.drop(columns=[BUSINESS_KEY_COLUMNS[name]], errors='ignore')
+    if compact:
+        df = compact_frame(df, MONEY_COLUMNS.get(name, []))
+    return df
+
+
+def transform_dim_shipper(data: Dict[str, pd.DataFrame], compact: bool,
+                          key_cache: Optional[DimensionKeyCache]) -> pd.DataFrame:
+    dim_shipper = _take(data, 'shippers', compact)
+    dim_shipper['shipper_key'] = _surrogate_keys(dim_shipper, 'shipperid', 'shipper', key_cache)
     
     dim_shipper = dim_shipper[[
         'shipper_key', 'shipperid', 'companyname', 'phone'
@@ -37,13 +228,13 @@ def transform_all_data(raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFr
         'shipperid': 'shipper_id',
         'companyname': 'company_name'
     })
-    transformed_data['dim_shipper'] = dim_shipper
-    print(f"   ✓ dim_shipper: {len(dim_shipper)} records")
+    return _finish_dimension('dim_shipper', dim_shipper, compact)
+
 
-    # 2. DIMENSION: CUSTOMER
-    print("\n2. Transforming dim_customer...")
-    dim_customer = data['customers'].copy()
-    dim_customer['customer_key'] = dim_customer.index + 1
+def transform_dim_customer(data: Dict[str, pd.DataFrame], compact: bool,
+                           key_cache: Optional[DimensionKeyCache]) -> pd.DataFrame:
+    dim_customer = _take(data, 'customers', compact)
+    dim_customer['customer_key'] = _surrogate_keys(dim_customer, 'customerid', 'customer', key_cache)
 
     required_customer_cols = ['region', 'postalcode', 'fax']
     dim_customer = add_missing_columns(dim_customer, required_customer_cols)
@@ -60,13 +251,14 @@ def transform_all_data(raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFr
     })
     dim_customer['region'] = dim_customer['region'].fillna('Unknown')
     dim_customer['postal_code'] = dim_customer['postal_code'].fillna('Unknown')
-    transformed_data['dim_customer'] = dim_customer
-    print(f"   ✓ dim_customer: {len(dim_customer)} records")
-    
-    # 3. DIMENSION: EMPLOYEE (FIX: UndefinedColumn 'last_name')
-    print("\n3. Transforming dim_employee...")
-    dim_employee = data['employees'].copy()
-    dim_employee['employee_key'] = dim_employee.index + 1
+    return _finish_dimension('dim_customer', dim_customer, compact)
+
+
+def transform_dim_employee(data: Dict[str, pd.DataFrame], compact: bool,
+                           key_cache: Optional[DimensionKeyCache]) -> pd.DataFrame:
+    # FIX: UndefinedColumn 'last_name'
+    dim_employee = _take(data, 'employees', compact)
+    dim_employee['employee_key'] = _surrogate_keys(dim_employee, 'employeeid', 'employee', key_cache)
     
     required_employee_cols = ['region', 'reportsto', 'salary', 'titleofcourtesy', 'homephone']
     dim_employee = add_missing_columns(dim_employee, required_employee_cols)
@@ -98,21 +290,21 @@ def transform_all_data(raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFr
         'homephone': 'home_phone',
         'reportsto': 'reports_to'
     })
+    return _finish_dimension('dim_employee', dim_employee, compact)
 
-    transformed_data['dim_employee'] = dim_employee
-    print(f"   ✓ dim_employee: {len(dim_employee)} records")
-    
-    
-    # 4. DIMENSION: PRODUCT
-    print("\n4. Transforming dim_product...")
-    
+
+def transform_dim_product(data: Dict[str, pd.DataFrame], compact: bool,
+                          key_cache: Optional[DimensionKeyCache]) -> pd.DataFrame:
     dim_product = data['products'].merge(
         data['categories'], on='categoryid', how='left'
     ).merge(
         data['suppliers'], on='supplierid', how='left', suffixes=('_prod', '_sup')
     )
+    if compact:
+        for key in ('products', 'categories', 'suppliers'):
+            data.pop(key, None)
     
-    dim_product['product_key'] = dim_product.index + 1
+    dim_product['product_key'] = _surrogate_keys(dim_product, 'productid', 'product', key_cache)
 
     desired_cols_prod = [
         'product_key', 'productid', 'productname', 'categoryid', 'categoryname', 
@@ -146,139 +338,259 @@ def transform_all_data(raw_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFr
     dim_product['category_name'] = dim_product['category_name'].fillna('Unknown')
     dim_product['units_in_stock'] = dim_product['units_in_stock'].fillna(0).astype(int)
     dim_product['discontinued'] = dim_product['discontinued'].fillna(0).astype(bool)
+    return _finish_dimension('dim_product', dim_product, compact)
 
-    transformed_data['dim_product'] = dim_product
-    print(f"   ✓ dim_product: {len(dim_product)} records")
-    
-    # 5. DIMENSION: DATE
-    print("\n5. Transforming dim_date...")
+
+def transform_dim_date(data: Dict[str, pd.DataFrame], compact: bool,
+                       holiday_calendar: Optional[HolidayCalendar]) -> pd.DataFrame:
+    # Kalender padat (tahun penuh) dibangun aritmetis; tanggal tanpa order tetap ada.
     orders_df = data['orders']
-    all_dates = pd.concat([
-        pd.to_datetime(orders_df['orderdate'], errors='coerce'),
-        pd.to_datetime(orders_df['shippeddate'], errors='coerce')
-    ]).dropna().unique()
-    
-    dim_date = pd.DataFrame({'full_date': pd.to_datetime(all_dates)})
-    dim_date = dim_date.drop_duplicates().sort_values('full_date').reset_index(drop=True)
-    
-    t = dim_date['full_date'].dt
-    dim_date['date_key'] = t.strftime('%Y%m%d').astype(int) 
-    dim_date['year'] = t.year
-    dim_date['quarter'] = t.quarter
-    dim_date['month'] = t.month
-    dim_date['month_name'] = t.month_name()
-    dim_date['day'] = t.day
-    dim_date['day_of_week'] = t.dayofweek + 1
-    dim_date['day_name'] = t.day_name()
-    dim_date['week_of_year'] = t.isocalendar().week.astype(int)
-    dim_date['is_weekend'] = t.dayofweek.isin([5, 6])
-    dim_date['is_holiday'] = False
+    start, end = calendar_range(orders_df['orderdate'], orders_df['shippeddate'])
+    dim_date = build_dim_date(start, end, holiday_calendar)
+    return compact_frame(dim_date) if compact else dim_date
+
+
+def dimension_key_maps(transformed_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.Series]:
+    """Peta business key -> surrogate key dari dimensi hasil transform."""
+    return {
+        'customer': transformed_data['dim_customer'].set_index('customer_id')['customer_key'],
+        'product': transformed_data['dim_product'].set_index('product_id')['product_key'],
+        'employee': transformed_data['dim_employee'].set_index('employee_id')['employee_key'],
+        'shipper': transformed_data['dim_shipper'].set_index('shipper_id')['shipper_key'],
+    }
+
+
+def transform_fact_sales(data: Dict[str, pd.DataFrame], compact: bool,
+                         key_maps: Dict[str, pd.Series], workers: Optional[int]) -> pd.DataFrame:
+    fact_sales = build_fact_sales_sharded(data['orders'], data['order_details'], key_maps, workers)
+    if compact:
+        data.pop('orders', None)
+        data.pop('order_details', None)
+        fact_sales = compact_frame(fact_sales, MONEY_COLUMNS['fact_sales'])
+    return fact_sales
+
+
+def transform_all_data(raw_data: Dict[str, pd.DataFrame], compact: bool = False,
+                       holiday_calendar: Optional[HolidayCalendar] = None,
+                       key_cache: Optional[DimensionKeyCache] = None,
+                       workers: Optional[int] = None,
+                       stage_cache: Optional[StageCache] = None) -> Dict[str, pd.DataFrame]:
+    """
+    compact=True: hasil memakai dtype hemat memori (lihat compact_frame) dan
+    frame mentah dilepas dari raw_data begitu selesai dipakai (raw_data dikosongkan).
+    holiday_calendar: sumber flag is_holiday di dim_date (default tanpa libur).
+    key_cache: jika diisi, surrogate key diambil/ditambahkan ke cache persisten
+    sehingga stabil antar run (tanpa cache: nomor urut baris).
+    workers: jumlah proses untuk transform fact (default ETL_TRANSFORM_WORKERS/CPU).
+    stage_cache: jika diisi, stage yang hash inputnya sama dengan run sebelumnya
+    dibaca dari cache Parquet, tidak dihitung ulang.
+    """
+    print("\n" + "=" * 50)
+    print("PHASE 2: TRANSFORMING DATA" + (" (COMPACT)" if compact else ""))
+    print("=" * 50)
     
-    transformed_data['dim_date'] = dim_date
-    print(f"   ✓ dim_date: {len(dim_date)} records")
+    transformed_data = {}
+    data = get_normalized_data(raw_data, copy=not compact)
+    input_hashes = {}
+
+    def inputs_of(stage: str) -> list:
+        for key in STAGE_INPUTS[stage]:
+            if key not in input_hashes:
+                input_hashes[key] = frame_hash(data.get(key))
+        return [compact] + [input_hashes[key] for key in STAGE_INPUTS[stage]]
+
+    def run_stage(stage: str, compute, extra_parts=lambda: []) -> pd.DataFrame:
+        if stage_cache is None:
+            return compute()
+        df = stage_cache.cached(stage, lambda: inputs_of(stage) + extra_parts(), compute)
+        if compact and stage in stage_cache.hits and stage != 'dim_date':
+            # Input stage yang di-skip tetap dilepas (orders masih dipakai fact).
+            for key in STAGE_INPUTS[stage]:
+                data.pop(key, None)
+        return df
+
+    def key_map_of(dimension: str):
+        # Surrogate key dari cache ikut menentukan isi dimensi.
+        return lambda: [series_hash(key_cache.lookup(dimension)) if key_cache is not None else None]
+
+    dimension_stages = [
+        ('dim_shipper', 'shipper', transform_dim_shipper),
+        ('dim_customer', 'customer', transform_dim_customer),
+        ('dim_employee', 'employee', transform_dim_employee),
+        ('dim_product', 'product', transform_dim_product),
+    ]
+    for i, (name, dimension, transform_dim) in enumerate(dimension_stages, start=1):
+        print(f"\n{i}. Transforming {name}...")
+        transformed_data[name] = run_stage(
+            name, lambda fn=transform_dim: fn(data, compact, key_cache), key_map_of(dimension)
+        )
+        print(f"   ✓ {name}: {len(transformed_data[name])} records")
+
+    print("\n5. Transforming dim_date...")
+    calendar_id = repr((type(holiday_calendar).__name__, vars(holiday_calendar) if holiday_calendar else None))
+    transformed_data['dim_date'] = run_stage(
+        'dim_date', lambda: transform_dim_date(data, compact, holiday_calendar), lambda: [calendar_id]
+    )
+    print(f"   ✓ dim_date: {len(transformed_data['dim_date'])} records")
 
     # =======================================================
     # II. TRANSFORM FACT TABLE (Fokus Perbaikan)
     # =======================================================
     print("\n6. Transforming fact_sales and performing lookups...")
     
-    fact_sales = data['orders'].merge(
-        data['order_details'], on='orderid', how='inner'
+    # 1-4. Lookup Customer/Product/Employee/Shipper Key lewat peta business key
+    if key_cache is not None:
+        key_maps = key_cache.key_maps()
+    else:
+        key_maps = dimension_key_maps(transformed_data)
+
+    transformed_data['fact_sales'] = run_stage(
+        'fact_sales', lambda: transform_fact_sales(data, compact, key_maps, workers),
+        lambda: [series_hash(key_maps[name]) for name in sorted(key_maps)]
     )
-    
-    fact_sales['total_sales'] = (
-        fact_sales['quantity'] * fact_sales['unitprice'] * (1 - fact_sales['discount'])
-    ).round(2)
-    fact_sales['revenue'] = fact_sales['total_sales'] 
-    
-    
-    # 1. Lookup Customer Key
-    fact_sales = fact_sales.merge(
-        transformed_data['dim_customer'][['customer_id', 'customer_key']],
-        left_on='customerid', 
-        right_on='customer_id', 
-        how='left'
-    ).drop(columns=['customer_id']) 
-    
-    # 2. Lookup Product Key
-    fact_sales = fact_sales.merge(
-        transformed_data['dim_product'][['product_id', 'product_key']],
-        left_on='productid',
-        right_on='product_id',
-        how='left'
-    ).drop(columns=['product_id'])
-
-    # 3. Lookup Employee Key
-    fact_sales = fact_sales.merge(
-        transformed_data['dim_employee'][['employee_id', 'employee_key']],
-        left_on='employeeid',
-        right_on='employee_id',
-        how='left'
-    ).drop(columns=['employee_id'])
-
-    # 4. Lookup Shipper Key
-    fact_sales = fact_sales.merge(
-        transformed_data['dim_shipper'][['shipper_id', 'shipper_key']],
-        left_on='shipvia',
-        right_on='shipper_id',
-        how='left'
-    ).drop(columns=['shipper_id'])
-    
-    # 5. Lookup Date Key (Order Date)
-    dim_date_lookup = transformed_data['dim_date'].copy()
-    dim_date_lookup['full_date_dt'] = pd.to_datetime(dim_date_lookup['full_date'])
+    print(f"   ✓ fact_sales: {len(transformed_data['fact_sales'])} records")
 
-    fact_sales['orderdate_dt'] = pd.to_datetime(fact_sales['orderdate'], errors='coerce')
-    
-    fact_sales = fact_sales.merge(
-        dim_date_lookup[['full_date_dt', 'date_key']],
-        left_on='orderdate_dt',
-        right_on='full_date_dt',
-        how='left'
-    ).rename(columns={'date_key': 'date_key'})
-    
-    fact_sales = fact_sales.drop(columns=['orderdate_dt', 'full_date_dt'], errors='ignore')
+    if stage_cache is not None and stage_cache.hits:
+        print(f"\n♻️ Stage dari cache (input tidak berubah): {', '.join(stage_cache.hits)}")
 
-    fact_sales = fact_sales.drop(columns=['customerid', 'productid', 'employeeid', 'shipvia', 'orderdate'], errors='ignore')
+    total_mb = memory_report(transformed_data)['memory_mb'].sum()
+    print(f"\n✓ Transformation completed successfully. Data ready for loading. ({total_mb:.2f} MB)")
+    return transformed_data
 
-    fact_sales = fact_sales[[
-        'orderid', 'customer_key', 'product_key', 'date_key', 
-        'employee_key', 'shipper_key', 'unitprice', 'quantity', 'discount', 
-        'total_sales', 'revenue', 'freight'
-    ]].rename(columns={
-        'orderid': 'order_id',
-        'unitprice': 'unit_price',
+# =======================================================
+# III. INCREMENTAL (CDC) FACT TRANSFORM
+# =======================================================
+FACT_COLUMNS = [
+    'order_id', 'customer_key', 'product_key', 'date_key',
+    'employee_key', 'shipper_key', 'unit_price', 'quantity', 'discount',
+    'total_sales', 'revenue', 'freight'
+]
+FACT_FK_COLUMNS = ['customer_key', 'product_key', 'date_key', 'employee_key', 'shipper_key']
+HEADER_COLUMNS = ['customer_key', 'employee_key', 'shipper_key', 'date_key', 'freight']
+LINE_COLUMNS = ['order_id', 'product_key', 'unit_price', 'quantity', 'discount']
+
+
+def affected_order_ids(changes: Dict[str, pd.DataFrame]) -> pd.Index:
+    ids = [
+        df[col] for df in changes.values()
+        for col in df.columns if col.lower() == 'orderid'
+    ]
+    if not ids:
+        return pd.Index([], dtype='int64')
+    return pd.Index(pd.concat(ids).astype('int64').unique())
+
+
+def has_unknown_business_keys(changes: Dict[str, pd.DataFrame], key_maps: Dict[str, pd.Series]) -> bool:
+    """True jika delta memuat business key yang belum ada di key_maps."""
+    checks = {
+        'orders': [('CustomerID', 'customer'), ('EmployeeID', 'employee'), ('ShipVia', 'shipper')],
+        'order_details': [('ProductID', 'product')],
+    }
+    for table, columns in checks.items():
+        df = changes.get(table)
+        if df is None:
+            continue
+        live = df[df['_op'] != 'delete']
+        for column, name in columns:
+            if column in live.columns and not live[column].dropna().isin(key_maps[name].index).all():
+                return True
+    return False
+
+
+def transform_fact_delta(changes: Dict[str, pd.DataFrame], key_maps: Dict[str, pd.Series],
+                         existing_facts: pd.DataFrame,
+                         pending: Optional[Dict[str, pd.DataFrame]] = None) -> tuple:
+    """
+    Terapkan delta CDC orders/order_details ke baris fact order yang terdampak.
+
+    key_maps: business key -> surrogate key ('customer', 'product', 'employee', 'shipper').
+    existing_facts: baris fact_sales di warehouse untuk order yang terdampak.
+    pending: {'headers', 'lines'} yang menunggu pasangannya dari batch sebelumnya
+    (header tanpa baris / baris tanpa header), lihat read_pending_orders.
+    Mengembalikan (order_id terdampak, baris fact baru untuk order tsb,
+    pending baru untuk order tsb).
+    """
+    print("\n" + "=" * 50)
+    print("PHASE 2: TRANSFORMING DELTA (CDC)")
+    print("=" * 50)
+
+    changes = get_normalized_data(changes)
+    orders = add_missing_columns(
+        changes.get('orders', pd.DataFrame()),
+        ['orderid', 'customerid', 'employeeid', 'orderdate', 'shipvia', 'freight', '_op']
+    )
+    details = add_missing_columns(
+        changes.get('order_details', pd.DataFrame()),
+        ['orderid', 'productid', 'unitprice', 'quantity', 'discount', '_op']
+    )
+
+    pending = {**empty_pending_orders(), **(pending or {})}
+    pending_headers, pending_lines = pending['headers'], pending['lines']
+
+    affected = affected_order_ids(changes)
+    if affected.empty:
+        return affected, pd.DataFrame(columns=FACT_COLUMNS), empty_pending_orders()
+
+    # Header order: delta menang atas header lama dari warehouse / pending.
+    existing_headers = pd.concat(
+        [existing_facts.groupby('order_id')[HEADER_COLUMNS].first(),
+         pending_headers.astype({'order_id': 'int64'}).set_index('order_id')[HEADER_COLUMNS]]
+    )
+    existing_headers = existing_headers[~existing_headers.index.duplicated()]
+    live_orders = orders[orders['_op'] != 'delete']
+    delta_headers = pd.DataFrame({
+        'customer_key': live_orders['customerid'].map(key_maps['customer']).to_numpy(),
+        'employee_key': live_orders['employeeid'].map(key_maps['employee']).to_numpy(),
+        'shipper_key': live_orders['shipvia'].map(key_maps['shipper']).to_numpy(),
+        'date_key': date_key_from_dates(live_orders['orderdate']).to_numpy(),
+        'freight': pd.to_numeric(live_orders['freight'], errors='coerce').to_numpy(),
+    }, index=pd.Index(live_orders['orderid'].astype('int64'), name='order_id'))
+    deleted_orders = orders.loc[orders['_op'] == 'delete', 'orderid'].astype('int64')
+    headers = delta_headers.combine_first(existing_headers).drop(index=deleted_orders, errors='ignore')
+
+    # Baris order: baris lama ditimpa/dihapus oleh delta order_details.
+    delta_lines = pd.DataFrame({
+        'order_id': details['orderid'].astype('int64').to_numpy(),
+        'product_key': details['productid'].map(key_maps['product']).to_numpy(),
+        'unit_price': pd.to_numeric(details['unitprice'], errors='coerce').to_numpy(),
+        'quantity': pd.to_numeric(details['quantity'], errors='coerce').to_numpy(),
+        'discount': pd.to_numeric(details['discount'], errors='coerce').to_numpy(),
+        '_op': details['_op'].to_numpy(),
     })
+    lines = pd.concat(
+        [existing_facts[LINE_COLUMNS].assign(_op='existing'),
+         pending_lines[LINE_COLUMNS].assign(_op='existing'), delta_lines],
+        ignore_index=True
+    ).drop_duplicates(subset=['order_id', 'product_key'], keep='last')
+    lines = lines[(lines['_op'] != 'delete') & ~lines['order_id'].isin(deleted_orders)].drop(columns=['_op'])
 
-    fact_sales = fact_sales.dropna(subset=[
-        'customer_key', 
-        'product_key', 
-        'date_key', 
-        'employee_key', 
-        'shipper_key'
-    ])
-    
-    transformed_data['fact_sales'] = fact_sales
-    print(f"   ✓ fact_sales: {len(fact_sales)} records (setelah hapus NULL FK)")
-    
-    
+    # Header dan baris order bisa datang di batch berbeda: yang belum punya
+    # pasangan disimpan sebagai pending, bukan dibuang.
+    has_header = lines['order_id'].isin(headers.index)
+    waiting = {
+        'headers': headers[~headers.index.isin(lines['order_id'])].reset_index(),
+        'lines': lines[~has_header].reset_index(drop=True),
+    }
+    if len(waiting['headers']) or len(waiting['lines']):
+        print(f"   ℹ️ Pending: {len(waiting['headers'])} header tanpa baris, "
+              f"{len(waiting['lines'])} baris tanpa header")
+
+    fact_delta = lines[has_header].merge(headers, left_on='order_id', right_index=True, how='inner')
+    fact_delta['total_sales'] = (
+        fact_delta['quantity'] * fact_delta['unit_price'] * (1 - fact_delta['discount'])
+    ).round(2)
+    fact_delta['revenue'] = fact_delta['total_sales']
+
+    # Baris dengan FK yang tidak ditemukan tetap dikembalikan; validate_fact_delta
+    # menolaknya ke etl_rejects seperti di full load.
+    fact_delta = fact_delta[FACT_COLUMNS].reset_index(drop=True)
+
+    print(f"   ✓ fact_sales delta: {len(affected)} order terdampak, {len(fact_delta)} baris baru")
+    return affected, fact_delta, waiting
 
 
-    for dim_name in ['dim_shipper', 'dim_customer', 'dim_employee', 'dim_product']:
-        df = transformed_data[dim_name]
-        
-        # Kolom Business Key dihapus dari Dimensi
-        if dim_name == 'dim_shipper':
-            df = df.drop(columns=['shipperid'], errors='ignore')
-        elif dim_name == 'dim_customer':
-            df = df.drop(columns=['customerid'], errors='ignore')
-        elif dim_name == 'dim_employee':
-            df = df.drop(columns=['employeeid'], errors='ignore')
-        elif dim_name == 'dim_product':
-            df = df.drop(columns=['productid'], errors='ignore')
-            
-        transformed_data[dim_name] = df
-
-
-    print(f"\n✓ Transformation completed successfully. Data ready for loading.")
-    return transformed_data
\ No newline at end of file
+def empty_pending_orders() -> Dict[str, pd.DataFrame]:
+    return {
+        'headers': pd.DataFrame(columns=['order_id', *HEADER_COLUMNS]),
+        'lines': pd.DataFrame(columns=LINE_COLUMNS),
+    }
@@ -0,0 +1,250 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from transform import CENTS_SUFFIX, FACT_FK_COLUMNS
+
+VALIDATION_WORKERS = int(os.getenv("ETL_VALIDATION_WORKERS", "4"))
+
+REJECT = 'reject'  # baris dibuang & dicatat di tabel rejects
+WARN = 'warn'      # hanya dihitung di ringkasan
+
+REJECT_COLUMNS = ['run_id', 'table_name', 'rules', 'record']
+
+
+class Rule:
+    """
+    Aturan kualitas data deklaratif untuk satu tabel. check(df, tables)
+    mengembalikan mask boolean baris yang GAGAL (vektor numpy), atau None
+    jika aturan tidak bisa dijalankan (mis. tabel referensi tidak ada).
+    """
+
+    def __init__(self, table: str, name: str, check: Callable, severity: str = REJECT):
+        self.table = table
+        self.name = name
+        self.check = check
+        self.severity = severity
+
+
+# ------------------------------------------
+# Pembentuk check (semua berbasis mask vektor)
+# ------------------------------------------
+
+def _column(df: pd.DataFrame, col: str) -> pd.Series:
+    # Kolom uang mode compact disimpan sebagai <kolom>_cents.
+    if col not in df.columns and col + CENTS_SUFFIX in df.columns:
+        return df[col + CENTS_SUFFIX] / 100
+    return df[col]
+
+
+def not_null(col: str) -> Callable:
+    return lambda df, tables: _column(df, col).isna().to_numpy()
+
+
+def in_range(col: str, low=None, high=None, allow_null: bool = False) -> Callable:
+    def check(df, tables):
+        values = pd.to_numeric(_column(df, col), errors='coerce')
+        bad = values.isna() if not allow_null else pd.Series(False, index=df.index)
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+        return bad.to_numpy()
+    return check
+
+
+def unique(*cols: str) -> Callable:
+    """Duplikat setelah kemunculan pertama dianggap gagal."""
+    def check(df, tables):
+        values = [df[col] for col in cols]
+        if len(df) and len(values) > 1 and all(_is_plain_int(v) for v in values):
+            # Gabungkan kolom integer jadi satu kode int64: hash satu kolom jauh lebih cepat.
+            arrays = [v.to_numpy(dtype=np.int64) for v in values]
+            spans = [int(arr.max() - arr.min()) + 1 for arr in arrays]
+            if np.prod(spans, dtype=float) < 2 ** 62:
+                code = np.zeros(len(df), dtype=np.int64)
+                for arr, span in zip(arrays, spans):
+                    code = code * span + (arr - arr.min())
+                return pd.Series(code).duplicated(keep='first').to_numpy()
+        return df.duplicated(subset=list(cols), keep='first').to_numpy()
+    return check
+
+
+def _is_plain_int(series: pd.Series) -> bool:
+    return pd.api.types.is_integer_dtype(series) and not series.isna().any()
+
+
+def references(col: str, table: str, ref_col: str) -> Callable:
+    """FK coverage: nilai wajib ada di kolom tabel referensi (hasil validasi)."""
+    def check(df, tables):
+        ref = tables.get(table)
+        if ref is None or ref_col not in ref.columns:
+            return None
+        values = _column(df, col)
+        return (values.isna() | ~values.isin(ref[ref_col])).to_numpy()
+    return check
+
+
+def before(early_col: str, late_col: str) -> Callable:
+    def check(df, tables):
+        early = pd.to_datetime(df[early_col], errors='coerce')
+        late = pd.to_datetime(df[late_col], errors='coerce')
+        return (early >= late).to_numpy()
+    return check
+
+
+FACT_DIMENSIONS = {
+    'customer_key': 'dim_customer',
+    'product_key': 'dim_product',
+    'date_key': 'dim_date',
+    'employee_key': 'dim_employee',
+    'shipper_key': 'dim_shipper',
+}
+
+DEFAULT_RULES = [
+    # Dimensi: business key unik, nilai dalam rentang.
+    Rule('dim_customer', 'unique_customer_id', unique('customer_id')),
+    Rule('dim_product', 'unique_product_id', unique('product_id')),
+    Rule('dim_employee', 'unique_employee_id', unique('employee_id')),
+    Rule('dim_shipper', 'unique_shipper_id', unique('shipper_id')),
+    Rule('dim_product', 'unit_price_non_negative', in_range('unit_price', low=0, allow_null=True)),
+    Rule('dim_employee', 'hire_date_present', not_null('hire_date'), WARN),
+    Rule('dim_employee', 'birth_before_hire', before('birth_date', 'hire_date'), WARN),
+    # Fact: FK coverage ke dimensi hasil validasi, nilai dalam rentang, grain unik.
+    *[
+        Rule('fact_sales', f'fk_{col}', references(col, dim, col))
+        for col, dim in FACT_DIMENSIONS.items()
+    ],
+    Rule('fact_sales', 'quantity_non_negative', in_range('quantity', low=0)),
+    Rule('fact_sales', 'unit_price_non_negative', in_range('unit_price', low=0)),
+    Rule('fact_sales', 'discount_between_0_1', in_range('discount', low=0, high=1)),
+    Rule('fact_sales', 'freight_non_negative', in_range('freight', low=0, allow_null=True)),
+    Rule('fact_sales', 'unique_order_product', unique('order_id', 'product_key')),
+]
+
+
+def validate_table(table: str, df: pd.DataFrame, rules: List[Rule],
+                   tables: Dict[str, pd.DataFrame], run_id: str,
+                   masks: Optional[list] = None) -> tuple:
+    """
+    Jalankan aturan satu tabel -> (frame bersih, rejects, baris ringkasan).
+    masks: hasil rule.check yang sudah dihitung (mis. paralel di validate_all).
+    """
+    if masks is None:
+        masks = [rule.check(df, tables) for rule in rules]
+
+    summary = []
+    rejected = np.zeros(len(df), dtype=bool)
+    failed_rules = pd.Series('', index=df.index, dtype=object)
+    for rule, mask in zip(rules, masks):
+        summary.append({'table_name': table, 'rule': rule.name, 'severity': rule.severity,
+                        'rows': len(df), 'failed': None if mask is None else int(mask.sum())})
+        if mask is not None and rule.severity == REJECT and mask.any():
+            rejected |= mask
+            failed_rules[mask] += rule.name + ','
+
+    if not rejected.any():
+        return df, pd.DataFrame(columns=REJECT_COLUMNS), summary
+
+    bad_rows = df[rejected]
+    rejects = pd.DataFrame({
+        'run_id': run_id,
+        'table_name': table,
+        'rules': failed_rules[rejected].str.rstrip(',').to_numpy(),
+        'record': bad_rows.to_json(orient='records', lines=True, date_format='iso').splitlines(),
+    })
+    clean = df[~rejected]
+    if table == 'fact_sales':
+        clean = _restore_integer_keys(clean)
+    return clean, rejects, summary
+
+
+def _restore_integer_keys(fact: pd.DataFrame) -> pd.DataFrame:
+    # Setelah baris tanpa FK dibuang, key float/nullable bisa kembali jadi integer.
+    casts = {}
+    for col in FACT_FK_COLUMNS:
+        if col not in fact.columns or isinstance(fact[col].dtype, np.dtype) and fact[col].dtype.kind == 'i':
+            continue
+        if fact[col].notna().all():
+            casts[col] = 'int32' if str(fact[col].dtype) == 'Int32' else 'int64'
+    return fact.astype(casts)
+
+
+def _validate_group(pool: ThreadPoolExecutor, tables: Dict[str, pd.DataFrame],
+                    names: List[str], rules: List[Rule], run_id: str) -> list:
+    # Setiap aturan (bukan hanya setiap tabel) jadi satu tugas di pool:
+    # fact_sales yang besar tidak menunggu di satu thread.
+    table_rules = {name: [rule for rule in rules if rule.table == name] for name in names}
+    futures = {
+        name: [pool.submit(rule.check, tables[name], tables) for rule in table_rules[name]]
+        for name in names
+    }
+    return [
+        (name, validate_table(name, tables[name], table_rules[name], tables, run_id,
+                              masks=[future.result() for future in futures[name]]))
+        for name in names
+    ]
+
+
+def validate_all(transformed_data: Dict[str, pd.DataFrame], rules: Optional[List[Rule]] = None,
+                 workers: int = VALIDATION_WORKERS, run_id: Optional[str] = None,
+                 reference_tables: Optional[Dict[str, pd.DataFrame]] = None) -> tuple:
+    """
+    Tahap validasi antara transform dan load. Dimensi divalidasi paralel,
+    lalu fact dicek terhadap dimensi yang sudah bersih (FK coverage).
+
+    reference_tables: tabel tambahan yang hanya dipakai untuk cek FK,
+    tidak divalidasi (mis. key dimensi di warehouse untuk delta CDC).
+    Mengembalikan (data bersih, rejects DataFrame, ringkasan DataFrame).
+    """
+    print("\n" + "=" * 50)
+    print("PHASE 2b: VALIDATING DATA")
+    print("=" * 50)
+
+    rules = DEFAULT_RULES if rules is None else rules
+    run_id = run_id or time.strftime('%Y%m%dT%H%M%S')
+    clean = dict(transformed_data)
+    rejects, summary = [], []
+
+    dimensions = [name for name in clean if name != 'fact_sales']
+    facts = [name for name in clean if name == 'fact_sales']
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for group in (dimensions, facts):
+            for name, (df, table_rejects, table_summary) in _validate_group(
+                    pool, {**(reference_tables or {}), **clean}, group, rules, run_id):
+                clean[name] = df
+                rejects.append(table_rejects)
+                summary.extend(table_summary)
+
+    rejects = pd.concat(rejects, ignore_index=True) if rejects else pd.DataFrame(columns=REJECT_COLUMNS)
+    summary = pd.DataFrame(summary, columns=['table_name', 'rule', 'severity', 'rows', 'failed'])
+
+    failing = summary[summary['failed'].fillna(0) > 0]
+    for row in failing.itertuples(index=False):
+        icon = '❌' if row.severity == REJECT else '⚠️'
+        print(f"   {icon} {row.table_name}.{row.rule}: {row.failed}/{row.rows} baris")
+    print(f"✓ Validasi selesai: {len(summary)} aturan, {len(rejects)} baris ditolak")
+    return clean, rejects, summary
+
+
+def validate_fact_delta(fact_delta: pd.DataFrame, key_maps: Dict[str, pd.Series],
+                        run_id: Optional[str] = None) -> tuple:
+    """
+    Validasi delta fact CDC dengan aturan yang sama seperti full load. FK dicek
+    terhadap surrogate key dimensi di warehouse (key_maps); dim_date dilengkapi
+    ensure_dim_date_covers saat load, jadi hanya date_key kosong yang gagal.
+    Mengembalikan (fact bersih dengan key integer, rejects DataFrame).
+    """
+    reference_tables = {
+        dim: pd.DataFrame({col: key_maps[col.removesuffix('_key')].to_numpy()})
+        for col, dim in FACT_DIMENSIONS.items() if col != 'date_key'
+    }
+    reference_tables['dim_date'] = pd.DataFrame({'date_key': fact_delta['date_key'].dropna().unique()})
+    clean, rejects, _ = validate_all({'fact_sales': fact_delta}, run_id=run_id,
+                                  reference_tables=reference_tables)
+    fact = clean['fact_sales']
+    return fact.astype({col: 'int64' for col in FACT_FK_COLUMNS}).reset_index(drop=True), rejects